@@ -0,0 +1,141 @@
+"""
+Batch-level character distortion for feed-forward training
+
+Every operator takes a (batch_size, width) tensor of token ids where each row
+is an ayah padded with <PAD>, and returns a tensor of the same shape. Work is
+done with masks over the whole batch: characters to drop are marked, then the
+survivors are compacted to the left of each row.
+"""
+import torch
+
+def valid_mask(tokens, pad_token):
+    """True for real characters, False for padding"""
+    return tokens != pad_token
+
+def select_rows(tokens, prob):
+    """Pick each row independently with probability prob"""
+    return torch.rand(tokens.shape[0], device=tokens.device) < prob
+
+def compact(tokens, keep, pad_token):
+    """Shift the kept tokens of each row to the left and pad the rest"""
+    batch_size, width = tokens.shape
+    # Destination of each kept token; dropped tokens go to a spare column
+    destination = keep.long().cumsum(dim=1) - 1
+    destination = torch.where(keep, destination, torch.full_like(destination, width))
+    result = torch.full((batch_size, width + 1), pad_token, dtype=tokens.dtype, device=tokens.device)
+    result.scatter_(1, destination, tokens)
+    return result[:, :width]
+
+def shift_left(tokens, offsets, pad_token):
+    """Drop the first offsets[i] tokens of row i"""
+    width = tokens.shape[1]
+    positions = offsets.unsqueeze(1) + torch.arange(width, device=tokens.device).unsqueeze(0)
+    in_range = positions < width
+    shifted = tokens.gather(1, positions.clamp(max=width - 1))
+    return shifted.masked_fill(~in_range, pad_token)
+
+def fit_length(tokens, max_length, pad_token):
+    """Truncate or pad every row to exactly max_length tokens"""
+    width = tokens.shape[1]
+    if width >= max_length:
+        return tokens[:, :max_length]
+    padding = torch.full((tokens.shape[0], max_length - width), pad_token, dtype=tokens.dtype, device=tokens.device)
+    return torch.cat([tokens, padding], dim=1)
+
+def random_deletion(tokens, rate, prob, pad_token):
+    """Remove int(length * rate) random characters from a prob fraction of rows
+
+    Rows always keep at least one character, like the per-sample version.
+    """
+    valid = valid_mask(tokens, pad_token)
+    lengths = valid.sum(dim=1)
+    num_to_remove = (lengths.float() * rate).long()
+    num_to_remove = torch.minimum(num_to_remove, (lengths - 1).clamp(min=0))
+    num_to_remove = num_to_remove * select_rows(tokens, prob)
+
+    # The num_to_remove lowest random scores of each row are removed
+    scores = torch.rand(tokens.shape, device=tokens.device).masked_fill(~valid, 2.0)
+    ranks = scores.argsort(dim=1).argsort(dim=1)
+    remove = ranks < num_to_remove.unsqueeze(1)
+    return compact(tokens, ~remove, pad_token)
+
+def skip_word(tokens, prob, space_token, pad_token):
+    """Remove one random word (2nd word onwards) from a prob fraction of rows
+
+    The space before the skipped word goes with it, so the result matches
+    ' '.join(words[:k] + words[k+1:]).
+    """
+    valid = valid_mask(tokens, pad_token)
+    is_space = (tokens == space_token) & valid
+    # Word index of every character; a space belongs to the word after it
+    word_ids = is_space.long().cumsum(dim=1)
+    num_words = is_space.sum(dim=1) + 1
+
+    rows = select_rows(tokens, prob) & (num_words > 1)
+    skip_idx = 1 + (torch.rand(tokens.shape[0], device=tokens.device) * (num_words - 1).float()).long()
+    skip_idx = torch.minimum(skip_idx, num_words - 1)
+
+    remove = valid & (word_ids == skip_idx.unsqueeze(1)) & rows.unsqueeze(1)
+    return compact(tokens, ~remove, pad_token)
+
+def prefix_offset(tokens, prob, max_offset, max_length, pad_token):
+    """Start a prob fraction of rows up to max_offset characters late
+
+    Only rows longer than max_length are shifted, and never so far that
+    fewer than max_length characters remain.
+    """
+    lengths = valid_mask(tokens, pad_token).sum(dim=1)
+    rows = select_rows(tokens, prob) & (lengths > max_length)
+    limit = (lengths - max_length).clamp(min=0, max=max_offset)
+    offsets = (torch.rand(tokens.shape[0], device=tokens.device) * (limit + 1).float()).long()
+    offsets = torch.minimum(offsets, limit) * rows
+    return shift_left(tokens, offsets, pad_token)
+
+def omit_last_letters(tokens, prob, space_token, pad_token):
+    """Drop the last letter of every word longer than one letter in a prob fraction of rows"""
+    letter = valid_mask(tokens, pad_token) & (tokens != space_token)
+    no_letter = torch.zeros_like(letter[:, :1])
+    next_is_letter = torch.cat([letter[:, 1:], no_letter], dim=1)
+    prev_is_letter = torch.cat([no_letter, letter[:, :-1]], dim=1)
+
+    rows = select_rows(tokens, prob)
+    remove = letter & ~next_is_letter & prev_is_letter & rows.unsqueeze(1)
+    return compact(tokens, ~remove, pad_token)
+
+def truncate_words(tokens, num_words, space_token, pad_token):
+    """Keep the first num_words[i] words of row i, like QuranTokenMatrix.truncate"""
+    valid = valid_mask(tokens, pad_token)
+    # Word index of every character; a space belongs to the word after it, so it goes with it
+    word_ids = ((tokens == space_token) & valid).long().cumsum(dim=1)
+    keep = valid & (word_ids < num_words.unsqueeze(1))
+    return tokens.masked_fill(~keep, pad_token)
+
+def random_truncation(tokens, word_counts, full_prob, space_token, pad_token):
+    """Truncate every row to a word count drawn uniformly from word_counts
+
+    A full_prob fraction of rows is left whole instead (fit_length then cuts
+    it to the input window, as the full-ayah trainers do).
+    """
+    choices = torch.as_tensor(word_counts, device=tokens.device)
+    num_words = choices[torch.randint(len(choices), (tokens.shape[0],), device=tokens.device)]
+    num_words = num_words.masked_fill(select_rows(tokens, full_prob), tokens.shape[1])
+    return truncate_words(tokens, num_words, space_token, pad_token)
+
+class BatchDistortion:
+    """collate_fn that stacks clean ayah rows and runs distortion steps on the batch
+
+    steps are callables taking and returning a (batch_size, width) tensor,
+    typically functools.partial over the operators above so the collate
+    function stays picklable for DataLoader workers.
+    """
+    def __init__(self, steps, max_length, pad_token):
+        self.steps = list(steps)
+        self.max_length = max_length
+        self.pad_token = pad_token
+
+    def __call__(self, batch):
+        tokens = torch.stack([x for x, _ in batch])
+        targets = torch.stack([torch.as_tensor(y) for _, y in batch])
+        for step in self.steps:
+            tokens = step(tokens)
+        return fit_length(tokens, self.max_length, self.pad_token), targets
@@ -1,6 +1,7 @@
 import torch
 import coremltools as ct
-from model import QuranMatcherModel, load_vocabulary
+from model import load_vocabulary
+from model_factory import load_checkpoint
 import json
 
 def convert_to_coreml():
@@ -10,26 +11,11 @@ def convert_to_coreml():
     vocabulary, vocab_size = load_vocabulary('vocabulary_normalized.json')
     print(f'Vocabulary size: {vocab_size}')
 
-    # Model parameters
-    input_length = 60
-    hidden_size = 512
-    output_size = 6203  # Total number of ayat
-
-    # Load the trained model
+    # Load the trained model; the architecture comes from the checkpoint
     print('\nLoading trained model...')
-    checkpoint = torch.load('quran_matcher_combined_6_to_10_words.pth', map_location='cpu')
-
-    # Create model with same architecture
-    model = QuranMatcherModel(
-        vocab_size=vocab_size,
-        input_length=input_length,
-        hidden_size=hidden_size,
-        output_size=output_size
-    )
-
-    # Load trained weights
-    model.load_state_dict(checkpoint['model_state_dict'])
-    model.eval()
+    model, checkpoint = load_checkpoint('quran_matcher_combined_6_to_10_words.pth', vocabulary=vocabulary)
+    config = model.config()
+    input_length = config['input_length']
 
     print(f'Model loaded successfully\!')
     print(f'Training accuracy: {checkpoint["accuracy"]:.2f}%')
@@ -69,9 +55,9 @@ def convert_to_coreml():
     # Print model info
     print(f'\nModel Information:')
     print(f'  Input shape: (1, {input_length})')
-    print(f'  Output shape: (1, {output_size})')
+    print(f'  Output shape: (1, {config["output_size"]})')
     print(f'  Vocabulary size: {vocab_size}')
-    print(f'  Hidden size: {hidden_size}')
+    print(f'  Hidden size: {config["hidden_size"]}')
     print(f'  Training accuracy: {checkpoint["accuracy"]:.2f}%')
     print(f'  Format: ML Program (iOS 16+)')
 
@@ -0,0 +1,222 @@
+"""
+Fused ensemble of QuranMatcherModel variants
+
+The per-length models (train_first_N_words.py, N=3..10) make different
+mistakes, but combining them took one forward pass per model. Compatible
+members (same config) are stacked into batched tensors instead, so the
+whole ensemble is one embedding_bag over the folded embedding + fc1 tables
+(see folded_matcher.py; plain embedding + bmm when the vocabulary is wider
+than the embedding) and one baddbmm per remaining layer:
+
+    tokens (batch, input_length) -> logits (members, batch, ayat)
+
+Members are combined by:
+    'logits'  mean of the member logits
+    'probs'   log of the mean member probability
+    'route'   each input goes to the member trained on the word count
+              closest to its own; only that member runs on it
+
+The ensemble has input_length and returns (batch, ayat) scores whose
+logsumexp-normalized top-k are the predictions, so it can stand in for
+QuranPredictor.model.
+"""
+import argparse
+import os
+import time
+import torch
+import torch.nn.functional as F
+from model import QuranMatcherModel, count_words, load_vocabulary, nearest_word_count_table
+from folded_matcher import FoldedQuranMatcher
+from model_factory import load_checkpoint
+
+COMBINE_MODES = ('logits', 'probs', 'route')
+
+def linear_layers(model):
+    """The Linear layers after fc1, in order, and whether a ReLU follows each"""
+    if model.output_rank:
+        return [(model.fc2, True), (model.fc3[0], False), (model.fc3[1], False)]
+    return [(model.fc2, True), (model.fc3, False)]
+
+def select(stacked, member):
+    """stacked, or a one-member view of it (no copy)"""
+    if stacked is None or member is None:
+        return stacked
+    return stacked[member:member + 1]
+
+class QuranMatcherEnsemble:
+    """Stacked QuranMatcherModel members evaluated in one batched forward
+
+    word_counts[i] is the input length in words member i was trained on
+    (needed for combine='route'). space_token / pad_token are used to count
+    the words of a token row.
+    """
+    def __init__(self, models, word_counts=None, combine='logits', vocabulary=None):
+        if combine not in COMBINE_MODES:
+            raise ValueError(f'combine must be one of {COMBINE_MODES}')
+        configs = [model.config() for model in models]
+        if any(config != configs[0] for config in configs[1:]):
+            raise ValueError('ensemble members must share one architecture (vocab, input length, sizes, output rank)')
+        if combine == 'route' and (word_counts is None or len(word_counts) != len(models)):
+            raise ValueError('combine=route needs one word count per member')
+
+        self.num_members = len(models)
+        self.member_config = configs[0]
+        self.input_length = self.member_config['input_length']
+        self.vocab_size = self.member_config['vocab_size']
+        self.combine = combine
+        self.word_counts = list(word_counts) if word_counts is not None else None
+        self.pad_token = vocabulary.get('<PAD>', 0) if vocabulary else 0
+        self.space_token = vocabulary.get(' ', 2) if vocabulary else 2
+
+        with torch.no_grad():
+            embedding_dim = models[0].embedding.weight.shape[1]
+            # Folded (position, token) rows are fewer than fc1's inputs when vocab_size < embedding_dim
+            self.folded = self.vocab_size <= embedding_dim
+            if self.folded:
+                tables = [FoldedQuranMatcher(model).flat_table for model in models]
+                self.table = torch.cat(tables)                                       # (members * input_length * vocab, hidden)
+                self.rows_per_member = tables[0].shape[0]
+                self.position_offsets = torch.arange(self.input_length) * self.vocab_size
+            else:
+                self.embedding = torch.stack([model.embedding.weight for model in models])        # (members, vocab, dim)
+                self.fc1_weight = torch.stack([model.fc1.weight.t() for model in models]).contiguous()
+            self.fc1_bias = torch.stack([model.fc1.bias for model in models]).unsqueeze(1)      # (members, 1, hidden)
+
+            # (weight (members, in, out), bias (members, 1, out) or None, relu) per later layer
+            self.layers = []
+            for layers in zip(*[linear_layers(model) for model in models]):
+                weight = torch.stack([layer.weight.t() for layer, _ in layers]).contiguous()
+                bias = None
+                if layers[0][0].bias is not None:
+                    bias = torch.stack([layer.bias for layer, _ in layers]).unsqueeze(1)
+                self.layers.append((weight, bias, layers[0][1]))
+            self.mean_bias = self.layers[-1][1].mean(dim=0)[0]
+
+        if self.word_counts is not None:
+            # route_table[w] = member whose trained word count is closest to w (ties go to the shorter one)
+            self.route_table = nearest_word_count_table(self.word_counts, self.input_length)
+
+    @classmethod
+    def from_checkpoints(cls, paths, word_counts=None, combine='logits', vocabulary=None, normalize=False):
+        """Ensemble of matcher checkpoints or inference artifacts (see model_factory.load_checkpoint)"""
+        models = [load_checkpoint(path, vocabulary=vocabulary, normalize=normalize)[0] for path in paths]
+        return cls(models, word_counts, combine, vocabulary)
+
+    def hidden(self, tokens, member=None):
+        """fc1 output (after ReLU) of every member, or of one: (members, batch, hidden)"""
+        members = range(self.num_members) if member is None else range(member, member + 1)
+        if self.folded:
+            indices = tokens + self.position_offsets
+            indices = indices.unsqueeze(0) + (torch.tensor(members) * self.rows_per_member).view(-1, 1, 1)
+            pre = F.embedding_bag(indices.view(-1, self.input_length), self.table, mode='sum')
+            pre = pre.view(len(members), tokens.shape[0], self.table.shape[1])
+        else:
+            embedded = select(self.embedding, member)[:, tokens].flatten(2)          # (members, batch, input_length * dim)
+            pre = torch.bmm(embedded, select(self.fc1_weight, member))
+        return torch.relu(pre + select(self.fc1_bias, member))
+
+    def member_features(self, tokens, member=None):
+        """Input of the output layer for every member, or for one: (members, batch, features)"""
+        with torch.no_grad():
+            x = self.hidden(tokens, member)
+            for weight, bias, relu in self.layers[:-1]:
+                weight, bias = select(weight, member), select(bias, member)
+                x = torch.baddbmm(bias, x, weight) if bias is not None else torch.bmm(x, weight)
+                if relu:
+                    x = torch.relu(x)
+            return x
+
+    def member_logits(self, tokens, member=None):
+        """Logits of every member, or of one, for a (batch, input_length) token tensor: (members, batch, ayat)"""
+        weight, bias, _ = self.layers[-1]
+        with torch.no_grad():
+            return torch.baddbmm(select(bias, member), self.member_features(tokens, member), select(weight, member))
+
+    def mean_logits(self, tokens):
+        """Mean member logits without materializing each member's: the output layer is linear, so
+        mean_m(x_m @ W_m + b_m) = [x_1 .. x_M] @ [W_1; ..; W_M] / M + mean_m(b_m), one GEMM"""
+        weight, bias, _ = self.layers[-1]
+        with torch.no_grad():
+            features = self.member_features(tokens)
+            features = features.transpose(0, 1).reshape(tokens.shape[0], weight.shape[0] * weight.shape[1])
+            return torch.addmm(self.mean_bias, features, weight.view(-1, weight.shape[2]), alpha=1 / self.num_members)
+
+    def route(self, tokens):
+        """Member index for each token row, by word count"""
+        return self.route_table[count_words(tokens, self.pad_token, self.space_token).clamp(max=self.input_length)]
+
+    def __call__(self, tokens):
+        """(batch, ayat) scores: mean logits, mean-probability log-probs or the routed member's logits"""
+        if self.combine == 'logits':
+            return self.mean_logits(tokens)
+        if self.combine == 'probs':
+            probs = torch.softmax(self.member_logits(tokens), dim=2).mean(dim=0)
+            return probs.clamp_min_(torch.finfo(probs.dtype).tiny).log_()
+
+        # Each member runs on its own inputs only; a padded batch would spend the others' FLOPs on padding
+        assignment = self.route(tokens)
+        # Sized up front so an empty batch (no member runs) still gets (0, ayat) scores
+        output_weight = self.layers[-1][0]
+        scores = output_weight.new_empty(tokens.shape[0], output_weight.shape[2])
+        for member in assignment.unique():
+            rows = (assignment == member).nonzero().squeeze(1)
+            scores[rows] = self.member_logits(tokens[rows], int(member))[0]
+        return scores
+
+def time_ms(fn, runs):
+    with torch.inference_mode():
+        fn()
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn()
+    return (time.perf_counter() - start) * 1000 / runs
+
+def main():
+    word_names = ['three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
+    parser = argparse.ArgumentParser(description='Fused QuranMatcherModel ensemble: parity and latency against a single model')
+    parser.add_argument('--models', nargs='+', default=[f'quran_matcher_first_{name}_words.pth' for name in word_names])
+    parser.add_argument('--word-counts', nargs='+', type=int, default=list(range(3, 11)))
+    parser.add_argument('--vocab', default='vocabulary_normalized.json')
+    parser.add_argument('--runs', type=int, default=100)
+    args = parser.parse_args()
+
+    vocabulary, vocab_size = load_vocabulary(args.vocab)
+    if all(os.path.exists(path) for path in args.models):
+        models = [load_checkpoint(path, vocabulary=vocabulary)[0] for path in args.models]
+        print(f'Loaded {len(models)} members: {", ".join(args.models)}')
+    else:
+        print('Member checkpoints not found, benchmarking randomly initialized weights')
+        models = []
+        for _ in args.word_counts:
+            models.append(QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=6204).eval())
+
+    start = time.perf_counter()
+    ensembles = {combine: QuranMatcherEnsemble(models, args.word_counts, combine, vocabulary) for combine in COMBINE_MODES}
+    print(f'Stacked {len(models)} members in {(time.perf_counter() - start) * 1000 / len(COMBINE_MODES):.1f}ms')
+    ensemble = ensembles['logits']
+    input_length = ensemble.input_length
+
+    # Parity of every member against its own PyTorch forward
+    tokens = torch.randint(0, vocab_size, (64, input_length))
+    with torch.no_grad():
+        expected = torch.stack([model(tokens) for model in models])
+    print(f'Max |member logit difference|: {(ensemble.member_logits(tokens) - expected).abs().max().item():.2e}')
+    routed = ensembles['route'](tokens)
+    assignment = ensembles['route'].route(tokens)
+    print(f'Max |routed logit difference|: {(routed - expected[assignment, torch.arange(len(tokens))]).abs().max().item():.2e}')
+    empty = tokens[:0]
+    shapes = {combine: tuple(ensembles[combine](empty).shape) for combine in COMBINE_MODES}
+    print('Empty batch: ' + ', '.join(f'{combine} {shape}' for combine, shape in shapes.items()))
+    if any(shape != (0, expected.shape[2]) for shape in shapes.values()):
+        raise RuntimeError(f'empty batch should give (0, {expected.shape[2]}) scores in every mode')
+
+    print(f'\n{"Batch":>6} {"1 model":>10} {"Sequential":>11} ' + ' '.join(f'{combine:>10}' for combine in COMBINE_MODES) + '   (ms per batch)')
+    for batch_size in (1, 32, 256):
+        tokens = torch.randint(0, vocab_size, (batch_size, input_length))
+        single_ms = time_ms(lambda: models[0](tokens), args.runs)
+        sequential_ms = time_ms(lambda: [model(tokens) for model in models], args.runs)
+        fused_ms = [time_ms(lambda: ensembles[combine](tokens), args.runs) for combine in COMBINE_MODES]
+        print(f'{batch_size:>6} {single_ms:>10.3f} {sequential_ms:>11.3f} ' + ' '.join(f'{ms:>10.3f}' for ms in fused_ms))
+
+if __name__ == '__main__':
+    main()
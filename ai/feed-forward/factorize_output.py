@@ -0,0 +1,200 @@
+"""
+Factorize the 6203-way output layer of a trained QuranMatcherModel
+
+fc3 is a dense hidden_size x 6203 matrix, the biggest block after fc1. This
+replaces it with a rank-r bottleneck (hidden_size -> r -> 6203) initialized
+from the truncated SVD of the trained weights, optionally distils it from
+the dense model for a few epochs, and prints the size / latency / accuracy
+trade-off for each rank.
+
+Distillation runs on the clean first 3-10 words of every ayah; accuracy and
+agreement are measured on a held-out set of distorted inputs (a skipped
+word, a late start, dropped characters) drawn once from --eval-seed, so the
+table reflects inputs the student was not fitted on.
+
+Usage:
+    python factorize_output.py --checkpoint quran_matcher_combined_6_to_10_words.pth --ranks 32 64 128 256 --distill-epochs 3
+"""
+import argparse
+import copy
+import io
+import os
+import time
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+from torch.utils.data import DataLoader, TensorDataset
+from functools import partial
+from model import QuranMatcherModel, factorize_output_layer, load_vocabulary
+from token_matrix import AyahTokenDataset, TruncatedTokenDataset, load_token_matrix, normalize_arabic
+from model_factory import checkpoint_info
+from batch_distortion import BatchDistortion, prefix_offset, random_deletion, random_truncation, skip_word
+
+def count_parameters(module):
+    return sum(p.numel() for p in module.parameters())
+
+def state_size_mb(model):
+    """Size of the serialized state dict in MB"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+def measure_latency(model, input_length, vocab_size, batch_size=1, runs=200):
+    """Average forward time in milliseconds"""
+    x = torch.randint(0, vocab_size, (batch_size, input_length))
+    with torch.inference_mode():
+        for _ in range(10):
+            model(x)
+        start = time.time()
+        for _ in range(runs):
+            model(x)
+    return (time.time() - start) * 1000 / runs
+
+def held_out_dataset(token_matrix, word_counts, max_length=60, repeats=1, seed=0):
+    """Distorted first-N-words samples of every ayah, drawn once from seed and kept fixed
+
+    The global RNG is forked, so drawing the set does not change the
+    distillation shuffle.
+    """
+    ayat = AyahTokenDataset(token_matrix)
+    distortion = BatchDistortion([
+        partial(skip_word, prob=0.5, space_token=ayat.space_token, pad_token=ayat.pad_token),
+        partial(prefix_offset, prob=0.5, max_offset=10, max_length=max_length, pad_token=ayat.pad_token),
+        partial(random_deletion, rate=0.1, prob=0.5, pad_token=ayat.pad_token),
+        partial(random_truncation, word_counts=word_counts, full_prob=0.0, space_token=ayat.space_token,
+                pad_token=ayat.pad_token),
+    ], max_length, ayat.pad_token)
+    with torch.random.fork_rng():
+        torch.manual_seed(seed)
+        inputs, targets = zip(*[distortion([ayat[i] for i in range(len(ayat))]) for _ in range(repeats)])
+    return TensorDataset(torch.cat(inputs), torch.cat(targets))
+
+def evaluate(model, teacher, loader, device):
+    """Top-1 accuracy, and top-1 agreement with the dense teacher"""
+    model.eval()
+    correct = 0
+    agree = 0
+    total = 0
+    with torch.inference_mode():
+        for data, target in loader:
+            data, target = data.to(device), target.to(device)
+            predicted = model(data).argmax(dim=1)
+            correct += (predicted == target).sum().item()
+            agree += (predicted == teacher(data).argmax(dim=1)).sum().item()
+            total += target.size(0)
+    return 100 * correct / total, 100 * agree / total
+
+def distill(student, teacher, loader, device, epochs=3, lr=0.0005, temperature=2.0, alpha=0.5):
+    """Fine-tune the factorized fc3 against the dense teacher's soft targets
+
+    Only the output layer is trained; the shared trunk stays as it was.
+    """
+    for p in student.parameters():
+        p.requires_grad = False
+    for p in student.fc3.parameters():
+        p.requires_grad = True
+
+    optimizer = optim.Adam(student.fc3.parameters(), lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    student.train()
+    for epoch in range(epochs):
+        total_loss = 0
+        for data, target in loader:
+            data, target = data.to(device), target.to(device)
+            with torch.no_grad():
+                teacher_logits = teacher(data)
+            logits = student(data)
+
+            soft_loss = F.kl_div(
+                F.log_softmax(logits / temperature, dim=1),
+                F.softmax(teacher_logits / temperature, dim=1),
+                reduction='batchmean'
+            ) * temperature * temperature
+            loss = alpha * soft_loss + (1 - alpha) * criterion(logits, target)
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+        print(f'    Distill epoch {epoch+1}/{epochs}: Avg Loss: {total_loss / len(loader):.4f}')
+
+    for p in student.parameters():
+        p.requires_grad = True
+    student.eval()
+    return student
+
+def main():
+    parser = argparse.ArgumentParser(description='Low-rank factorization of the QuranMatcherModel output layer')
+    parser.add_argument('--checkpoint', default='quran_matcher_combined_6_to_10_words.pth')
+    parser.add_argument('--vocab', default='vocabulary_normalized.json')
+    parser.add_argument('--quran', default='../Muhaffez/quran-simple-min.txt')
+    parser.add_argument('--input-length', type=int, default=60)
+    parser.add_argument('--hidden-size', type=int, default=512)
+    parser.add_argument('--ranks', type=int, nargs='+', default=[32, 64, 128, 256])
+    parser.add_argument('--distill-epochs', type=int, default=0)
+    parser.add_argument('--eval-repeats', type=int, default=2, help='Distorted samples of every ayah in the held-out set')
+    parser.add_argument('--eval-seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    device = torch.device('cpu')
+    vocabulary, vocab_size = load_vocabulary(args.vocab)
+    token_matrix = load_token_matrix(args.quran, args.vocab)
+
+    if not os.path.exists(args.checkpoint):
+        print(f'Error: checkpoint not found at {args.checkpoint}')
+        return
+
+    checkpoint = torch.load(args.checkpoint, map_location=device)
+    teacher = QuranMatcherModel(vocab_size=vocab_size, input_length=args.input_length,
+                                hidden_size=args.hidden_size, output_size=checkpoint['output_size'])
+    teacher.load_state_dict(checkpoint['model_state_dict'])
+    teacher.eval()
+
+    word_counts = list(range(3, 11))
+    train_dataset = TruncatedTokenDataset(token_matrix, word_counts=word_counts, max_length=args.input_length)
+    train_loader = DataLoader(train_dataset, batch_size=64, shuffle=True)
+    eval_dataset = held_out_dataset(token_matrix, word_counts, max_length=args.input_length,
+                                    repeats=args.eval_repeats, seed=args.eval_seed)
+    eval_loader = DataLoader(eval_dataset, batch_size=512, shuffle=False)
+
+    rows = []
+    accuracy, _ = evaluate(teacher, teacher, eval_loader, device)
+    rows.append(('dense', count_parameters(teacher.fc3), state_size_mb(teacher),
+                 measure_latency(teacher, args.input_length, vocab_size, 1),
+                 measure_latency(teacher, args.input_length, vocab_size, 256), accuracy, 100.0))
+
+    base_name = os.path.splitext(args.checkpoint)[0]
+    for rank in args.ranks:
+        print(f'\nRank {rank}: SVD initialization...')
+        student = factorize_output_layer(copy.deepcopy(teacher), rank)
+        if args.distill_epochs > 0:
+            distill(student, teacher, train_loader, device, epochs=args.distill_epochs)
+
+        accuracy, agreement = evaluate(student, teacher, eval_loader, device)
+        rows.append((f'rank {rank}', count_parameters(student.fc3), state_size_mb(student),
+                     measure_latency(student, args.input_length, vocab_size, 1),
+                     measure_latency(student, args.input_length, vocab_size, 256), accuracy, agreement))
+
+        output_path = f'{base_name}_rank{rank}.pth'
+        torch.save({
+            'model_state_dict': student.state_dict(),
+            'vocab_size': vocab_size,
+            'output_size': checkpoint['output_size'],
+            'output_rank': rank,
+            'accuracy': accuracy,
+            **checkpoint_info(student, args.vocab, normalize_arabic),
+        }, output_path)
+        print(f'✓ Saved {output_path}')
+
+    print(f'\n{"="*92}')
+    print(f'OUTPUT LAYER TRADE-OFF (held-out distorted first 3-10 words, {len(eval_dataset)} samples)')
+    print(f'{"="*92}')
+    print(f'{"Layer":<10} {"fc3 params":>12} {"Model MB":>10} {"ms (b=1)":>10} {"ms (b=256)":>11} {"Accuracy":>10} {"Agreement":>10}')
+    print(f'{"-"*92}')
+    for name, params, size, latency_1, latency_256, accuracy, agreement in rows:
+        print(f'{name:<10} {params:>12,} {size:>10.2f} {latency_1:>10.3f} {latency_256:>11.3f} {accuracy:>9.2f}% {agreement:>9.2f}%')
+    print(f'{"="*92}')
+
+if __name__ == '__main__':
+    main()
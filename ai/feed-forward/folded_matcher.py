@@ -0,0 +1,160 @@
+"""
+Folded embedding + fc1 inference engine for QuranMatcherModel
+
+fc1 sees the flattened (input_length x 64) embedding, so its pre-activation
+is a sum over positions of one 512-vector per (position, token) pair:
+
+    fc1(x) = b1 + sum_p W1[:, p] @ E[x_p] = b1 + sum_p T[p, x_p]
+
+With the 34-token normalized vocabulary and 60 positions, T is only
+60 x 34 x 512 floats, so the first layer becomes a gather-and-sum. It also
+means a stream of recognized characters can update the pre-activation in
+place: the character at position p replaces T[p, <PAD>] with T[p, token].
+"""
+import os
+import time
+import torch
+import torch.nn.functional as F
+from model import QuranMatcherModel, load_vocabulary
+from token_matrix import normalize_arabic
+
+class FoldedQuranMatcher:
+    """QuranMatcherModel with embedding and fc1 folded into a lookup table"""
+    def __init__(self, model, vocabulary=None):
+        model.eval()
+        self.vocabulary = vocabulary
+        self.input_length = model.input_length
+        self.vocab_size = model.vocab_size
+        self.pad_token = vocabulary.get('<PAD>', 0) if vocabulary else 0
+        self.unk_token = vocabulary.get('<UNK>', 1) if vocabulary else 1
+
+        with torch.no_grad():
+            embedding = model.embedding.weight                      # (vocab_size, 64)
+            hidden_size = model.fc1.weight.shape[0]
+            fc1_weight = model.fc1.weight.view(hidden_size, self.input_length, -1)
+            # table[p, v] = W1[:, p] @ E[v]  ->  (input_length, vocab_size, hidden_size)
+            self.table = torch.einsum('hpd,vd->pvh', fc1_weight, embedding).contiguous()
+            self.flat_table = self.table.view(-1, hidden_size)
+            self.bias = model.fc1.bias.clone()
+            # Pre-activation of an all-<PAD> input, the starting point for streaming
+            self.empty_pre = self.bias + self.table[:, self.pad_token].sum(dim=0)
+
+        self.fc2 = model.fc2
+        self.fc3 = model.fc3
+        self.position_offsets = torch.arange(self.input_length) * self.vocab_size
+
+    def pre_activation(self, tokens):
+        """fc1 pre-activation for a (batch_size, input_length) token tensor"""
+        indices = tokens + self.position_offsets.to(tokens.device)
+        return F.embedding_bag(indices, self.flat_table, mode='sum') + self.bias
+
+    def logits_from_pre_activation(self, pre):
+        """Run the layers after fc1 (dropout is a no-op at inference)"""
+        x = torch.relu(pre)
+        x = torch.relu(self.fc2(x))
+        return self.fc3(x)
+
+    def __call__(self, tokens):
+        with torch.no_grad():
+            return self.logits_from_pre_activation(self.pre_activation(tokens))
+
+    def stream(self):
+        return MatcherStream(self)
+
+class MatcherStream:
+    """Streaming recognition state: O(1) pre-activation update per character"""
+    def __init__(self, folded):
+        self.folded = folded
+        self.tokens = []
+        self.pre = folded.empty_pre.clone()
+
+    def reset(self):
+        self.tokens = []
+        self.pre = self.folded.empty_pre.clone()
+
+    def push(self, token):
+        """Append one token; characters past input_length are ignored like in tokenize()"""
+        position = len(self.tokens)
+        self.tokens.append(token)
+        if position < self.folded.input_length:
+            table = self.folded.table[position]
+            self.pre += table[token] - table[self.folded.pad_token]
+
+    def pop(self):
+        """Remove the last token, e.g. when the recognizer revises a character"""
+        token = self.tokens.pop()
+        position = len(self.tokens)
+        if position < self.folded.input_length:
+            table = self.folded.table[position]
+            self.pre += table[self.folded.pad_token] - table[token]
+        return token
+
+    def push_text(self, text):
+        """Normalize newly recognized text and append its characters"""
+        for char in normalize_arabic(text):
+            self.push(self.folded.vocabulary.get(char, self.folded.unk_token))
+
+    def logits(self):
+        with torch.no_grad():
+            return self.folded.logits_from_pre_activation(self.pre.unsqueeze(0))[0]
+
+    def top_k(self, k=5):
+        """Top-k (ayah index, probability) pairs for the text so far"""
+        logits = self.logits()
+        top_logits, top_indices = torch.topk(logits, k)
+        log_norm = torch.logsumexp(logits, dim=0)
+        return [(idx.item(), torch.exp(logit - log_norm).item()) for logit, idx in zip(top_logits, top_indices)]
+
+def main():
+    vocabulary, vocab_size = load_vocabulary('vocabulary_normalized.json')
+    model_path = 'quran_matcher_combined_6_to_10_words.pth'
+
+    model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=6204)
+    if os.path.exists(model_path):
+        checkpoint = torch.load(model_path, map_location='cpu')
+        model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=checkpoint['output_size'])
+        model.load_state_dict(checkpoint['model_state_dict'])
+        print(f'Model loaded from {model_path}')
+    else:
+        print(f'{model_path} not found, benchmarking randomly initialized weights')
+    model.eval()
+
+    start = time.time()
+    folded = FoldedQuranMatcher(model, vocabulary)
+    print(f'Folded table {tuple(folded.table.shape)} built in {(time.time() - start) * 1000:.1f}ms')
+
+    # Parity against the PyTorch forward
+    tokens = torch.randint(0, vocab_size, (256, 60))
+    with torch.no_grad():
+        expected = model(tokens)
+    actual = folded(tokens)
+    print(f'Max |logit difference|: {(expected - actual).abs().max().item():.2e}')
+
+    runs = 200
+    single = tokens[:1]
+    with torch.no_grad():
+        start = time.time()
+        for _ in range(runs):
+            model(single)
+        model_ms = (time.time() - start) * 1000 / runs
+
+    start = time.time()
+    for _ in range(runs):
+        folded(single)
+    folded_ms = (time.time() - start) * 1000 / runs
+
+    # Streaming: one character arrives, then the logits are refreshed
+    stream = folded.stream()
+    text = 'يا ايها الذين امنوا اوفوا بالعقود احلت لكم بهيمة الانعام'
+    start = time.time()
+    for char in text:
+        stream.push(vocabulary.get(char, folded.unk_token))
+        stream.logits()
+    stream_ms = (time.time() - start) * 1000 / len(text)
+
+    print(f'Full forward (batch 1):    {model_ms:.3f}ms')
+    print(f'Folded forward (batch 1):  {folded_ms:.3f}ms')
+    print(f'Streaming update + logits: {stream_ms:.3f}ms per character')
+
+if __name__ == '__main__':
+    main()
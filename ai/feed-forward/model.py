@@ -1,10 +1,15 @@
 import json
+import os
+import sys
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transformer', 'model'))
+from quran_corpus import QuranCorpus, is_corpus_file
+
 class QuranAyahDataset(Dataset):
     def __init__(self, ayat_list, vocabulary, max_length=70):
         self.ayat = ayat_list
@@ -44,11 +49,12 @@ class QuranAyahDataset(Dataset):
         return x, y
 
 class QuranMatcherModel(nn.Module):
-    def __init__(self, vocab_size, input_length=70, hidden_size=256, output_size=6203):
+    def __init__(self, vocab_size, input_length=70, hidden_size=256, output_size=6203, output_rank=None):
         super(QuranMatcherModel, self).__init__()
 
         self.vocab_size = vocab_size
         self.input_length = input_length
+        self.output_rank = output_rank
 
         # Embedding layer to convert tokens to dense vectors
         self.embedding = nn.Embedding(vocab_size, 64)
@@ -65,10 +71,10 @@ class QuranMatcherModel(nn.Module):
         self.relu2 = nn.ReLU()
         self.dropout2 = nn.Dropout(0.3)
 
-        # Output layer
-        self.fc3 = nn.Linear(hidden_size, output_size)
+        # Output layer (optionally factorized: hidden -> output_rank -> output)
+        self.fc3 = output_layer(hidden_size, output_size, output_rank)
 
-    def forward(self, x):
+    def features(self, x):
         # x shape: (batch_size, input_length)
         x = self.embedding(x)  # (batch_size, input_length, 64)
         x = self.flatten(x)    # (batch_size, input_length * 64)
@@ -80,13 +86,126 @@ class QuranMatcherModel(nn.Module):
         x = self.fc2(x)
         x = self.relu2(x)
         x = self.dropout2(x)
+        return x  # (batch_size, hidden_size), the input of fc3
 
+    def forward(self, x):
+        x = self.features(x)
         x = self.fc3(x)
 
         return x  # Raw logits, softmax applied in loss function
 
+    def config(self):
+        """Constructor arguments that rebuild this architecture"""
+        return {
+            'vocab_size': self.vocab_size,
+            'input_length': self.input_length,
+            'hidden_size': self.fc1.out_features,
+            'output_size': output_features(self.fc3),
+            'output_rank': self.output_rank,
+        }
+
+class MultiLengthMatcherModel(QuranMatcherModel):
+    """QuranMatcherModel with one output head per truncation length
+
+    The embedding, fc1 and fc2 form a trunk shared by every length
+    (train_multi_length.py). fc3 is a ModuleList with one output layer per
+    entry of word_counts, and each input is scored by the head of the word
+    count closest to its own (ties go to the shorter one), counted from its
+    tokens. Only the heads that have inputs in a batch run.
+    """
+    def __init__(self, vocab_size, input_length=60, hidden_size=512, output_size=6203, output_rank=None,
+                 word_counts=(3, 4, 5, 6, 7, 8, 9, 10), pad_token=0, space_token=2):
+        super().__init__(vocab_size, input_length, hidden_size, output_size, output_rank)
+        self.word_counts = list(word_counts)
+        self.pad_token = pad_token
+        self.space_token = space_token
+        self.fc3 = nn.ModuleList([output_layer(hidden_size, output_size, output_rank) for _ in self.word_counts])
+        self.register_buffer('head_table', nearest_word_count_table(self.word_counts, input_length))
+
+    def heads(self, x):
+        """Head index for each (batch_size, input_length) token row"""
+        return self.head_table[count_words(x, self.pad_token, self.space_token).clamp(max=self.input_length)]
+
+    def forward(self, x, heads=None):
+        heads = self.heads(x) if heads is None else heads
+        features = self.features(x)
+        used = heads.unique().tolist()
+        if len(used) == 1:
+            return self.fc3[used[0]](features)
+        # Sized up front so an empty batch (no used head) still gets (0, output_size) logits
+        logits = features.new_zeros(x.shape[0], output_features(self.fc3[0]))
+        for head in used:
+            rows = (heads == head).nonzero().squeeze(1)
+            logits = logits.index_copy(0, rows, self.fc3[head](features[rows]))
+        return logits
+
+    def config(self):
+        return {
+            'vocab_size': self.vocab_size,
+            'input_length': self.input_length,
+            'hidden_size': self.fc1.out_features,
+            'output_size': output_features(self.fc3[0]),
+            'output_rank': self.output_rank,
+            'word_counts': self.word_counts,
+            'pad_token': self.pad_token,
+            'space_token': self.space_token,
+        }
+
+def output_layer(hidden_size, output_size, output_rank=None):
+    """Dense fc3, or a hidden -> output_rank -> output factorization"""
+    if output_rank:
+        return nn.Sequential(
+            nn.Linear(hidden_size, output_rank, bias=False),
+            nn.Linear(output_rank, output_size)
+        )
+    return nn.Linear(hidden_size, output_size)
+
+def output_features(layer):
+    """Number of ayat scored by an output layer from output_layer()"""
+    return layer[-1].out_features if isinstance(layer, nn.Sequential) else layer.out_features
+
+def count_words(tokens, pad_token=0, space_token=2):
+    """Number of words in each (batch_size, input_length) token row"""
+    is_char = (tokens != pad_token) & (tokens != space_token)
+    starts = is_char.clone()
+    starts[:, 1:] &= ~is_char[:, :-1]
+    return starts.sum(dim=1)
+
+def nearest_word_count_table(word_counts, max_words):
+    """table[w] = index of the word count closest to w (ties go to the shorter), for w in 0..max_words"""
+    return torch.tensor([min(range(len(word_counts)), key=lambda i: (abs(word_counts[i] - w), word_counts[i]))
+                         for w in range(max_words + 1)])
+
+def factorize_output_layer(model, output_rank):
+    """Replace a dense fc3 with a rank-output_rank factorization initialized by truncated SVD"""
+    weight = model.fc3.weight.data          # (output_size, hidden_size)
+    bias = model.fc3.bias.data
+    U, S, Vh = torch.linalg.svd(weight, full_matrices=False)
+    root_s = S[:output_rank].sqrt()
+
+    hidden_size = weight.shape[1]
+    output_size = weight.shape[0]
+    fc3 = nn.Sequential(
+        nn.Linear(hidden_size, output_rank, bias=False),
+        nn.Linear(output_rank, output_size)
+    ).to(weight.device)
+    fc3[0].weight.data.copy_(root_s.unsqueeze(1) * Vh[:output_rank])
+    fc3[1].weight.data.copy_(U[:, :output_rank] * root_s.unsqueeze(0))
+    fc3[1].bias.data.copy_(bias)
+
+    model.fc3 = fc3
+    model.output_rank = output_rank
+    return model
+
 def load_quran_data(quran_path):
-    """Load Quran text and filter out empty lines and markers"""
+    """Load Quran text and filter out empty lines and markers
+
+    quran_path can also be a corpus file from
+    ai/transformer/tools/build_corpus.py, which holds the normalized ayat.
+    """
+    if is_corpus_file(quran_path):
+        return QuranCorpus.open(quran_path).ayat()
+
     with open(quran_path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
 
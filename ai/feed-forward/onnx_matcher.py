@@ -0,0 +1,132 @@
+"""
+ONNX export and onnxruntime inference for QuranMatcherModel
+
+The batch axis is dynamic. The sequence axis is not: fc1 consumes the
+flattened (input_length x 64) embedding, so every input is padded or
+truncated to the model's input_length, as QuranPredictor.tokenize_batch
+already does.
+
+OnnxQuranPredictor is a QuranPredictor whose model runs in onnxruntime;
+tokenization, the result cache and the prefix index are unchanged.
+Needs onnx (export) and onnxruntime (inference).
+"""
+import argparse
+import os
+import time
+import numpy as np
+import torch
+from model import load_vocabulary
+from predict import QuranPredictor
+
+def export_matcher_onnx(model, output_path, opset=17):
+    """Export QuranMatcherModel with a dynamic batch axis: tokens (batch, input_length) -> logits (batch, ayat)"""
+    model.eval()
+    example = torch.zeros(2, model.input_length, dtype=torch.long)
+    torch.onnx.export(
+        model, (example,), output_path,
+        input_names=['tokens'], output_names=['logits'],
+        dynamic_axes={'tokens': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset, dynamo=False,
+    )
+
+def create_session(path, num_threads=None):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+class OnnxQuranPredictor(QuranPredictor):
+    """QuranPredictor with the model forward in onnxruntime
+
+    onnx_path is exported from the checkpoint first if it does not exist.
+    """
+    def __init__(self, model_path, vocab_path, quran_path, onnx_path=None, num_threads=None, **kwargs):
+        super().__init__(model_path, vocab_path, quran_path, **kwargs)
+        self.onnx_path = onnx_path or os.path.splitext(model_path)[0] + '.onnx'
+        if not os.path.exists(self.onnx_path):
+            export_matcher_onnx(self.model, self.onnx_path)
+        self.session = create_session(self.onnx_path, num_threads)
+
+    def logits(self, x):
+        """(batch_size, ayat) logits for a (batch_size, input_length) token tensor, as numpy"""
+        return self.session.run(None, {'tokens': x.numpy()})[0]
+
+    def predict_tokens(self, x, top_k, return_log_probs=False):
+        """Top-k predictions for a (batch_size, input_length) token tensor"""
+        logits = self.logits(x)
+        top_indices = np.argpartition(-logits, top_k - 1, axis=1)[:, :top_k]
+        top_logits = np.take_along_axis(logits, top_indices, axis=1)
+        order = np.argsort(-top_logits, axis=1, kind='stable')
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        top_logits = np.take_along_axis(top_logits, order, axis=1)
+        peak = logits.max(axis=1, keepdims=True)
+        log_norm = peak + np.log(np.exp(logits - peak).sum(axis=1, keepdims=True))
+        top_log_probs = top_logits - log_norm
+
+        results = []
+        for log_probs, indices in zip(top_log_probs.tolist(), top_indices.tolist()):
+            predictions = []
+            for log_prob, idx in zip(log_probs, indices):
+                prediction = {'index': idx}
+                if return_log_probs:
+                    prediction['log_probability'] = log_prob
+                else:
+                    prediction['probability'] = float(np.exp(log_prob))
+                prediction['ayah'] = self.ayat[idx]
+                predictions.append(prediction)
+            results.append(predictions)
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Export QuranMatcherModel to ONNX and compare onnxruntime with PyTorch')
+    parser.add_argument('--model', default='quran_matcher_combined_6_to_10_words.pth')
+    parser.add_argument('--vocab', default='vocabulary_normalized.json')
+    parser.add_argument('--quran', default='../../Muhaffez/Models/quran-simple-min.txt')
+    parser.add_argument('--output', help='ONNX path (default: the checkpoint path with .onnx)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f'Error: Model file not found at {args.model}')
+        return 1
+    onnx_path = args.output or os.path.splitext(args.model)[0] + '.onnx'
+
+    start = time.time()
+    predictor = OnnxQuranPredictor(args.model, args.vocab, args.quran, onnx_path=onnx_path)
+    print(f'Exported/loaded {onnx_path} in {(time.time() - start) * 1000:.0f}ms ({os.path.getsize(onnx_path) / 1024 / 1024:.1f} MB)')
+    model = predictor.model
+    vocabulary, vocab_size = load_vocabulary(args.vocab)
+
+    # Logits parity at batch sizes other than the traced one
+    worst = 0.0
+    for batch_size in (1, 7, 256):
+        tokens = torch.randint(0, vocab_size, (batch_size, model.input_length))
+        with torch.no_grad():
+            expected = model(tokens).numpy()
+        worst = max(worst, float(np.abs(predictor.logits(tokens) - expected).max()))
+    print(f'Max |logit difference|: {worst:.2e}')
+
+    # Top-k parity through predict_batch
+    texts = [' '.join(ayah.split()[:n]) for ayah in predictor.ayat[::25] for n in (3, 6)]
+    expected = QuranPredictor.predict_tokens(predictor, predictor.tokenize_batch(texts, model.input_length), 5)
+    onnx_results = predictor.predict_batch(texts, top_k=5)
+    mismatches = sum([p['index'] for p in a] != [p['index'] for p in b] for a, b in zip(onnx_results, expected))
+    print(f'Top-5 parity: {"identical" if mismatches == 0 else f"{mismatches} mismatches"} ({len(texts)} inputs)')
+
+    runs = 200
+    for batch_size in (1, 256):
+        tokens = predictor.tokenize_batch(texts[:batch_size], model.input_length)
+        with torch.inference_mode():
+            start = time.time()
+            for _ in range(runs):
+                model(tokens)
+            torch_ms = (time.time() - start) * 1000 / runs
+        start = time.time()
+        for _ in range(runs):
+            predictor.logits(tokens)
+        onnx_ms = (time.time() - start) * 1000 / runs
+        print(f'Forward (batch {batch_size:>3}): PyTorch {torch_ms:.3f}ms, onnxruntime {onnx_ms:.3f}ms ({torch_ms / onnx_ms:.2f}x)')
+    return 0 if mismatches == 0 else 1
+
+if __name__ == '__main__':
+    exit(main())
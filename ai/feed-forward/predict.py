@@ -1,26 +1,49 @@
+import argparse
 import json
+import os
+import sys
+import time
+import numpy as np
 import torch
 import torch.nn.functional as F
-from model import QuranMatcherModel, load_quran_data, load_vocabulary
+from model import load_quran_data, load_vocabulary
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transformer', 'model'))
+from result_cache import ResultCache, file_fingerprint
+from prefix_index import AyahPrefixIndex
+from token_matrix import normalize_arabic
+from model_factory import load_checkpoint
 
 class QuranPredictor:
-    def __init__(self, model_path, vocab_path, quran_path):
+    def __init__(self, model_path, vocab_path, quran_path, cache_size=0, cache_path=None, prefix_index=False):
         # Load vocabulary
         self.vocabulary, self.vocab_size = load_vocabulary(vocab_path)
         
         # Load ayat
         self.ayat = load_quran_data(quran_path)
         
-        # Load model
-        checkpoint = torch.load(model_path, map_location=torch.device('cpu'))
-        self.model = QuranMatcherModel(
-            vocab_size=checkpoint['vocab_size'],
-            input_length=70,
-            hidden_size=512,
-            output_size=checkpoint['output_size']
-        )
-        self.model.load_state_dict(checkpoint['model_state_dict'])
-        self.model.eval()
+        # Any matcher checkpoint or inference artifact, refused if trained with another vocabulary.
+        # Without model_path the caller assigns self.model before predicting (see model_registry.py)
+        self.model, self.model_info = None, {}
+        if model_path:
+            self.model, self.model_info = load_checkpoint(model_path, vocabulary=self.vocabulary)
+
+        # Codepoint -> token lookup table for vectorized batch tokenization
+        pad_token = self.vocabulary.get('<PAD>', 0)
+        unk_token = self.vocabulary.get('<UNK>', 1)
+        chars = [c for c in self.vocabulary if len(c) == 1]
+        self.char_lut = np.full(max(ord(c) for c in chars) + 2, unk_token, dtype=np.int64)
+        for char in chars:
+            self.char_lut[ord(char)] = self.vocabulary[char]
+        self.pad_token = pad_token
+
+        # Results keyed on the model's input tokens, tied to this checkpoint + vocabulary
+        self.cache = None
+        if cache_size and model_path:
+            self.cache = ResultCache(cache_size, cache_path, fingerprint=file_fingerprint(model_path, vocab_path))
+
+        # Inputs that are the exact opening of a single ayah skip the model
+        self.prefix_index = AyahPrefixIndex(self.ayat, normalize=normalize_arabic) if prefix_index else None
 
         print(f"Model loaded successfully!")
         print(f"Vocabulary size: {self.vocab_size}")
@@ -44,30 +67,121 @@ class QuranPredictor:
         
         return tokens
     
+    def tokenize_batch(self, texts, max_length=70):
+        """Tokenize many texts at once into a (len(texts), max_length) tensor"""
+        texts = [text[:max_length] for text in texts]
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        tokens = np.full((len(texts), max_length), self.pad_token, dtype=np.int64)
+        if lengths.sum() == 0:
+            return torch.from_numpy(tokens)
+
+        # All characters of the batch as one codepoint array, looked up in one go
+        codepoints = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        codepoints = np.minimum(codepoints, len(self.char_lut) - 1)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        starts = np.cumsum(lengths) - lengths
+        cols = np.arange(len(codepoints)) - np.repeat(starts, lengths)
+        tokens[rows, cols] = self.char_lut[codepoints]
+        return torch.from_numpy(tokens)
+
     def predict(self, partial_ayah, top_k=5):
         """Predict the most likely ayah for the given partial text"""
-        # Tokenize input
-        tokens = self.tokenize(partial_ayah)
-        x = torch.tensor([tokens], dtype=torch.long)
-        
-        # Get predictions
-        with torch.no_grad():
-            output = self.model(x)
-            probabilities = F.softmax(output, dim=1)[0]
-        
-        # Get top-k predictions
-        top_probs, top_indices = torch.topk(probabilities, top_k)
-        
+        return self.predict_batch([partial_ayah], top_k=top_k)[0]
+
+    def predict_batch(self, partial_ayat, top_k=5, batch_size=1024, return_log_probs=False):
+        """Predict the most likely ayat for many partial texts
+
+        Runs the model in chunks of batch_size and takes top-k on the raw
+        logits; only the k selected entries are normalized, via logsumexp.
+        With a cache, only inputs whose tokens were not seen before reach
+        the model. With the prefix index, an input of at least
+        prefix_index.min_words words that is the exact opening of a single
+        ayah gets that ayah first with probability 1, followed by the
+        model's next top_k - 1 predictions (with top_k=1 the model is
+        skipped for it).
+        """
+        if self.prefix_index is None:
+            return self.predict_model(partial_ayat, top_k, batch_size, return_log_probs)
+
+        pinned = {}
+        for i, text in enumerate(partial_ayat):
+            candidates = self.prefix_index.match(text)
+            if len(candidates) == 1:
+                pinned[i] = candidates[0]
+        self.prefix_index.pinned += len(pinned)
+
+        results = [None] * len(partial_ayat)
+        remaining = [i for i in range(len(partial_ayat)) if top_k > 1 or i not in pinned]
+        # Only rows taken out of the model's batch are short circuits
+        self.prefix_index.short_circuits += len(partial_ayat) - len(remaining)
+        if remaining:
+            predicted = self.predict_model([partial_ayat[i] for i in remaining], top_k, batch_size, return_log_probs)
+            for i, predictions in zip(remaining, predicted):
+                results[i] = predictions
+        for i, idx in pinned.items():
+            prediction = {'index': idx}
+            if return_log_probs:
+                prediction['log_probability'] = 0.0
+            else:
+                prediction['probability'] = 1.0
+            prediction['ayah'] = self.ayat[idx]
+            others = [other for other in results[i] or [] if other['index'] != idx]
+            results[i] = [prediction] + others[:top_k - 1]
+        return results
+
+    def predict_model(self, partial_ayat, top_k=5, batch_size=1024, return_log_probs=False):
+        """predict_batch through the model (and cache) only"""
         results = []
-        for prob, idx in zip(top_probs, top_indices):
-            results.append({
-                'index': idx.item(),
-                'probability': prob.item(),
-                'ayah': self.ayat[idx.item()]
-            })
-        
+        for start in range(0, len(partial_ayat), batch_size):
+            x = self.tokenize_batch(partial_ayat[start:start + batch_size], max_length=self.model.input_length)
+            if self.cache is None:
+                results.extend(self.predict_tokens(x, top_k, return_log_probs))
+                continue
+
+            keys = [self.cache_key(row, top_k, return_log_probs) for row in x.tolist()]
+            chunk_results = [self.cache.get(key) for key in keys]
+            missing = [i for i, result in enumerate(chunk_results) if result is None]
+            if missing:
+                for i, predictions in zip(missing, self.predict_tokens(x[missing], top_k, return_log_probs)):
+                    self.cache.put(keys[i], predictions)
+                    chunk_results[i] = predictions
+            results.extend([dict(prediction) for prediction in predictions] for predictions in chunk_results)
+
         return results
-    
+
+    def predict_tokens(self, x, top_k, return_log_probs=False):
+        """Top-k predictions for a (batch_size, input_length) token tensor"""
+        results = []
+        with torch.inference_mode():
+            logits = self.model(x)
+            top_logits, top_indices = torch.topk(logits, top_k, dim=1)
+            top_log_probs = top_logits - torch.logsumexp(logits, dim=1, keepdim=True)
+
+        for log_probs, indices in zip(top_log_probs.tolist(), top_indices.tolist()):
+            predictions = []
+            for log_prob, idx in zip(log_probs, indices):
+                prediction = {'index': idx}
+                if return_log_probs:
+                    prediction['log_probability'] = log_prob
+                else:
+                    prediction['probability'] = float(np.exp(log_prob))
+                prediction['ayah'] = self.ayat[idx]
+                predictions.append(prediction)
+            results.append(predictions)
+        return results
+
+    def cache_key(self, tokens, top_k, return_log_probs=False):
+        """Input tokens without trailing padding, plus the output options"""
+        length = len(tokens)
+        while length and tokens[length - 1] == self.pad_token:
+            length -= 1
+        return (top_k, return_log_probs) + tuple(tokens[:length])
+
+    def save_cache(self):
+        if self.cache is not None:
+            self.cache.save()
+            print(f"Result cache: {self.cache.stats()}")
+
     def get_full_output(self, partial_ayah):
         """Get full probability distribution for all ayat"""
         tokens = self.tokenize(partial_ayah)
@@ -79,13 +193,77 @@ class QuranPredictor:
         
         return probabilities.numpy()
 
+def read_inputs(input_path):
+    """Yield non-empty, non-comment lines from a text file of inputs"""
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+def predict_file(predictor, input_path, output_path, top_k=3, batch_size=1024, return_log_probs=False):
+    """Stream inputs from a text file to a JSONL file of predictions"""
+    total = 0
+    model_time = 0.0
+    start_time = time.time()
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        def write_chunk(chunk):
+            nonlocal model_time
+            chunk_start = time.time()
+            results = predictor.predict_batch(chunk, top_k=top_k, batch_size=batch_size, return_log_probs=return_log_probs)
+            model_time += time.time() - chunk_start
+            for text, predictions in zip(chunk, results):
+                out.write(json.dumps({'input': text, 'predictions': predictions}, ensure_ascii=False) + '\n')
+            return len(chunk)
+
+        chunk = []
+        for line in read_inputs(input_path):
+            chunk.append(line)
+            if len(chunk) == batch_size:
+                total += write_chunk(chunk)
+                chunk = []
+        if chunk:
+            total += write_chunk(chunk)
+
+    elapsed = time.time() - start_time
+    print(f'✓ {total} inputs written to {output_path}')
+    print(f'  Total time: {elapsed:.2f}s ({total / elapsed if elapsed > 0 else 0:.1f} inputs/s)')
+    print(f'  Prediction time: {model_time:.2f}s ({total / model_time if model_time > 0 else 0:.1f} inputs/s)')
+    return total
+
 def main():
+    parser = argparse.ArgumentParser(description='Quran ayah predictor')
+    parser.add_argument('--model', default='quran_matcher_model.pth')
+    parser.add_argument('--vocab', default='vocabulary.json')
+    parser.add_argument('--quran', default='../Muhaffez/quran-simple-min.txt')
+    parser.add_argument('--input-file', help='Text file with one partial ayah per line')
+    parser.add_argument('--output', default='predictions.jsonl', help='JSONL file for --input-file results')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--log-probs', action='store_true', help='Write log-probabilities instead of probabilities')
+    parser.add_argument('--cache-size', type=int, default=0, help='Keep up to this many results in an LRU cache')
+    parser.add_argument('--cache-path', help='JSON file the result cache is loaded from and saved to')
+    parser.add_argument('--prefix-index', action='store_true', help='Answer exact ayah openings without the model')
+    args = parser.parse_args()
+
     # Initialize predictor
     predictor = QuranPredictor(
-        model_path='quran_matcher_model.pth',
-        vocab_path='vocabulary.json',
-        quran_path='../Muhaffez/quran-simple-min.txt'
+        model_path=args.model,
+        vocab_path=args.vocab,
+        quran_path=args.quran,
+        cache_size=args.cache_size,
+        cache_path=args.cache_path,
+        prefix_index=args.prefix_index
     )
+
+    if args.input_file:
+        predict_file(predictor, args.input_file, args.output, top_k=args.top_k,
+                     batch_size=args.batch_size, return_log_probs=args.log_probs)
+        predictor.save_cache()
+        if predictor.prefix_index is not None:
+            print(f'Prefix index: {predictor.prefix_index.stats()}')
+        return
     
     # Load test inputs from file
     test_inputs = []
@@ -124,6 +302,7 @@ def main():
     while True:
         user_input = input("\nEnter partial ayah: ").strip()
         if user_input.lower() in ['quit', 'exit', 'q']:
+            predictor.save_cache()
             break
         
         if not user_input:
@@ -0,0 +1,214 @@
+"""
+Precomputed token matrix for the whole Quran
+
+Every ayah is normalized and tokenized once, together with the character
+offset where each of its words ends. The result is cached on disk so the
+trainers only pay for it the first time; truncating every ayah to its first
+N words is then a tensor slice instead of a per-sample string operation.
+"""
+import hashlib
+import json
+import os
+import torch
+from torch.utils.data import Dataset
+from model import load_quran_data, load_vocabulary
+
+CACHE_VERSION = 1
+
+ARABIC_DIACRITICS = set([
+    '\u064B', '\u064C', '\u064D', '\u064E', '\u064F',
+    '\u0650', '\u0651', '\u0652', '\u0653', '\u0654',
+    '\u0655', '\u0656', '\u0657', '\u0658', '\u0670',
+])
+
+HAMZA_MAP = {
+    'إ': 'ا', 'أ': 'ا', 'آ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي'
+}
+
+def remove_tashkeel(text):
+    """Remove Arabic diacritics (tashkeel)"""
+    return ''.join(c for c in text if c not in ARABIC_DIACRITICS)
+
+def normalize_arabic(text):
+    """Normalize Arabic text - remove tashkeel and normalize hamza variants"""
+    text = remove_tashkeel(text)
+    for old, new in HAMZA_MAP.items():
+        text = text.replace(old, new)
+    return text
+
+class QuranTokenMatrix:
+    """Tokenized ayat padded into one matrix, plus word-end offsets
+
+    tokens:      (num_ayat, max_chars) token ids, padded with <PAD>
+    lengths:     (num_ayat,) number of characters in each ayah
+    word_ends:   (num_ayat, max_words) exclusive character offset where
+                 each word ends, padded with the ayah length
+    word_counts: (num_ayat,) number of words in each ayah
+    """
+    def __init__(self, tokens, lengths, word_ends, word_counts, pad_token, space_token, fingerprint=None):
+        self.tokens = tokens
+        self.lengths = lengths
+        self.word_ends = word_ends
+        self.word_counts = word_counts
+        self.pad_token = pad_token
+        self.space_token = space_token
+        self.fingerprint = fingerprint
+
+    @property
+    def num_ayat(self):
+        return self.tokens.shape[0]
+
+    def window(self, width, offsets=None):
+        """Return (num_ayat, width) token ids starting at each ayah's offset
+
+        Positions past the end of an ayah are <PAD>.
+        """
+        tokens = self.tokens.long()
+        if offsets is None:
+            offsets = torch.zeros(self.num_ayat, dtype=torch.long)
+        positions = offsets.unsqueeze(1) + torch.arange(width).unsqueeze(0)
+        in_range = positions < self.lengths.unsqueeze(1)
+        positions = positions.clamp(max=tokens.shape[1] - 1)
+        window = tokens.gather(1, positions)
+        return window.masked_fill(~in_range, self.pad_token)
+
+    def truncate(self, num_words, max_length=60):
+        """Return (num_ayat, max_length) token ids of the first num_words words"""
+        last_word = (self.word_counts.clamp(max=num_words) - 1).clamp(min=0)
+        ends = self.word_ends.gather(1, last_word.unsqueeze(1)).squeeze(1)
+        ends = torch.where(self.word_counts > 0, ends, torch.zeros_like(ends))
+        window = self.window(max_length)
+        keep = torch.arange(max_length).unsqueeze(0) < ends.unsqueeze(1)
+        return window.masked_fill(~keep, self.pad_token)
+
+    def save(self, path):
+        torch.save({
+            'version': CACHE_VERSION,
+            'fingerprint': self.fingerprint,
+            'tokens': self.tokens,
+            'lengths': self.lengths,
+            'word_ends': self.word_ends,
+            'word_counts': self.word_counts,
+            'pad_token': self.pad_token,
+            'space_token': self.space_token,
+        }, path)
+
+    @classmethod
+    def load(cls, path):
+        data = torch.load(path, map_location='cpu')
+        if data.get('version') != CACHE_VERSION:
+            return None
+        return cls(data['tokens'], data['lengths'], data['word_ends'], data['word_counts'],
+                   data['pad_token'], data['space_token'], fingerprint=data['fingerprint'])
+
+def build_token_matrix(ayat, vocabulary, normalize=True, fingerprint=None):
+    """Tokenize every ayah once into a QuranTokenMatrix"""
+    pad_token = vocabulary.get('<PAD>', 0)
+    unk_token = vocabulary.get('<UNK>', 1)
+    space_token = vocabulary.get(' ', unk_token)
+
+    texts = []
+    for ayah in ayat:
+        if normalize:
+            ayah = normalize_arabic(ayah)
+        # Same text the trainers get from ' '.join(text.split())
+        texts.append(' '.join(ayah.split()))
+
+    max_chars = max(len(text) for text in texts)
+    max_words = max(len(text.split()) for text in texts)
+    dtype = torch.uint8 if max(vocabulary.values()) < 256 else torch.int16
+
+    tokens = torch.full((len(texts), max_chars), pad_token, dtype=dtype)
+    lengths = torch.zeros(len(texts), dtype=torch.long)
+    word_ends = torch.zeros((len(texts), max_words), dtype=torch.long)
+    word_counts = torch.zeros(len(texts), dtype=torch.long)
+
+    for idx, text in enumerate(texts):
+        ids = [vocabulary.get(char, unk_token) for char in text]
+        tokens[idx, :len(ids)] = torch.tensor(ids, dtype=dtype)
+        lengths[idx] = len(text)
+
+        ends = []
+        offset = 0
+        for word in text.split(' '):
+            offset += len(word)
+            ends.append(offset)
+            offset += 1
+        word_counts[idx] = len(ends) if text else 0
+        word_ends[idx, :len(ends)] = torch.tensor(ends, dtype=torch.long)
+        word_ends[idx, len(ends):] = len(text)
+
+    return QuranTokenMatrix(tokens, lengths, word_ends, word_counts, pad_token, space_token, fingerprint=fingerprint)
+
+def source_fingerprint(quran_path, vocab_path, normalize=True):
+    """Hash of the inputs a cached token matrix was built from"""
+    digest = hashlib.sha1()
+    for path in (quran_path, vocab_path):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update(json.dumps({'normalize': normalize, 'version': CACHE_VERSION}).encode('utf-8'))
+    return digest.hexdigest()
+
+def load_token_matrix(quran_path, vocab_path, cache_path=None, normalize=True):
+    """Load the cached token matrix, rebuilding it if the sources changed"""
+    if cache_path is None:
+        cache_path = 'quran_tokens_normalized.pt' if normalize else 'quran_tokens.pt'
+
+    fingerprint = source_fingerprint(quran_path, vocab_path, normalize)
+    if os.path.exists(cache_path):
+        matrix = QuranTokenMatrix.load(cache_path)
+        if matrix is not None and matrix.fingerprint == fingerprint:
+            return matrix
+        print(f'Token matrix cache {cache_path} is stale, rebuilding...')
+
+    vocabulary, _ = load_vocabulary(vocab_path)
+    ayat = load_quran_data(quran_path)
+    matrix = build_token_matrix(ayat, vocabulary, normalize=normalize, fingerprint=fingerprint)
+    matrix.save(cache_path)
+    print(f'✓ Token matrix cached to {cache_path} ({matrix.num_ayat} ayat)')
+    return matrix
+
+class TruncatedTokenDataset(Dataset):
+    """First-N-words samples of every ayah, served from a QuranTokenMatrix
+
+    All truncations are materialized up front, so __getitem__ is a row lookup.
+    """
+    def __init__(self, token_matrix, word_counts=(6,), max_length=60):
+        self.word_counts = list(word_counts)
+        self.max_length = max_length
+        self.inputs = torch.cat([token_matrix.truncate(n, max_length) for n in self.word_counts])
+        self.targets = torch.arange(token_matrix.num_ayat).repeat(len(self.word_counts))
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        return self.inputs[idx], self.targets[idx]
+
+class AyahTokenDataset(Dataset):
+    """Full clean token row of every ayah, for augmentation applied per batch"""
+    def __init__(self, token_matrix):
+        self.tokens = token_matrix.tokens.long()
+        self.targets = torch.arange(token_matrix.num_ayat)
+        self.pad_token = token_matrix.pad_token
+        self.space_token = token_matrix.space_token
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        return self.tokens[idx], self.targets[idx]
+
+if __name__ == '__main__':
+    import time
+
+    start = time.time()
+    matrix = load_token_matrix('../Muhaffez/quran-simple-min.txt', 'vocabulary_normalized.json')
+    print(f'Loaded in {(time.time() - start) * 1000:.1f}ms')
+    print(f'Tokens: {tuple(matrix.tokens.shape)}, words: {tuple(matrix.word_ends.shape)}')
+
+    start = time.time()
+    for num_words in range(3, 11):
+        matrix.truncate(num_words)
+    print(f'Truncated to 3..10 words in {(time.time() - start) * 1000:.1f}ms')
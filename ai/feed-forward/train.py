@@ -1,9 +1,12 @@
+import argparse
 import json
+import os
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader
-from model import QuranMatcherModel, QuranAyahDataset, load_quran_data, load_vocabulary
+from model import QuranMatcherModel, QuranAyahDataset, factorize_output_layer, load_quran_data, load_vocabulary
+from model_factory import checkpoint_info
 import random
 import time
 
@@ -40,7 +43,7 @@ class CleanQuranDataset(QuranAyahDataset):
 
         return x, y
 
-def train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=10, save_inputs=False, ayat_list=None, vocabulary=None, vocab_size=None, output_size=None):
+def train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=10, save_inputs=False, ayat_list=None, vocabulary=None, vocab_size=None, output_size=None, output_path='quran_matcher_model.pth'):
     """Train the model"""
     model.train()
 
@@ -130,8 +133,10 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, ep
                     'model_state_dict': best_model_state,
                     'vocab_size': vocab_size,
                     'output_size': output_size,
+                    'output_rank': model.output_rank,
                     'accuracy': best_accuracy,
-                }, 'quran_matcher_model.pth')
+                    **checkpoint_info(model, 'vocabulary.json'),
+                }, output_path)
                 print(f'✓ New best model saved! Accuracy: {best_accuracy:.2f}%')
 
         # Step the scheduler
@@ -152,6 +157,10 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, ep
     return best_accuracy
 
 def main():
+    parser = argparse.ArgumentParser(description='Train QuranMatcherModel on the first 70 characters of every ayah')
+    parser.add_argument('--output-rank', type=int, help='Factorize fc3 as hidden -> rank -> ayat (default: dense)')
+    args = parser.parse_args()
+
     # Set device - prefer MPS (Apple Silicon GPU) > CUDA (NVIDIA) > CPU
     if torch.backends.mps.is_available():
         device = torch.device('mps')
@@ -175,15 +184,29 @@ def main():
     train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0)
 
     # Create model with larger hidden size and 70 input length
-    model = QuranMatcherModel(vocab_size=vocab_size, input_length=70, hidden_size=512, output_size=len(ayat))
+    model = QuranMatcherModel(vocab_size=vocab_size, input_length=70, hidden_size=512, output_size=len(ayat),
+                              output_rank=args.output_rank)
+
+    # A factorized model is saved next to the dense one, and starts from it the first time
+    output_path = f'quran_matcher_model_rank{args.output_rank}.pth' if args.output_rank else 'quran_matcher_model.pth'
+    init_path = output_path if os.path.exists(output_path) else 'quran_matcher_model.pth'
 
     # Try to load existing model weights
-    import os
-    if os.path.exists('quran_matcher_model.pth'):
-        print('Loading existing model weights from quran_matcher_model.pth...')
-        checkpoint = torch.load('quran_matcher_model.pth', map_location=device)
-        model.load_state_dict(checkpoint['model_state_dict'])
-        print('Model weights loaded successfully!')
+    if os.path.exists(init_path):
+        print(f'Loading existing model weights from {init_path}...')
+        checkpoint = torch.load(init_path, map_location=device)
+        saved_rank = checkpoint.get('output_rank')
+        if saved_rank == args.output_rank:
+            model.load_state_dict(checkpoint['model_state_dict'])
+            print('Model weights loaded successfully!')
+        elif saved_rank is None:
+            # Dense checkpoint: start the factorized fc3 from its truncated SVD
+            model = QuranMatcherModel(vocab_size=vocab_size, input_length=70, hidden_size=512, output_size=len(ayat))
+            model.load_state_dict(checkpoint['model_state_dict'])
+            model = factorize_output_layer(model, args.output_rank)
+            print(f'Model weights loaded, fc3 factorized to rank {args.output_rank}')
+        else:
+            print(f'Existing model has output rank {saved_rank}, not {args.output_rank}; starting from scratch')
     else:
         print('No existing model found, starting from scratch')
 
@@ -198,9 +221,9 @@ def main():
 
     # Train model
     print('\nContinuing training...\n')
-    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, save_inputs=True, ayat_list=ayat, vocabulary=vocabulary, vocab_size=vocab_size, output_size=len(ayat))
+    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, save_inputs=True, ayat_list=ayat, vocabulary=vocabulary, vocab_size=vocab_size, output_size=len(ayat), output_path=output_path)
 
-    print(f'\n✓ Training complete! Best model saved to quran_matcher_model.pth with accuracy: {best_acc:.2f}%')
+    print(f'\n✓ Training complete! Best model saved to {output_path} with accuracy: {best_acc:.2f}%')
 
 if __name__ == '__main__':
     main()
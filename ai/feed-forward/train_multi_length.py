@@ -0,0 +1,221 @@
+"""
+One matcher for every truncation length
+
+Replaces the per-length trainers (train_first_three_words.py ...
+train_first_ten_words.py, train_combined_6_to_10_words.py) with a single
+model. Every batch mixes all lengths and variants, drawn per row from the
+cached token matrix:
+  - one random word (2nd onwards) skipped, like train_skip_words.py
+  - a start up to max_offset characters late, like train_offset.py
+  - the first N words for N drawn from --word-counts, or (--full-prob) the
+    whole 60-character window, like train.py
+The embedding, fc1 and fc2 are shared. By default fc3 is too, and the
+result is a plain QuranMatcherModel that every loader, the registry,
+artifacts and ONNX export already handle. With --per-length-heads each
+word count gets its own fc3 (MultiLengthMatcherModel), routed by the input's
+word count.
+
+Usage:
+    python train_multi_length.py [--per-length-heads] [--epochs 50] [--repeats 2]
+"""
+import argparse
+import os
+import time
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader
+from functools import partial
+from model import (MultiLengthMatcherModel, QuranMatcherModel, count_words, factorize_output_layer, load_vocabulary,
+                   nearest_word_count_table)
+from token_matrix import AyahTokenDataset, load_token_matrix, normalize_arabic
+from model_factory import checkpoint_info, load_checkpoint
+from batch_distortion import BatchDistortion, prefix_offset, random_truncation, skip_word
+
+class MultiLengthQuranDataset(AyahTokenDataset):
+    """Every ayah repeats times per epoch; each row gets its own length and variant per batch"""
+    def __init__(self, token_matrix, word_counts, max_length=60, repeats=2, skip_prob=0.3, offset_prob=0.3,
+                 max_offset=10, full_prob=0.1):
+        super().__init__(token_matrix)
+        self.num_ayat = len(self.targets)
+        self.repeats = repeats
+        self.collate_fn = BatchDistortion([
+            # Skip a word of the full ayah, then maybe start late, then keep the first N words
+            partial(skip_word, prob=skip_prob, space_token=self.space_token, pad_token=self.pad_token),
+            partial(prefix_offset, prob=offset_prob, max_offset=max_offset, max_length=max_length, pad_token=self.pad_token),
+            partial(random_truncation, word_counts=word_counts, full_prob=full_prob, space_token=self.space_token,
+                    pad_token=self.pad_token),
+        ], max_length, self.pad_token)
+
+    def __len__(self):
+        return self.num_ayat * self.repeats
+
+    def __getitem__(self, idx):
+        return super().__getitem__(idx % self.num_ayat)
+
+def load_trunk(model, path, device):
+    """Start from a QuranMatcherModel checkpoint; with per-length heads, every head starts from its fc3
+
+    A dense fc3 is factorized (truncated SVD) when the model has an output rank.
+    """
+    source, info = load_checkpoint(path, device=device)
+    if model.output_rank and not source.output_rank:
+        source = factorize_output_layer(source, model.output_rank)
+    state_dict = source.state_dict()
+    if isinstance(model, MultiLengthMatcherModel):
+        head_state = {key[len('fc3.'):]: value for key, value in state_dict.items() if key.startswith('fc3.')}
+        state_dict = {key: value for key, value in state_dict.items() if not key.startswith('fc3.')}
+        for head in range(len(model.fc3)):
+            state_dict.update({f'fc3.{head}.{key}': value for key, value in head_state.items()})
+        state_dict['head_table'] = model.head_table
+    model.load_state_dict(state_dict)
+    return info
+
+def train_model(model, train_loader, criterion, optimizer, scheduler, device, word_counts, output_path, save_info, epochs=50):
+    """Train the model, reporting accuracy per input length (nearest of word_counts)"""
+    model.train()
+    best_accuracy = 0.0
+    total_start_time = time.time()
+    pad_token = train_loader.dataset.pad_token
+    space_token = train_loader.dataset.space_token
+    length_table = nearest_word_count_table(word_counts, model.input_length).to(device)
+
+    for epoch in range(epochs):
+        epoch_start_time = time.time()
+        total_loss = 0
+        correct = 0
+        total = 0
+        length_correct = torch.zeros(len(word_counts), device=device)
+        length_total = torch.zeros(len(word_counts), device=device)
+
+        for batch_idx, (data, target) in enumerate(train_loader):
+            data, target = data.to(device), target.to(device)
+
+            optimizer.zero_grad()
+            output = model(data)
+            loss = criterion(output, target)
+
+            loss.backward()
+            optimizer.step()
+
+            total_loss += loss.item()
+
+            # Calculate accuracy, overall and per length
+            _, predicted = torch.max(output.data, 1)
+            hits = (predicted == target).float()
+            lengths = length_table[count_words(data, pad_token, space_token).clamp(max=model.input_length)]
+            length_correct.index_add_(0, lengths, hits)
+            length_total.index_add_(0, lengths, torch.ones_like(hits))
+            total += target.size(0)
+            correct += hits.sum().item()
+
+            if batch_idx % 100 == 0:
+                print(f'Epoch: {epoch+1}/{epochs}, Batch: {batch_idx}/{len(train_loader)}, '
+                      f'Loss: {loss.item():.4f}, Acc: {100*correct/total:.2f}%')
+
+        epoch_time = time.time() - epoch_start_time
+        avg_loss = total_loss / len(train_loader)
+        accuracy = 100 * correct / total
+        length_accuracy = {n: round(100 * c / t, 2) for n, c, t in
+                           zip(word_counts, length_correct.tolist(), length_total.tolist()) if t}
+        total_elapsed = time.time() - total_start_time
+        print(f'\nEpoch {epoch+1} Summary: Avg Loss: {avg_loss:.4f}, Accuracy: {accuracy:.2f}%, LR: {scheduler.get_last_lr()[0]:.6f}')
+        print('Accuracy by words: ' + ', '.join(f'{n}: {acc:.2f}%' for n, acc in length_accuracy.items()))
+        print(f'Epoch Time: {epoch_time:.2f}s, Total Time: {total_elapsed:.2f}s\n')
+
+        # Save best model
+        if accuracy > best_accuracy:
+            best_accuracy = accuracy
+            torch.save({
+                'model_state_dict': model.state_dict(),
+                'epoch': epoch + 1,
+                'accuracy': best_accuracy,
+                'length_accuracy': length_accuracy,
+                'output_rank': model.output_rank,
+                **save_info,
+            }, output_path)
+            print(f'✓ New best model saved! Accuracy: {best_accuracy:.2f}%')
+
+        scheduler.step(avg_loss)
+
+    total_training_time = time.time() - total_start_time
+    print(f'\n✓ Best accuracy achieved: {best_accuracy:.2f}%')
+    print(f'✓ Total training time: {total_training_time:.2f}s ({total_training_time/60:.2f} minutes)')
+    return best_accuracy
+
+def main():
+    parser = argparse.ArgumentParser(description='Train one QuranMatcherModel on every truncation length')
+    parser.add_argument('--word-counts', nargs='+', type=int, default=list(range(3, 11)))
+    parser.add_argument('--per-length-heads', action='store_true', help='One fc3 per word count on the shared trunk')
+    parser.add_argument('--output-rank', type=int, help='Factorize fc3 as hidden -> rank -> ayat (default: dense)')
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--repeats', type=int, default=2, help='Samples of every ayah per epoch')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--lr', type=float, default=0.0005)
+    parser.add_argument('--skip-prob', type=float, default=0.3)
+    parser.add_argument('--offset-prob', type=float, default=0.3)
+    parser.add_argument('--full-prob', type=float, default=0.1, help='Fraction of rows kept as the full 60-character window')
+    parser.add_argument('--init', default='quran_matcher_model_normalized.pth', help='Checkpoint to start the trunk from, if it exists')
+    parser.add_argument('--output', help='Default: quran_matcher_multi_length[_heads][_rankR].pth')
+    args = parser.parse_args()
+    output_path = args.output or (f'quran_matcher_multi_length{"_heads" if args.per_length_heads else ""}'
+                                  f'{f"_rank{args.output_rank}" if args.output_rank else ""}.pth')
+
+    # Set device
+    if torch.backends.mps.is_available():
+        device = torch.device('mps')
+    elif torch.cuda.is_available():
+        device = torch.device('cuda')
+    else:
+        device = torch.device('cpu')
+    print(f'Using device: {device}')
+
+    # Load vocabulary
+    vocabulary, vocab_size = load_vocabulary('vocabulary_normalized.json')
+    print(f'Vocabulary size: {vocab_size}')
+
+    # Load Quran data (normalized and tokenized once, cached on disk)
+    token_matrix = load_token_matrix('../Muhaffez/quran-simple-min.txt', 'vocabulary_normalized.json')
+    print(f'Total ayat: {token_matrix.num_ayat}')
+
+    dataset = MultiLengthQuranDataset(token_matrix, args.word_counts, max_length=60, repeats=args.repeats,
+                                      skip_prob=args.skip_prob, offset_prob=args.offset_prob, full_prob=args.full_prob)
+    train_loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True, num_workers=0, collate_fn=dataset.collate_fn)
+    print(f'Samples per epoch: {len(dataset)} ({token_matrix.num_ayat} ayat × {args.repeats}), '
+          f'lengths {args.word_counts} mixed in every batch')
+
+    # Create model
+    if args.per_length_heads:
+        model = MultiLengthMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=token_matrix.num_ayat,
+                                        word_counts=args.word_counts, pad_token=token_matrix.pad_token,
+                                        space_token=token_matrix.space_token, output_rank=args.output_rank)
+    else:
+        model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=token_matrix.num_ayat,
+                                  output_rank=args.output_rank)
+
+    # Load existing model if available
+    if os.path.exists(args.init):
+        print(f'Loading {args.init} to start the shared trunk from...')
+        info = load_trunk(model, args.init, device)
+        print(f'Model loaded successfully! Previous best accuracy: {info.get("accuracy", "N/A")}%')
+    else:
+        print('No existing model found, starting from scratch')
+
+    model = model.to(device)
+    print(f'Parameters: {sum(p.numel() for p in model.parameters()):,}')
+
+    # Loss and optimizer
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+
+    # Learning rate scheduler
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=5)
+
+    save_info = checkpoint_info(model, 'vocabulary_normalized.json', normalize_arabic)
+    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, args.word_counts, output_path,
+                           save_info, epochs=args.epochs)
+
+    print(f'\n✓ Training complete! Best model saved to {output_path} with accuracy: {best_acc:.2f}%')
+
+if __name__ == '__main__':
+    main()
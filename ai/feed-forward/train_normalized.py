@@ -4,6 +4,7 @@ import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader, Dataset
 from model import QuranMatcherModel, load_quran_data, load_vocabulary
+from model_factory import checkpoint_info
 import random
 import time
 import unicodedata
@@ -171,6 +172,7 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, ep
                     'vocab_size': vocab_size,
                     'output_size': output_size,
                     'accuracy': best_accuracy,
+                    **checkpoint_info(model, 'vocabulary_normalized.json', normalize_arabic),
                 }, 'quran_matcher_model_normalized.pth')
                 print(f'✓ New best model saved! Accuracy: {best_accuracy:.2f}%')
 
@@ -2,78 +2,26 @@ import json
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
-from model import QuranMatcherModel, load_quran_data, load_vocabulary
-import random
+from torch.utils.data import DataLoader
+from functools import partial
+from model import QuranMatcherModel, load_vocabulary
+from model_factory import checkpoint_info
+from token_matrix import AyahTokenDataset, load_token_matrix
+from batch_distortion import BatchDistortion, fit_length, prefix_offset, random_deletion
 import time
 
-def add_noise_to_text(text, noise_level=0.1):
-    """Add noise to text by randomly removing characters"""
-    if random.random() > 0.3:
-        # Remove some characters
-        chars = list(text)
-        num_to_remove = int(len(chars) * noise_level)
-        for _ in range(num_to_remove):
-            if len(chars) > 1:
-                idx = random.randint(0, len(chars) - 1)
-                chars.pop(idx)
-        return ''.join(chars)
-    else:
-        # Return without distortion (30% of the time)
-        return text
-
-class OffsetAugmentedQuranDataset(Dataset):
-    """Dataset with random offsets AND distortions applied during training"""
-    def __init__(self, ayat_list, vocabulary, max_length=70):
-        self.ayat = ayat_list
-        self.vocabulary = vocabulary
+class OffsetAugmentedQuranDataset(AyahTokenDataset):
+    """Dataset with random offsets AND distortions applied per batch during training"""
+    def __init__(self, token_matrix, max_length=70):
+        super().__init__(token_matrix)
         self.max_length = max_length
-        self.pad_token = vocabulary.get('<PAD>', 0)
-        self.unk_token = vocabulary.get('<UNK>', 1)
-
-    def __len__(self):
-        return len(self.ayat)
-
-    def tokenize(self, text):
-        """Convert text to token indices"""
-        tokens = []
-        for char in text:
-            token = self.vocabulary.get(char, self.unk_token)
-            tokens.append(token)
-
-        # Pad or truncate to max_length
-        if len(tokens) < self.max_length:
-            tokens.extend([self.pad_token] * (self.max_length - len(tokens)))
-        else:
-            tokens = tokens[:self.max_length]
-
-        return tokens
-
-    def __getitem__(self, idx):
-        ayah = self.ayat[idx]
-
-        # 50% chance to use random offset (max 10 chars)
-        if random.random() < 0.5 and len(ayah) > self.max_length:
-            # Random offset up to 10 chars
-            max_offset = min(len(ayah) - self.max_length, 10)
-            if max_offset > 0:
-                offset = random.randint(0, max_offset)
-                clean_ayah = ayah[offset:offset + self.max_length]
-            else:
-                clean_ayah = ayah[:self.max_length]
-        else:
-            # Start from beginning
-            clean_ayah = ayah[:self.max_length]
-
-        # Apply random distortion
-        distorted_ayah = add_noise_to_text(clean_ayah, noise_level=0.1)
-
-        tokens = self.tokenize(distorted_ayah)
-
-        x = torch.tensor(tokens, dtype=torch.long)
-        y = torch.tensor(idx, dtype=torch.long)
-
-        return x, y
+        self.collate_fn = BatchDistortion([
+            # 50% chance to use random offset (max 10 chars)
+            partial(prefix_offset, prob=0.5, max_offset=10, max_length=max_length, pad_token=self.pad_token),
+            partial(fit_length, max_length=max_length, pad_token=self.pad_token),
+            # Remove 10% of characters 70% of the time
+            partial(random_deletion, rate=0.1, prob=0.7, pad_token=self.pad_token),
+        ], max_length, self.pad_token)
 
 def train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=10, vocab_size=None, output_size=None):
     """Train the model"""
@@ -130,6 +78,7 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, ep
                     'vocab_size': vocab_size,
                     'output_size': output_size,
                     'accuracy': best_accuracy,
+                    **checkpoint_info(model, 'vocabulary.json'),
                 }, 'quran_matcher_model_offset.pth')
                 print(f'✓ New best model saved! Accuracy: {best_accuracy:.2f}%')
 
@@ -155,17 +104,17 @@ def main():
     vocabulary, vocab_size = load_vocabulary('vocabulary.json')
     print(f'Vocabulary size: {vocab_size}')
 
-    # Load Quran data
-    ayat = load_quran_data('../Muhaffez/quran-simple-min.txt')
-    print(f'Total ayat: {len(ayat)}')
+    # Load Quran data (tokenized once, cached on disk)
+    token_matrix = load_token_matrix('../Muhaffez/quran-simple-min.txt', 'vocabulary.json', normalize=False)
+    print(f'Total ayat: {token_matrix.num_ayat}')
 
     # Create dataset and dataloader with offset + distortion augmentation
-    dataset = OffsetAugmentedQuranDataset(ayat, vocabulary, max_length=70)
+    dataset = OffsetAugmentedQuranDataset(token_matrix, max_length=70)
     # Shuffle for better training
-    train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0)
+    train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0, collate_fn=dataset.collate_fn)
 
     # Create model with 70 input length and 512 hidden size
-    model = QuranMatcherModel(vocab_size=vocab_size, input_length=70, hidden_size=512, output_size=len(ayat))
+    model = QuranMatcherModel(vocab_size=vocab_size, input_length=70, hidden_size=512, output_size=token_matrix.num_ayat)
 
     # Try to load existing offset model weights to continue training
     import os
@@ -193,7 +142,7 @@ def main():
 
     # Train model
     print('\nTraining with offset + distortion augmentation...\n')
-    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=vocab_size, output_size=len(ayat))
+    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=vocab_size, output_size=token_matrix.num_ayat)
 
     print(f'\n✓ Training complete! Best model saved to quran_matcher_model_offset.pth with accuracy: {best_acc:.2f}%')
 
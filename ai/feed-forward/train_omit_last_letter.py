@@ -2,91 +2,24 @@ import json
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
-from model import QuranMatcherModel, load_quran_data, load_vocabulary
-import random
+from torch.utils.data import DataLoader
+from functools import partial
+from model import QuranMatcherModel, load_vocabulary
+from token_matrix import AyahTokenDataset, load_token_matrix, normalize_arabic
+from model_factory import checkpoint_info
+from batch_distortion import BatchDistortion, omit_last_letters
 import time
 
-def remove_tashkeel(text):
-    """Remove Arabic diacritics (tashkeel)"""
-    arabic_diacritics = set([
-        '\u064B', '\u064C', '\u064D', '\u064E', '\u064F',
-        '\u0650', '\u0651', '\u0652', '\u0653', '\u0654',
-        '\u0655', '\u0656', '\u0657', '\u0658', '\u0670',
-    ])
-    return ''.join(c for c in text if c not in arabic_diacritics)
-
-def normalize_arabic(text):
-    """Normalize Arabic text - remove tashkeel and normalize hamza variants"""
-    text = remove_tashkeel(text)
-    hamza_map = {
-        'إ': 'ا', 'أ': 'ا', 'آ': 'ا',
-        'ؤ': 'و', 'ئ': 'ي'
-    }
-    for old, new in hamza_map.items():
-        text = text.replace(old, new)
-    return text
-
-class OmitLastLetterQuranDataset(Dataset):
-    """Dataset that omits last letter from each word for robustness"""
-    def __init__(self, ayat_list, vocabulary, max_length=60, omit_prob=0.5):
-        # Normalize all ayat
-        self.ayat = [normalize_arabic(ayah) for ayah in ayat_list]
-        self.vocabulary = vocabulary
+class OmitLastLetterQuranDataset(AyahTokenDataset):
+    """Dataset that omits last letter from each word for robustness, applied per batch"""
+    def __init__(self, token_matrix, max_length=60, omit_prob=0.5):
+        super().__init__(token_matrix)
         self.max_length = max_length
-        self.pad_token = vocabulary.get('<PAD>', 0)
-        self.unk_token = vocabulary.get('<UNK>', 1)
         self.omit_prob = omit_prob  # Probability of omitting last letter
-
-    def __len__(self):
-        return len(self.ayat)
-
-    def omit_last_letters(self, text):
-        """Omit last letter from each word"""
-        words = text.split()
-        result_words = []
-
-        for word in words:
-            if len(word) > 1:
-                # Remove last letter from word
-                result_words.append(word[:-1])
-            else:
-                # Keep single-letter words as is
-                result_words.append(word)
-
-        return ' '.join(result_words)
-
-    def tokenize(self, text):
-        """Convert text to token indices"""
-        tokens = []
-        for char in text:
-            token = self.vocabulary.get(char, self.unk_token)
-            tokens.append(token)
-
-        # Pad or truncate to max_length
-        if len(tokens) < self.max_length:
-            tokens.extend([self.pad_token] * (self.max_length - len(tokens)))
-        else:
-            tokens = tokens[:self.max_length]
-
-        return tokens
-
-    def __getitem__(self, idx):
-        ayah = self.ayat[idx]
-
-        # 50% chance: omit last letter from each word
-        if random.random() < self.omit_prob:
-            ayah = self.omit_last_letters(ayah)
-
-        # Take first 60 chars
-        clean_ayah = ayah[:self.max_length]
-
-        tokens = self.tokenize(clean_ayah)
-
-        x = torch.tensor(tokens, dtype=torch.long)
-        y = torch.tensor(idx, dtype=torch.long)
-
-        return x, y
+        # Omit last letters across the full ayah, then take first 60 chars
+        self.collate_fn = BatchDistortion([
+            partial(omit_last_letters, prob=omit_prob, space_token=self.space_token, pad_token=self.pad_token),
+        ], max_length, self.pad_token)
 
 def train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=None, output_size=None):
     """Train the model"""
@@ -139,6 +72,7 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, ep
                     'vocab_size': vocab_size,
                     'output_size': output_size,
                     'accuracy': best_accuracy,
+                    **checkpoint_info(model, 'vocabulary_normalized.json', normalize_arabic),
                 }, 'quran_matcher_omit_last_letter.pth')
                 print(f'✓ New best model saved! Accuracy: {best_accuracy:.2f}%')
 
@@ -163,16 +97,16 @@ def main():
     vocabulary, vocab_size = load_vocabulary('vocabulary_normalized.json')
     print(f'Vocabulary size: {vocab_size}')
 
-    # Load Quran data
-    ayat = load_quran_data('../Muhaffez/quran-simple-min.txt')
-    print(f'Total ayat: {len(ayat)}')
+    # Load Quran data (tokenized once, cached on disk)
+    token_matrix = load_token_matrix('../Muhaffez/quran-simple-min.txt', 'vocabulary_normalized.json')
+    print(f'Total ayat: {token_matrix.num_ayat}')
 
     # Create dataset with last letter omission (50% probability)
-    dataset = OmitLastLetterQuranDataset(ayat, vocabulary, max_length=60, omit_prob=0.5)
-    train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0)
+    dataset = OmitLastLetterQuranDataset(token_matrix, max_length=60, omit_prob=0.5)
+    train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0, collate_fn=dataset.collate_fn)
 
     # Create model
-    model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=len(ayat))
+    model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=token_matrix.num_ayat)
 
     # Load existing model if available
     import os
@@ -196,7 +130,7 @@ def main():
     # Train model
     print('\nTraining with LAST LETTER OMISSION augmentation (50% probability)...')
     print('Removing last letter from each word for robustness\n')
-    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=vocab_size, output_size=len(ayat))
+    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=vocab_size, output_size=token_matrix.num_ayat)
 
     print(f'\n✓ Training complete! Best model saved to quran_matcher_omit_last_letter.pth with accuracy: {best_acc:.2f}%')
 
@@ -2,74 +2,16 @@ import json
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
-from model import QuranMatcherModel, load_quran_data, load_vocabulary
+from torch.utils.data import DataLoader
+from model import QuranMatcherModel, load_vocabulary
+from token_matrix import TruncatedTokenDataset, load_token_matrix
 import time
 
-def remove_tashkeel(text):
-    """Remove Arabic diacritics (tashkeel)"""
-    arabic_diacritics = set([
-        '\u064B', '\u064C', '\u064D', '\u064E', '\u064F',
-        '\u0650', '\u0651', '\u0652', '\u0653', '\u0654',
-        '\u0655', '\u0656', '\u0657', '\u0658', '\u0670',
-    ])
-    return ''.join(c for c in text if c not in arabic_diacritics)
-
-def normalize_arabic(text):
-    """Normalize Arabic text - remove tashkeel and normalize hamza variants"""
-    text = remove_tashkeel(text)
-    hamza_map = {
-        'إ': 'ا', 'أ': 'ا', 'آ': 'ا',
-        'ؤ': 'و', 'ئ': 'ي'
-    }
-    for old, new in hamza_map.items():
-        text = text.replace(old, new)
-    return text
-
-class TruncatedQuranDataset(Dataset):
+class TruncatedQuranDataset(TruncatedTokenDataset):
     """Dataset that uses only first N words from each ayah"""
-    def __init__(self, ayat_list, vocabulary, num_words, max_length=60):
-        self.ayat = [normalize_arabic(ayah) for ayah in ayat_list]
-        self.vocabulary = vocabulary
+    def __init__(self, token_matrix, num_words, max_length=60):
+        super().__init__(token_matrix, word_counts=[num_words], max_length=max_length)
         self.num_words = num_words
-        self.max_length = max_length
-        self.pad_token = vocabulary.get('<PAD>', 0)
-        self.unk_token = vocabulary.get('<UNK>', 1)
-
-    def __len__(self):
-        return len(self.ayat)
-
-    def get_first_n_words(self, text):
-        """Get only first N words from text"""
-        words = text.split()
-        first_n = ' '.join(words[:self.num_words])
-        return first_n
-
-    def tokenize(self, text):
-        """Convert text to token indices"""
-        tokens = []
-        for char in text:
-            token = self.vocabulary.get(char, self.unk_token)
-            tokens.append(token)
-
-        # Pad or truncate to max_length
-        if len(tokens) < self.max_length:
-            tokens.extend([self.pad_token] * (self.max_length - len(tokens)))
-        else:
-            tokens = tokens[:self.max_length]
-
-        return tokens
-
-    def __getitem__(self, idx):
-        ayah = self.ayat[idx]
-        ayah = self.get_first_n_words(ayah)
-        clean_ayah = ayah[:self.max_length]
-        tokens = self.tokenize(clean_ayah)
-
-        x = torch.tensor(tokens, dtype=torch.long)
-        y = torch.tensor(idx, dtype=torch.long)
-
-        return x, y
 
 def train_model(model, train_loader, criterion, optimizer, device, epochs=3):
     """Train the model for a few epochs"""
@@ -118,9 +60,9 @@ def main():
     vocabulary, vocab_size = load_vocabulary('vocabulary_normalized.json')
     print(f'Vocabulary size: {vocab_size}')
 
-    # Load Quran data
-    ayat = load_quran_data('../Muhaffez/quran-simple-min.txt')
-    print(f'Total ayat: {len(ayat)}\n')
+    # Load Quran data (normalized and tokenized once, cached on disk)
+    token_matrix = load_token_matrix('../Muhaffez/quran-simple-min.txt', 'vocabulary_normalized.json')
+    print(f'Total ayat: {token_matrix.num_ayat}\n')
 
     # Results table
     results = []
@@ -132,11 +74,11 @@ def main():
         print(f'{"="*60}')
 
         # Create dataset
-        dataset = TruncatedQuranDataset(ayat, vocabulary, num_words=num_words, max_length=60)
+        dataset = TruncatedQuranDataset(token_matrix, num_words=num_words, max_length=60)
         train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0)
 
         # Create model (fresh for each word count)
-        model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=len(ayat))
+        model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=token_matrix.num_ayat)
 
         # Load pre-trained base model
         import os
@@ -2,115 +2,26 @@ import json
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
-from model import QuranMatcherModel, load_quran_data, load_vocabulary
-import random
+from torch.utils.data import DataLoader
+from functools import partial
+from model import QuranMatcherModel, load_vocabulary
+from token_matrix import AyahTokenDataset, load_token_matrix, normalize_arabic
+from model_factory import checkpoint_info
+from batch_distortion import BatchDistortion, fit_length, random_deletion
 import time
-import unicodedata
-
-def remove_tashkeel(text):
-    """Remove Arabic diacritics (tashkeel)"""
-    # Arabic diacritics Unicode range
-    arabic_diacritics = set([
-        '\u064B',  # Fathatan
-        '\u064C',  # Dammatan
-        '\u064D',  # Kasratan
-        '\u064E',  # Fatha
-        '\u064F',  # Damma
-        '\u0650',  # Kasra
-        '\u0651',  # Shadda
-        '\u0652',  # Sukun
-        '\u0653',  # Maddah
-        '\u0654',  # Hamza above
-        '\u0655',  # Hamza below
-        '\u0656',  # Subscript alef
-        '\u0657',  # Inverted damma
-        '\u0658',  # Mark noon ghunna
-        '\u0670',  # Superscript alef
-    ])
-
-    return ''.join(c for c in text if c not in arabic_diacritics)
-
-def normalize_arabic(text):
-    """Normalize Arabic text - remove tashkeel and normalize hamza variants"""
-    # Remove tashkeel
-    text = remove_tashkeel(text)
-
-    # Normalize hamza variants
-    hamza_map = {
-        'إ': 'ا', 'أ': 'ا', 'آ': 'ا',
-        'ؤ': 'و', 'ئ': 'ي'
-    }
-
-    for old, new in hamza_map.items():
-        text = text.replace(old, new)
-
-    return text
-
-def add_random_distortion(text, distortion_rate=0.1):
-    """Add random distortion by removing characters at specified rate"""
-    if len(text) <= 1:
-        return text
-
-    chars = list(text)
-    num_to_remove = int(len(chars) * distortion_rate)
-
-    if num_to_remove < 1:
-        return text
-
-    # Randomly remove characters
-    for _ in range(num_to_remove):
-        if len(chars) > 1:
-            idx = random.randint(0, len(chars) - 1)
-            chars.pop(idx)
-
-    return ''.join(chars)
-
-class RandomDistortionDataset(Dataset):
-    """Dataset with 10% random character distortions"""
-    def __init__(self, ayat_list, vocabulary, max_length=60, distortion_rate=0.1):
-        # Normalize all ayat
-        self.ayat = [normalize_arabic(ayah) for ayah in ayat_list]
-        self.vocabulary = vocabulary
+
+class RandomDistortionDataset(AyahTokenDataset):
+    """Dataset with 10% random character distortions, applied per batch by collate_fn"""
+    def __init__(self, token_matrix, max_length=60, distortion_rate=0.1):
+        super().__init__(token_matrix)
         self.max_length = max_length
         self.distortion_rate = distortion_rate
-        self.pad_token = vocabulary.get('<PAD>', 0)
-        self.unk_token = vocabulary.get('<UNK>', 1)
-
-    def __len__(self):
-        return len(self.ayat)
-
-    def tokenize(self, text):
-        """Convert text to token indices"""
-        tokens = []
-        for char in text:
-            token = self.vocabulary.get(char, self.unk_token)
-            tokens.append(token)
-
-        # Pad or truncate to max_length
-        if len(tokens) < self.max_length:
-            tokens.extend([self.pad_token] * (self.max_length - len(tokens)))
-        else:
-            tokens = tokens[:self.max_length]
-
-        return tokens
-
-    def __getitem__(self, idx):
-        ayah = self.ayat[idx]
-
-        # Take first 60 chars
-        ayah_text = ayah[:self.max_length]
-
-        # 70% chance to apply random distortion
-        if random.random() < 0.7:
-            ayah_text = add_random_distortion(ayah_text, self.distortion_rate)
-
-        tokens = self.tokenize(ayah_text)
-
-        x = torch.tensor(tokens, dtype=torch.long)
-        y = torch.tensor(idx, dtype=torch.long)
-
-        return x, y
+        self.collate_fn = BatchDistortion([
+            # Take first 60 chars
+            partial(fit_length, max_length=max_length, pad_token=self.pad_token),
+            # 70% chance to apply random distortion
+            partial(random_deletion, rate=distortion_rate, prob=0.7, pad_token=self.pad_token),
+        ], max_length, self.pad_token)
 
 def train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=10, vocab_size=None, output_size=None):
     """Train the model"""
@@ -167,6 +78,7 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, ep
                     'vocab_size': vocab_size,
                     'output_size': output_size,
                     'accuracy': best_accuracy,
+                    **checkpoint_info(model, 'vocabulary_normalized.json', normalize_arabic),
                 }, 'quran_matcher_model_normalized.pth')
                 print(f'✓ New best model saved! Accuracy: {best_accuracy:.2f}%')
 
@@ -192,17 +104,17 @@ def main():
     vocabulary, vocab_size = load_vocabulary('vocabulary_normalized.json')
     print(f'Vocabulary size: {vocab_size}')
 
-    # Load Quran data (will be normalized in dataset)
-    ayat = load_quran_data('../Muhaffez/quran-simple-min.txt')
-    print(f'Total ayat: {len(ayat)}')
+    # Load Quran data (tokenized once, cached on disk)
+    token_matrix = load_token_matrix('../Muhaffez/quran-simple-min.txt', 'vocabulary_normalized.json')
+    print(f'Total ayat: {token_matrix.num_ayat}')
 
     # Create dataset with 10% random distortions
-    dataset = RandomDistortionDataset(ayat, vocabulary, max_length=60, distortion_rate=0.1)
+    dataset = RandomDistortionDataset(token_matrix, max_length=60, distortion_rate=0.1)
     # Shuffle for better training
-    train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0)
+    train_loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=0, collate_fn=dataset.collate_fn)
 
     # Create model with 60 input length and 512 hidden size
-    model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=len(ayat))
+    model = QuranMatcherModel(vocab_size=vocab_size, input_length=60, hidden_size=512, output_size=token_matrix.num_ayat)
 
     # Load existing normalized model to continue training
     import os
@@ -230,7 +142,7 @@ def main():
 
     # Train model
     print('\nTraining with 10% RANDOM DISTORTIONS (70% probability)...\n')
-    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=vocab_size, output_size=len(ayat))
+    best_acc = train_model(model, train_loader, criterion, optimizer, scheduler, device, epochs=100, vocab_size=vocab_size, output_size=token_matrix.num_ayat)
 
     print(f'\n✓ Training complete! Best model saved to quran_matcher_model_normalized.pth with accuracy: {best_acc:.2f}%')
 
@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 from torch.utils.data import Dataset, DataLoader
 from model import QuranMatcherModel, load_vocabulary
+from model_factory import checkpoint_info
 import random
 import re
 
@@ -177,6 +178,7 @@ save_dict = {
     'output_size': output_size,
     'accuracy': accuracy,
     'label_smoothing': label_smoothing,
+    **checkpoint_info(model, 'vocabulary_normalized.json', normalize_arabic),
 }
 
 torch.save(save_dict, 'quran_matcher_label_smoothed.pth')
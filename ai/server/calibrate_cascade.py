@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Calibrate the matcher -> seq2seq cascade thresholds
+
+Runs both models on the test.py suites (first N words, one word skipped,
+one word replaced), then sweeps min_probability / min_margin and picks the
+pair that sends the most queries down the cheap matcher path while the
+cascade stays at or above the target accuracy. The target defaults to the
+seq2seq-only accuracy on the same samples.
+
+Usage:
+    python calibrate_cascade.py --seq2seq ../transformer/model/quran_seq2seq_model.pt \
+        --matcher ../feed-forward/quran_matcher_combined_6_to_10_words.pth --target-accuracy 0.97
+"""
+import argparse
+import json
+import os
+import random
+import time
+import numpy as np
+import torch
+
+from cascade import AI_DIR, CascadePredictor
+from inference_server import QURAN_PATH, Seq2SeqBackend
+from decoding import build_prompt, greedy_decode_kv
+from input_variants import TEST_SUITES, sample_suite
+from predict import QuranPredictor
+from seq2seq_model import load_quran_data
+
+PROBABILITY_GRID = [0.0, 0.3, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 0.99, 0.995, 0.999, 1.01]
+MARGIN_GRID = [0.0, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9]
+
+
+def evaluate(cascade, samples, batch_size=256):
+    """Per-sample arrays: matcher top-1 prob, top-1/top-2 margin, matcher / seq2seq correctness and timings"""
+    p1, margin, matcher_ok, seq2seq_ok = [], [], [], []
+    matcher_time = seq2seq_time = 0.0
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start + batch_size]
+        texts = [' '.join(words) for _, words in batch]
+        # The matcher sees the text normalized, the seq2seq model as is, like CascadePredictor.predict_batch
+        normalized = [' '.join(cascade.normalize(text).split()) for text in texts]
+
+        t0 = time.perf_counter()
+        predictions = cascade.predictor.predict_batch(normalized, top_k=5)
+        t1 = time.perf_counter()
+        prompts = [build_prompt(cascade.word_to_idx, text) for text in texts]
+        outputs = greedy_decode_kv(cascade.seq2seq, prompts, cascade.eos_token, device=cascade.device)
+        t2 = time.perf_counter()
+        matcher_time += t1 - t0
+        seq2seq_time += t2 - t1
+
+        for (idx, _), preds, tokens in zip(batch, predictions, outputs):
+            p1.append(preds[0]['probability'])
+            margin.append(preds[0]['probability'] - (preds[1]['probability'] if len(preds) > 1 else 0.0))
+            matcher_ok.append(preds[0]['index'] == idx)
+            # Unresolvable seq2seq output falls back to the matcher, like CascadePredictor
+            resolved = cascade.resolve(tokens, preds)
+            seq2seq_ok.append((resolved if resolved is not None else preds[0]['index']) == idx)
+
+    return {
+        'p1': np.array(p1), 'margin': np.array(margin),
+        'matcher_ok': np.array(matcher_ok), 'seq2seq_ok': np.array(seq2seq_ok),
+        'matcher_ms': matcher_time * 1000 / len(samples), 'seq2seq_ms': seq2seq_time * 1000 / len(samples),
+    }
+
+
+def sweep(results):
+    """[(min_probability, min_margin, cheap fraction, cascade accuracy), ...]"""
+    rows = []
+    for min_probability in PROBABILITY_GRID:
+        for min_margin in MARGIN_GRID:
+            cheap = (results['p1'] >= min_probability) & (results['margin'] >= min_margin)
+            correct = np.where(cheap, results['matcher_ok'], results['seq2seq_ok'])
+            rows.append((min_probability, min_margin, cheap.mean(), correct.mean()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate the matcher -> seq2seq cascade thresholds')
+    parser.add_argument('--seq2seq', default=os.path.join(AI_DIR, 'transformer', 'model', 'quran_seq2seq_model.pt'))
+    parser.add_argument('--seq2seq-vocab', default=os.path.join(AI_DIR, 'transformer', 'model', 'vocabulary.json'))
+    parser.add_argument('--matcher', default=os.path.join(AI_DIR, 'feed-forward', 'quran_matcher_model.pth'))
+    parser.add_argument('--matcher-vocab', default=os.path.join(AI_DIR, 'feed-forward', 'vocabulary_normalized.json'))
+    parser.add_argument('--quran', default=QURAN_PATH)
+    parser.add_argument('--quran-norm', default=os.path.join(AI_DIR, 'transformer', 'datasets', 'quran-simple-norm.txt'))
+    parser.add_argument('--samples-per-suite', type=int, default=100)
+    parser.add_argument('--target-accuracy', type=float, help='Minimum cascade accuracy (default: seq2seq-only accuracy)')
+    parser.add_argument('--output', default='cascade_thresholds.json')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    seq2seq = Seq2SeqBackend(args.seq2seq, args.seq2seq_vocab, device)
+    predictor = QuranPredictor(model_path=args.matcher, vocab_path=args.matcher_vocab, quran_path=args.quran)
+    ayat = load_quran_data(args.quran_norm)
+    cascade = CascadePredictor(predictor, seq2seq.model, seq2seq.word_to_idx, seq2seq.idx_to_word, ayat, device=device)
+
+    rng = random.Random(args.seed)
+    vocab_words = [word for word in seq2seq.word_to_idx if word not in ['<s>', '</s>', 'القاريء:', 'الاية:']]
+    samples = []
+    for suite in TEST_SUITES:
+        samples.extend(sample_suite(ayat, suite, args.samples_per_suite, vocab_words, rng))
+    print(f'\nCalibrating on {len(samples)} samples from {len(TEST_SUITES)} suites...')
+
+    results = evaluate(cascade, samples)
+    matcher_accuracy = results['matcher_ok'].mean()
+    seq2seq_accuracy = results['seq2seq_ok'].mean()
+    target = args.target_accuracy if args.target_accuracy is not None else seq2seq_accuracy
+
+    rows = sweep(results)
+    feasible = [row for row in rows if row[3] >= target]
+    if feasible:
+        # Cheapest first, then most accurate, then the loosest thresholds
+        best = max(feasible, key=lambda row: (row[2], row[3], -row[0], -row[1]))
+    else:
+        best = max(rows, key=lambda row: (row[3], row[2]))
+    min_probability, min_margin, cheap_fraction, accuracy = best
+    expected_ms = cheap_fraction * results['matcher_ms'] + (1 - cheap_fraction) * (results['matcher_ms'] + results['seq2seq_ms'])
+
+    print("\n" + "="*70)
+    print("CASCADE CALIBRATION")
+    print("="*70)
+    print(f'Matcher only:   {matcher_accuracy:.2%}  ({results["matcher_ms"]:.3f} ms/query)')
+    print(f'Seq2seq only:   {seq2seq_accuracy:.2%}  ({results["seq2seq_ms"]:.3f} ms/query)')
+    print(f'Target:         {target:.2%}')
+    print(f'\n{"min_prob":>9} {"min_margin":>11} {"Cheap path":>11} {"Accuracy":>9}')
+    for row in rows:
+        if row[1] == min_margin or row[0] == min_probability:
+            marker = '  <-' if row == best else ''
+            print(f'{row[0]:>9.3f} {row[1]:>11.2f} {row[2]:>11.2%} {row[3]:>9.2%}{marker}')
+    print(f'\nSelected: min_probability={min_probability}, min_margin={min_margin}')
+    print(f'  {cheap_fraction:.2%} of queries served by the matcher, cascade accuracy {accuracy:.2%}'
+          f'{"" if feasible else " (target not reachable)"}')
+    print(f'  Expected latency {expected_ms:.3f} ms/query vs {results["seq2seq_ms"]:.3f} ms seq2seq only')
+    print("="*70)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'min_probability': min_probability,
+            'min_margin': min_margin,
+            'cheap_fraction': round(float(cheap_fraction), 4),
+            'accuracy': round(float(accuracy), 4),
+            'target_accuracy': round(float(target), 4),
+            'samples': len(samples),
+        }, f, indent=2)
+    print(f'✓ Thresholds saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Confidence-gated cascade: feed-forward matcher first, seq2seq on doubt
+
+QuranMatcherModel is one MLP forward over a 6203-way distribution;
+QuranSeq2SeqModel needs a prefill plus up to 6 decode steps. The cascade
+answers from the matcher when its top-1 probability and top-1/top-2 margin
+clear calibrated thresholds (see calibrate_cascade.py) and only sends the
+remaining queries to seq2seq. The seq2seq output is mapped back to an ayah
+index through the first 6 words of every ayah, with ties broken by the
+matcher's ranking.
+"""
+import json
+import os
+import sys
+
+AI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(AI_DIR, 'transformer', 'model'))
+sys.path.insert(0, os.path.join(AI_DIR, 'feed-forward'))
+
+from decoding import SPECIAL_TOKENS, build_prompt, greedy_decode_kv
+from token_matrix import normalize_arabic
+
+DEFAULT_THRESHOLDS = {'min_probability': 0.9, 'min_margin': 0.0}
+
+
+def load_thresholds(path):
+    """Thresholds written by calibrate_cascade.py, or the defaults"""
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return dict(DEFAULT_THRESHOLDS)
+
+
+def build_opening_index(ayat, num_words=6):
+    """Map the first num_words words of each ayah to the ayat that start with them"""
+    index = {}
+    for idx, ayah in enumerate(ayat):
+        index.setdefault(tuple(ayah.split()[:num_words]), []).append(idx)
+    return index
+
+
+class CascadePredictor:
+    """QuranPredictor with a seq2seq fallback for low-confidence queries
+
+    predictor:  feed-forward QuranPredictor
+    seq2seq:    QuranSeq2SeqModel (eval mode) with its word_to_idx / idx_to_word
+    ayat:       normalized ayat (quran-simple-norm.txt), same order as the matcher's
+    """
+    def __init__(self, predictor, seq2seq, word_to_idx, idx_to_word, ayat, min_probability=0.9, min_margin=0.0,
+                 normalize=True, device='cpu', prefix_cache=None):
+        self.predictor = predictor
+        self.seq2seq = seq2seq
+        self.word_to_idx = word_to_idx
+        self.idx_to_word = idx_to_word
+        self.ayat = ayat
+        self.min_probability = min_probability
+        self.min_margin = min_margin
+        self.normalize = normalize_arabic if normalize else (lambda text: text)
+        self.device = device
+        self.prefix_cache = prefix_cache
+        self.eos_token = word_to_idx['</s>']
+        self.opening_index = build_opening_index(ayat)
+        self.stats = {'queries': 0, 'matcher': 0, 'seq2seq': 0, 'seq2seq_unmatched': 0}
+
+    def accept(self, predictions):
+        """True if the matcher's answer clears both thresholds"""
+        top1 = predictions[0]['probability']
+        top2 = predictions[1]['probability'] if len(predictions) > 1 else 0.0
+        return top1 >= self.min_probability and top1 - top2 >= self.min_margin
+
+    def resolve(self, output_tokens, predictions):
+        """Ayah index for a seq2seq output, or None if no ayah starts with it"""
+        words = [self.idx_to_word.get(token, '?') for token in output_tokens]
+        words = [word for word in words if word not in SPECIAL_TOKENS]
+        candidates = self.opening_index.get(tuple(words[:6]))
+        if not candidates:
+            return None
+        ranks = {prediction['index']: rank for rank, prediction in enumerate(predictions)}
+        return min(candidates, key=lambda idx: ranks.get(idx, len(ranks)))
+
+    def predict_batch(self, texts, top_k=5):
+        """[{'index', 'ayah', 'probability', 'path', 'candidates'}, ...] for each text"""
+        normalized = [' '.join(self.normalize(text).split()) for text in texts]
+        matcher_results = self.predictor.predict_batch(normalized, top_k=max(top_k, 2))
+
+        results = []
+        fallback = []
+        for i, predictions in enumerate(matcher_results):
+            results.append({
+                'index': predictions[0]['index'],
+                'ayah': self.ayat[predictions[0]['index']],
+                'probability': predictions[0]['probability'],
+                'path': 'matcher',
+                'candidates': predictions[:top_k],
+            })
+            if not self.accept(predictions):
+                fallback.append(i)
+
+        if fallback:
+            prompts = [build_prompt(self.word_to_idx, texts[i]) for i in fallback]
+            outputs = greedy_decode_kv(self.seq2seq, prompts, self.eos_token, device=self.device, prefix_cache=self.prefix_cache)
+            for i, tokens in zip(fallback, outputs):
+                idx = self.resolve(tokens, matcher_results[i])
+                if idx is None:
+                    # Not the opening of any ayah: keep the matcher's answer
+                    self.stats['seq2seq_unmatched'] += 1
+                    continue
+                results[i].update({'index': idx, 'ayah': self.ayat[idx], 'path': 'seq2seq'})
+
+        self.stats['queries'] += len(texts)
+        self.stats['seq2seq'] += len(fallback)
+        self.stats['matcher'] += len(texts) - len(fallback)
+        return results
+
+    def predict(self, text, top_k=5):
+        return self.predict_batch([text], top_k=top_k)[0]
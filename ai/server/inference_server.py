@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Local inference server for the Quran models
+
+Loads QuranSeq2SeqModel and/or QuranMatcherModel once and serves them over
+HTTP on a TCP port or a Unix socket. Concurrent requests to the same model
+are coalesced into micro-batches: a batch runs as soon as max_batch
+requests are waiting or the oldest one has waited max_wait_ms.
+
+Endpoints:
+    POST /seq2seq   {"text": "..."}               -> {"text": "...", "latency_ms": ...}
+    POST /matcher   {"text": "...", "top_k": 5}   -> {"predictions": [...], "latency_ms": ...}
+    POST /matcher/NAME                            same, for a --matcher-variant checkpoint
+    POST /cascade   {"text": "..."}               -> {"index": ..., "ayah": "...", "path": "matcher|seq2seq", ...}
+    GET  /metrics   per-model request latency, batch sizes and queue depth, registry load times and sizes
+    GET  /health
+
+Usage:
+    python inference_server.py --seq2seq ../transformer/model/quran_seq2seq_model.pt --port 8765
+    python inference_server.py --matcher ../feed-forward/quran_matcher_model.pth --unix /tmp/muhaffez.sock
+    python inference_server.py --matcher-variant three=../feed-forward/quran_matcher_first_three_words.pth \
+                               --matcher-variant ten=../feed-forward/quran_matcher_first_ten_words.pth --registry-mb 64
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+AI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(AI_DIR, 'transformer', 'model'))
+sys.path.insert(0, os.path.join(AI_DIR, 'feed-forward'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from decoding import build_prompt, greedy_decode_kv, tokens_to_text
+from prefix_cache import PrefixKVCache
+from prefix_index import AyahPrefixIndex
+from ambiguity_map import AyahAmbiguityMap
+from oov_resolver import OOVResolver
+from model_factory import load_checkpoint, check_fingerprints
+from model_registry import ModelRegistry
+from predict import QuranPredictor
+from result_cache import ResultCache, file_fingerprint
+from token_matrix import normalize_arabic
+from cascade import CascadePredictor, load_thresholds
+
+QURAN_PATH = os.path.join(AI_DIR, '..', 'Muhaffez', 'Models', 'quran-simple-min.txt')
+QURAN_NORM_PATH = os.path.join(AI_DIR, 'transformer', 'datasets', 'quran-simple-norm.txt')
+# Requests are a few words of text; anything bigger is refused before it is read
+MAX_BODY_BYTES = 64 * 1024
+
+
+def percentiles(values, qs=(50, 90, 99)):
+    """Percentiles of a sequence of milliseconds, rounded for JSON"""
+    if not values:
+        return {f'p{q}': None for q in qs}
+    result = np.percentile(np.fromiter(values, dtype=np.float64), qs)
+    return {f'p{q}': round(float(v), 3) for q, v in zip(qs, result)}
+
+
+def request_error(request):
+    """Why a request body cannot be served, or None: a JSON object whose text is a string and top_k a positive integer"""
+    if not isinstance(request, dict):
+        return 'request body must be a JSON object'
+    if not isinstance(request.get('text', ''), str):
+        return 'text must be a string'
+    top_k = request.get('top_k', 5)
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        return 'top_k must be a positive integer'
+    return None
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batches for one model
+
+    run_batch(items) -> results runs on a dedicated worker thread, so the
+    event loop keeps accepting requests (and forming the next batch) while
+    the model is busy.
+    """
+    def __init__(self, name, run_batch, max_batch=32, max_wait_ms=5.0, history=10000):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.latencies = deque(maxlen=history)
+        self.queue_waits = deque(maxlen=history)
+        self.batch_sizes = deque(maxlen=history)
+        self.batch_times = deque(maxlen=history)
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, item):
+        """Queue one request and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, [item for item, _, _ in batch])
+            except Exception as e:
+                self.errors += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            end = time.perf_counter()
+
+            for (_, future, enqueued), result in zip(batch, results):
+                self.queue_waits.append((start - enqueued) * 1000)
+                self.latencies.append((end - enqueued) * 1000)
+                if not future.done():
+                    future.set_result(result)
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+            self.batch_times.append((end - start) * 1000)
+
+    def metrics(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch_size': round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else 0,
+            'max_batch_size': max(self.batch_sizes, default=0),
+            'queue_depth': self.queue.qsize() if self.queue else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'latency_ms': percentiles(self.latencies),
+            'queue_wait_ms': percentiles(self.queue_waits),
+            'batch_ms': percentiles(self.batch_times),
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+
+
+class Seq2SeqBackend:
+    """QuranSeq2SeqModel with batched KV-cached greedy decoding"""
+    def __init__(self, model_path, vocab_path, device, cache_size=0, cache_path=None, max_output_words=6, prefix_cache_mb=0,
+                 prefix_index=False, early_stop=False, oov_resolver=False):
+        self.device = device
+        self.max_output_words = max_output_words
+        self.word_to_idx, self.idx_to_word, _ = load_vocabulary(vocab_path)
+        self.eos_token = self.word_to_idx['</s>']
+
+        # Checkpoint or inference artifact; the hyperparameters come from it
+        self.model, _ = load_checkpoint(model_path, device=device, vocabulary=self.word_to_idx)
+
+        # Same keys as predict_ayah, so a persisted cache can be shared with it
+        self.cache = None
+        if cache_size:
+            self.cache = ResultCache(cache_size, cache_path, fingerprint=file_fingerprint(model_path, vocab_path))
+
+        # Shared KV of common prompt openings, across requests
+        self.prefix_cache = PrefixKVCache(self.model, prefix_cache_mb) if prefix_cache_mb else None
+
+        # Exact ayah openings are answered from the text, like predict_ayah(prefix_index=...)
+        self.prefix_index = AyahPrefixIndex(load_quran_data(QURAN_NORM_PATH)) if prefix_index else None
+
+        # Stop decoding once the output pins down the ayah, and return its index
+        self.ambiguity_map = AyahAmbiguityMap(load_quran_data(QURAN_NORM_PATH), self.word_to_idx) if early_stop else None
+
+        # Misrecognized words map to their nearest vocabulary word instead of being dropped
+        self.oov_resolver = None
+        if oov_resolver:
+            self.oov_resolver = OOVResolver.from_vocabulary(self.word_to_idx, load_quran_data(QURAN_NORM_PATH))
+
+    def decode(self, prompts):
+        return greedy_decode_kv(self.model, prompts, self.eos_token, max_output_words=self.max_output_words,
+                                device=self.device, prefix_cache=self.prefix_cache, ambiguity_map=self.ambiguity_map)
+
+    def result(self, text):
+        result = {'text': text}
+        if self.ambiguity_map is not None:
+            candidates = self.ambiguity_map.candidates([self.word_to_idx.get(word, -1) for word in text.split()])
+            result['index'] = candidates[0] if len(candidates) == 1 else None
+        return result
+
+    def run_batch(self, requests):
+        if self.prefix_index is not None:
+            results = [None] * len(requests)
+            remaining = []
+            for i, request in enumerate(requests):
+                candidates = self.prefix_index.match(request.get('text', ''))
+                opening = self.prefix_index.common_opening(candidates, self.max_output_words) if candidates else None
+                if opening is None:
+                    remaining.append(i)
+                    continue
+                self.prefix_index.short_circuits += 1
+                results[i] = self.result(' '.join(opening))
+            if remaining:
+                for i, result in zip(remaining, self.run_model([requests[i] for i in remaining])):
+                    results[i] = result
+            return results
+        return self.run_model(requests)
+
+    def run_model(self, requests):
+        prompts = [build_prompt(self.word_to_idx, request.get('text', ''), oov_resolver=self.oov_resolver) for request in requests]
+        if self.cache is None:
+            outputs = self.decode(prompts)
+            return [self.result(tokens_to_text(tokens, self.idx_to_word)) for tokens in outputs]
+
+        keys = [(self.max_output_words, self.ambiguity_map is not None) + tuple(prompt) for prompt in prompts]
+        texts = [self.cache.get(key) for key in keys]
+        missing = [i for i, text in enumerate(texts) if text is None]
+        if missing:
+            outputs = self.decode([prompts[i] for i in missing])
+            for i, tokens in zip(missing, outputs):
+                texts[i] = tokens_to_text(tokens, self.idx_to_word)
+                self.cache.put(keys[i], texts[i])
+        return [self.result(text) for text in texts]
+
+
+class MatcherBackend:
+    """QuranMatcherModel through QuranPredictor.predict_batch"""
+    def __init__(self, model_path, vocab_path, quran_path, normalize=True, cache_size=0, cache_path=None, prefix_index=False):
+        self.predictor = QuranPredictor(model_path=model_path, vocab_path=vocab_path, quran_path=quran_path,
+                                        cache_size=cache_size, cache_path=cache_path, prefix_index=prefix_index)
+        self.cache = self.predictor.cache
+        self.prefix_index = self.predictor.prefix_index
+        self.normalize = normalize_arabic if normalize else (lambda text: text)
+        # A model trained on normalized text is useless on raw text and vice versa
+        check_fingerprints(self.predictor.model_info, model_path, normalize=normalize_arabic if normalize else None)
+
+    def run_batch(self, requests):
+        # A batch runs with its largest top_k, so one past the ayat count must not fail the others
+        top_ks = [min(int(request.get('top_k', 5)), len(self.predictor.ayat)) for request in requests]
+        texts = [' '.join(self.normalize(request.get('text', '')).split()) for request in requests]
+        results = self.predictor.predict_batch(texts, top_k=max(top_ks))
+        return [{'predictions': predictions[:k]} for predictions, k in zip(results, top_ks)]
+
+
+class MatcherVariantBackend(MatcherBackend):
+    """One of several QuranMatcherModel checkpoints, loaded from a shared ModelRegistry
+
+    The checkpoint loads on the first request and is held only while a
+    batch runs, so the registry can evict it in between. Vocabulary, ayat
+    and tokenizer tables are shared with the other variants.
+    """
+    def __init__(self, name, registry, predictor, vocab_path, normalize=True, cache_size=0, cache_path=None):
+        self.name = name
+        self.registry = registry
+        self.predictor = copy.copy(predictor)
+        self.predictor.cache = None
+        if cache_size:
+            fingerprint = file_fingerprint(registry.path(name), vocab_path)
+            self.predictor.cache = ResultCache(cache_size, cache_path, fingerprint=fingerprint)
+        self.cache = self.predictor.cache
+        self.prefix_index = None
+        self.normalize = normalize_arabic if normalize else (lambda text: text)
+
+    def run_batch(self, requests):
+        self.predictor.model = self.registry.get(self.name)
+        try:
+            return super().run_batch(requests)
+        finally:
+            self.predictor.model = None
+
+
+class CascadeBackend:
+    """Matcher first, seq2seq only when the matcher is not confident enough"""
+    def __init__(self, seq2seq, matcher, thresholds_path, normalize=True, cache_path=None):
+        thresholds = load_thresholds(thresholds_path)
+        # Runs on its own batcher thread, so it shares neither the seq2seq prefix cache nor the
+        # matcher's result cache and prefix index: its own predictor over the same model and tables
+        self.predictor = copy.copy(matcher.predictor)
+        self.predictor.cache = None
+        if matcher.cache is not None:
+            self.predictor.cache = ResultCache(matcher.cache.capacity, cache_path, fingerprint=matcher.cache.fingerprint)
+        self.predictor.prefix_index = None
+        if matcher.prefix_index is not None:
+            self.predictor.prefix_index = AyahPrefixIndex(self.predictor.ayat, normalize=normalize_arabic)
+        self.cache = self.predictor.cache
+        self.prefix_index = self.predictor.prefix_index
+        self.cascade = CascadePredictor(self.predictor, seq2seq.model, seq2seq.word_to_idx, seq2seq.idx_to_word,
+                                        load_quran_data(QURAN_NORM_PATH),
+                                        min_probability=thresholds['min_probability'], min_margin=thresholds['min_margin'],
+                                        normalize=normalize, device=seq2seq.device)
+        self.stats = self.cascade.stats
+
+    def run_batch(self, requests):
+        results = self.cascade.predict_batch([request.get('text', '') for request in requests],
+                                             top_k=min(max(int(request.get('top_k', 5)) for request in requests),
+                                                       len(self.predictor.ayat)))
+        return [{key: value for key, value in result.items() if key != 'candidates'} for result in results]
+
+
+class InferenceServer:
+    """Minimal HTTP/1.1 front end (keep-alive, JSON bodies) over the batchers"""
+    def __init__(self, batchers, caches=None, prefix_caches=None, cascade_stats=None, prefix_indexes=None, ambiguity_maps=None,
+                 oov_resolvers=None, registry=None):
+        self.batchers = batchers
+        self.caches = caches or {}
+        self.prefix_caches = prefix_caches or {}
+        self.prefix_indexes = prefix_indexes or {}
+        self.ambiguity_maps = ambiguity_maps or {}
+        self.oov_resolvers = oov_resolvers or {}
+        self.cascade_stats = cascade_stats
+        self.registry = registry
+        self.started = time.time()
+        self.connections = 0
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                if len(parts) < 2:
+                    break
+                method, path = parts[0], parts[1]
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    # The body cannot be skipped reliably, so the connection ends here
+                    error = f'Content-Length must be an integer from 0 to {MAX_BODY_BYTES}'
+                    await self.respond(writer, '400 Bad Request', {'error': error}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.route(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f'HTTP/1.1 {status}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(data)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + data
+        )
+        await writer.drain()
+
+    async def route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return '200 OK', {'status': 'ok', 'models': sorted(self.batchers)}
+        if method == 'GET' and path == '/metrics':
+            return '200 OK', {
+                'uptime_s': round(time.time() - self.started, 1),
+                'connections': self.connections,
+                'models': {name: batcher.metrics() for name, batcher in self.batchers.items()},
+                'caches': {name: cache.stats() for name, cache in self.caches.items()},
+                'prefix_caches': {name: cache.stats() for name, cache in self.prefix_caches.items()},
+                'cascade': self.cascade_stats,
+                'prefix_indexes': {name: index.stats() for name, index in self.prefix_indexes.items()},
+                'ambiguity_maps': {name: ambiguity_map.stats() for name, ambiguity_map in self.ambiguity_maps.items()},
+                'oov_resolvers': {name: resolver.stats() for name, resolver in self.oov_resolvers.items()},
+                'registry': self.registry.stats() if self.registry is not None else None,
+            }
+        if method == 'POST' and path.lstrip('/') in self.batchers:
+            try:
+                request = json.loads(body or b'{}')
+            except json.JSONDecodeError as e:
+                return '400 Bad Request', {'error': f'invalid JSON: {e}'}
+            error = request_error(request)
+            if error is not None:
+                return '400 Bad Request', {'error': error}
+            start = time.perf_counter()
+            try:
+                result = await self.batchers[path.lstrip('/')].submit(request)
+            except Exception as e:
+                return '500 Internal Server Error', {'error': str(e)}
+            result['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            return '200 OK', result
+        return '404 Not Found', {'error': f'no route for {method} {path}'}
+
+
+async def serve(args):
+    def cache_path(name):
+        return os.path.join(args.cache_dir, f'{name}_results.json') if args.cache_dir else None
+
+    batchers = {}
+    backends = {}
+    if args.seq2seq:
+        print(f'Loading seq2seq model from {args.seq2seq}...')
+        backends['seq2seq'] = Seq2SeqBackend(args.seq2seq, args.seq2seq_vocab, torch.device(args.device),
+                                             cache_size=args.cache_size, cache_path=cache_path('seq2seq'),
+                                             prefix_cache_mb=args.prefix_cache_mb, prefix_index=args.prefix_index,
+                                             early_stop=args.early_stop, oov_resolver=args.oov_resolver)
+    if args.matcher:
+        print(f'Loading matcher model from {args.matcher}...')
+        backends['matcher'] = MatcherBackend(args.matcher, args.matcher_vocab, args.quran, normalize=not args.no_normalize,
+                                             cache_size=args.cache_size, cache_path=cache_path('matcher'),
+                                             prefix_index=args.prefix_index)
+    registry = None
+    if args.matcher_variant:
+        # A/B variants: checkpoints load on first request, LRU-evicted past --registry-mb
+        registry = ModelRegistry(args.registry_mb, device=args.device)
+        shared = QuranPredictor(model_path=None, vocab_path=args.matcher_vocab, quran_path=args.quran)
+        for variant in args.matcher_variant:
+            name, _, path = variant.partition('=')
+            registry.register(name, path, vocabulary=shared.vocabulary, normalize=None if args.no_normalize else normalize_arabic)
+            backends[f'matcher/{name}'] = MatcherVariantBackend(name, registry, shared, args.matcher_vocab,
+                                                                normalize=not args.no_normalize, cache_size=args.cache_size,
+                                                                cache_path=cache_path(f'matcher_{name}'))
+        print(f'Registered {len(args.matcher_variant)} matcher variants ({args.registry_mb} MB budget)')
+    if args.seq2seq and args.matcher:
+        backends['cascade'] = CascadeBackend(backends['seq2seq'], backends['matcher'], args.cascade_thresholds,
+                                             normalize=not args.no_normalize, cache_path=cache_path('cascade'))
+    for name, backend in backends.items():
+        batchers[name] = MicroBatcher(name, backend.run_batch, args.max_batch, args.max_wait_ms)
+    caches = {name: backend.cache for name, backend in backends.items() if getattr(backend, 'cache', None) is not None}
+    if not batchers:
+        print('Error: pass --seq2seq, --matcher and/or --matcher-variant')
+        return
+
+    for batcher in batchers.values():
+        batcher.start()
+
+    prefix_caches = {name: backend.prefix_cache for name, backend in backends.items()
+                     if getattr(backend, 'prefix_cache', None) is not None}
+    prefix_indexes = {name: backend.prefix_index for name, backend in backends.items()
+                      if getattr(backend, 'prefix_index', None) is not None}
+    ambiguity_maps = {name: backend.ambiguity_map for name, backend in backends.items()
+                      if getattr(backend, 'ambiguity_map', None) is not None}
+    oov_resolvers = {name: backend.oov_resolver for name, backend in backends.items()
+                     if getattr(backend, 'oov_resolver', None) is not None}
+    cascade_stats = backends['cascade'].stats if 'cascade' in backends else None
+    app = InferenceServer(batchers, caches, prefix_caches, cascade_stats, prefix_indexes, ambiguity_maps, oov_resolvers,
+                          registry)
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        server = await asyncio.start_unix_server(app.handle_connection, path=args.unix)
+        print(f'✓ Serving {", ".join(batchers)} on unix:{args.unix}')
+    else:
+        server = await asyncio.start_server(app.handle_connection, host=args.host, port=args.port)
+        print(f'✓ Serving {", ".join(batchers)} on http://{args.host}:{args.port}')
+    print(f'  Micro-batching: max_batch={args.max_batch}, max_wait={args.max_wait_ms}ms')
+
+    # Stop cleanly on Ctrl-C or SIGTERM so the result caches get saved
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        async with server:
+            await stop.wait()
+        print('\nServer stopped')
+    finally:
+        for batcher in batchers.values():
+            await batcher.stop()
+        for cache in caches.values():
+            cache.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Quran model inference server')
+    parser.add_argument('--seq2seq', help='QuranSeq2SeqModel checkpoint')
+    parser.add_argument('--seq2seq-vocab', default=os.path.join(AI_DIR, 'transformer', 'model', 'vocabulary.json'))
+    parser.add_argument('--matcher', help='QuranMatcherModel checkpoint')
+    parser.add_argument('--matcher-variant', action='append', metavar='NAME=PATH',
+                        help='Extra matcher checkpoint served at /matcher/NAME, loaded on first use (repeatable)')
+    parser.add_argument('--registry-mb', type=float, default=512,
+                        help='Memory budget of the --matcher-variant models; least recently used ones are unloaded past it')
+    parser.add_argument('--matcher-vocab', default=os.path.join(AI_DIR, 'feed-forward', 'vocabulary_normalized.json'))
+    parser.add_argument('--no-normalize', action='store_true', help='Matcher vocabulary is not normalized (vocabulary.json)')
+    parser.add_argument('--quran', default=QURAN_PATH)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='Serve on this Unix socket path instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--cache-size', type=int, default=0, help='LRU result cache entries per model (0 disables)')
+    parser.add_argument('--cache-dir', help='Persist result caches here across restarts')
+    parser.add_argument('--prefix-index', action='store_true', help='Answer exact ayah openings without running the models')
+    parser.add_argument('--early-stop', action='store_true', help='Stop seq2seq decoding once the output pins down the ayah')
+    parser.add_argument('--oov-resolver', action='store_true', help='Map seq2seq input words missing from the vocabulary to the nearest one')
+    parser.add_argument('--cascade-thresholds', default='cascade_thresholds.json',
+                        help='Thresholds from calibrate_cascade.py for /cascade (served when both models are loaded)')
+    parser.add_argument('--prefix-cache-mb', type=float, default=0, help='Memory budget of the shared seq2seq prompt-prefix KV cache (0 disables)')
+    args = parser.parse_args()
+
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
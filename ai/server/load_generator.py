@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Load generator for inference_server.py
+
+Opens `concurrency` keep-alive connections and sends the first few words of
+random ayat as fast as the server answers, then reports throughput and
+client-side latency percentiles next to the server's own /metrics.
+
+Usage:
+    python load_generator.py --endpoint seq2seq --concurrency 32 --requests 2000
+    python load_generator.py --endpoint matcher --unix /tmp/muhaffez.sock
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+
+AI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(AI_DIR, 'transformer', 'model'))
+
+from seq2seq_model import load_quran_data
+
+NORM_QURAN_PATH = os.path.join(AI_DIR, 'transformer', 'datasets', 'quran-simple-norm.txt')
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, args):
+        if args.unix:
+            reader, writer = await asyncio.open_unix_connection(args.unix)
+        else:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+        return cls(reader, writer)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        self.writer.write(
+            f'{method} {path} HTTP/1.1\r\n'
+            f'Host: localhost\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body
+        )
+        await self.writer.drain()
+
+        status = await self.reader.readline()
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value.strip())
+        data = await self.reader.readexactly(length)
+        return int(status.split()[1]), json.loads(data)
+
+    def close(self):
+        self.writer.close()
+
+
+def make_inputs(quran_path, count, min_words=3, max_words=6, seed=42):
+    """First min_words..max_words words of random ayat"""
+    rng = random.Random(seed)
+    ayat = [ayah.split() for ayah in load_quran_data(quran_path)]
+    inputs = []
+    for _ in range(count):
+        words = rng.choice(ayat)
+        inputs.append(' '.join(words[:rng.randint(min_words, max_words)]))
+    return inputs
+
+
+async def run_client(args, inputs, latencies, failures):
+    connection = await Connection.open(args)
+    try:
+        while inputs:
+            text = inputs.pop()
+            start = time.perf_counter()
+            status, _ = await connection.request('POST', f'/{args.endpoint}', {'text': text, 'top_k': args.top_k})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                failures.append(status)
+    finally:
+        connection.close()
+
+
+async def run(args):
+    inputs = make_inputs(args.quran, args.requests)
+    latencies = []
+    failures = []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(args, inputs, latencies, failures) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    connection = await Connection.open(args)
+    _, metrics = await connection.request('GET', '/metrics')
+    connection.close()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    print(f'\n{"="*60}')
+    print(f'LOAD TEST: /{args.endpoint}, concurrency {args.concurrency}')
+    print(f'{"="*60}')
+    print(f'Requests:    {len(latencies)} ({len(failures)} failed)')
+    print(f'Throughput:  {len(latencies) / elapsed:.1f} requests/s')
+    print(f'Latency:     p50 {p50:.2f}ms, p90 {p90:.2f}ms, p99 {p99:.2f}ms, max {max(latencies):.2f}ms')
+
+    server = metrics['models'].get(args.endpoint, {})
+    if server:
+        print(f'Server:      mean batch {server["mean_batch_size"]}, max queue depth {server["max_queue_depth"]}')
+        print(f'             latency p50 {server["latency_ms"]["p50"]}ms, p99 {server["latency_ms"]["p99"]}ms, '
+              f'queue wait p99 {server["queue_wait_ms"]["p99"]}ms')
+    print(f'{"="*60}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generator for the local inference server')
+    parser.add_argument('--endpoint', default='seq2seq', choices=['seq2seq', 'matcher'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='Connect to this Unix socket instead of TCP')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--quran', default=NORM_QURAN_PATH)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
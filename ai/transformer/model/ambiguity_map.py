@@ -0,0 +1,83 @@
+"""
+Precomputed ayah ambiguity map for early-stopping generation
+
+For every ayah and every opening length up to max_words, the map holds the
+ayat that start with that opening, and the first max_words words those ayat
+share (when they all agree). Most ayat are pinned down by 2-3 words, so a
+decoder can stop as soon as its generated prefix leaves a single ayah, or
+leaves several ayat that agree on the rest of the output, and copy the
+remaining words from the corpus instead of running more forward passes.
+
+Keys are token ids of the seq2seq vocabulary, so decoders can look up
+their raw output; words missing from the vocabulary end an ayah's entries.
+"""
+import numpy as np
+
+
+class AyahAmbiguityMap:
+    """Opening token tuple -> (consistent ayat, determined output tokens or None)"""
+    def __init__(self, ayat, word_to_idx, max_words=6):
+        self.max_words = max_words
+        openings = []
+        table = {}
+        for idx, ayah in enumerate(ayat):
+            tokens = []
+            for word in ayah.split()[:max_words]:
+                if word not in word_to_idx:
+                    break
+                tokens.append(word_to_idx[word])
+            openings.append(tuple(tokens))
+            for length in range(1, len(tokens) + 1):
+                table.setdefault(openings[idx][:length], []).append(idx)
+
+        self.openings = openings
+        self.table = {}
+        for key, candidates in table.items():
+            first = openings[candidates[0]]
+            # Output is fixed if every consistent ayah opens with the same max_words words
+            determined = first if all(openings[idx] == first for idx in candidates[1:]) else None
+            self.table[key] = (tuple(candidates), determined)
+
+        # Opening length at which each ayah becomes the only candidate (0 if never)
+        self.unique_length = np.zeros(len(ayat), dtype=np.int64)
+        for idx, tokens in enumerate(openings):
+            for length in range(1, len(tokens) + 1):
+                if len(self.table[tokens[:length]][0]) == 1:
+                    self.unique_length[idx] = length
+                    break
+
+        self.lookups = 0
+        self.early_stops = 0
+        self.forward_passes_saved = 0
+
+    def candidates(self, tokens):
+        """Ayat whose opening is tokens (empty if none, or if longer than max_words)"""
+        entry = self.table.get(tuple(tokens))
+        return entry[0] if entry else ()
+
+    def resolve(self, tokens):
+        """(ayah index or None, completed output tokens) once tokens pin down the output, else None
+
+        The index is returned only when a single ayah is left.
+        """
+        self.lookups += 1
+        entry = self.table.get(tuple(tokens))
+        if entry is None or entry[1] is None:
+            return None
+        candidates, determined = entry
+        return (candidates[0] if len(candidates) == 1 else None), list(determined)
+
+    def record_stop(self, steps_taken, output_length, max_output_words):
+        """Count one early stop; an uncapped decode would also have emitted </s> after a short ayah"""
+        full_steps = min(output_length + 1, max_output_words)
+        self.early_stops += 1
+        self.forward_passes_saved += max(full_steps - steps_taken, 0)
+
+    def stats(self):
+        return {
+            'lookups': self.lookups,
+            'early_stops': self.early_stops,
+            'forward_passes_saved': self.forward_passes_saved,
+            'mean_unique_length': round(float(self.unique_length[self.unique_length > 0].mean()), 3),
+            'never_unique': int(np.sum(self.unique_length == 0)),
+        }
@@ -0,0 +1,162 @@
+"""
+Batched greedy decoding for QuranSeq2SeqModel
+
+predict_ayah in test/test_specific_inputs.py decodes one prompt at a time.
+Here several prompts of different lengths are decoded together: sequences
+are right-padded, and because attention is causal the padding after a
+sequence never influences its own positions, so each row reads its next
+token from its own last position and gets the same tokens as one-at-a-time
+decoding.
+"""
+import torch
+
+SPECIAL_TOKENS = ['<s>', '</s>', 'القاريء:', 'الاية:', '<pad>']
+
+
+def build_prompt(word_to_idx, input_text, max_input_words=6, oov_resolver=None):
+    """Token ids of <s> القاريء: [input words] الاية:
+
+    Words missing from the vocabulary are dropped, like in predict_ayah,
+    unless an OOVResolver maps them to their nearest vocabulary word.
+    """
+    input_words = input_text.split()[:max_input_words]
+    tokens = [word_to_idx['<s>'], word_to_idx['القاريء:']]
+    for word in input_words:
+        if oov_resolver is not None:
+            word = oov_resolver.resolve(word)
+        if word in word_to_idx:
+            tokens.append(word_to_idx[word])
+    tokens.append(word_to_idx['الاية:'])
+    return tokens
+
+
+def greedy_decode_batch(model, prompts, eos_token, pad_token=0, max_output_words=6, device='cpu',
+                        ambiguity_map=None, return_indices=False):
+    """Greedy-decode a list of prompt token lists together
+
+    Returns one list of generated token ids per prompt (</s> excluded).
+    With an AyahAmbiguityMap, a sequence stops as soon as its output
+    pins down the ayah and the rest is copied from the corpus; with
+    return_indices, (outputs, ayah index or None per prompt) is returned.
+    """
+    sequences = [list(prompt) for prompt in prompts]
+    outputs = [[] for _ in prompts]
+    indices = [None] * len(prompts)
+    active = list(range(len(prompts)))
+
+    for step in range(max_output_words):
+        if not active:
+            break
+        lengths = torch.tensor([len(sequences[i]) for i in active], device=device)
+        batch = torch.full((len(active), int(lengths.max())), pad_token, dtype=torch.long)
+        for row, i in enumerate(active):
+            batch[row, :len(sequences[i])] = torch.tensor(sequences[i], dtype=torch.long)
+        batch = batch.to(device)
+
+        with torch.no_grad():
+            logits = model(batch)
+        last = logits[torch.arange(len(active), device=device), lengths - 1]
+        next_tokens = last.argmax(dim=-1).tolist()
+
+        still_active = []
+        for i, token in zip(active, next_tokens):
+            if token == eos_token:
+                continue
+            sequences[i].append(token)
+            outputs[i].append(token)
+            if ambiguity_map is not None and stop_early(ambiguity_map, outputs, indices, i, step, max_output_words):
+                continue
+            still_active.append(i)
+        active = still_active
+
+    return finish(outputs, indices, ambiguity_map, return_indices)
+
+
+def greedy_decode_kv(model, prompts, eos_token, max_output_words=6, device='cpu', prefix_cache=None,
+                     ambiguity_map=None, return_indices=False):
+    """Greedy-decode prompts together using per-layer keys/values
+
+    Each prompt except its last token (الاية:) is prefilled on its own,
+    through prefix_cache (a PrefixKVCache) when given so shared openings
+    are computed once. The caches are then right-padded to a common length
+    and every output step is a single one-token forward for the whole batch.
+    Returns the same tokens as greedy_decode_batch (ambiguity_map and
+    return_indices work the same way; the batch stops once every row has).
+    """
+    pasts = []
+    for prompt in prompts:
+        if prefix_cache is not None:
+            pasts.append(prefix_cache.prefill(prompt[:-1], device=device))
+        else:
+            with torch.no_grad():
+                _, past = model.forward_cached(torch.tensor([prompt[:-1]], dtype=torch.long, device=device))
+            pasts.append(past)
+
+    lengths = torch.tensor([len(prompt) - 1 for prompt in prompts], device=device)
+    max_len = int(lengths.max())
+    key_mask = torch.arange(max_len, device=device).unsqueeze(0) < lengths.unsqueeze(1)
+    past_key_values = []
+    for layer in range(len(pasts[0])):
+        first = pasts[0][layer][0]
+        keys = first.new_zeros(len(prompts), first.shape[1], max_len, first.shape[3])
+        values = torch.zeros_like(keys)
+        for row, past in enumerate(pasts):
+            keys[row, :, :past[layer][0].shape[2]] = past[layer][0][0]
+            values[row, :, :past[layer][1].shape[2]] = past[layer][1][0]
+        past_key_values.append((keys, values))
+
+    next_input = torch.tensor([[prompt[-1]] for prompt in prompts], dtype=torch.long, device=device)
+    positions = lengths.unsqueeze(1)
+    outputs = [[] for _ in prompts]
+    indices = [None] * len(prompts)
+    finished = [False] * len(prompts)
+
+    for step in range(max_output_words):
+        key_mask = torch.cat([key_mask, torch.ones(len(prompts), 1, dtype=torch.bool, device=device)], dim=1)
+        with torch.no_grad():
+            logits, past_key_values = model.forward_cached(next_input, past_key_values, positions=positions, key_mask=key_mask)
+        next_tokens = logits[:, -1].argmax(dim=-1)
+
+        for row, token in enumerate(next_tokens.tolist()):
+            if finished[row]:
+                continue
+            if token == eos_token:
+                finished[row] = True
+            else:
+                outputs[row].append(token)
+                if ambiguity_map is not None:
+                    finished[row] = stop_early(ambiguity_map, outputs, indices, row, step, max_output_words)
+        if all(finished) or step == max_output_words - 1:
+            break
+        next_input = next_tokens.unsqueeze(1)
+        positions = positions + 1
+
+    return finish(outputs, indices, ambiguity_map, return_indices)
+
+
+def stop_early(ambiguity_map, outputs, indices, row, step, max_output_words):
+    """Complete outputs[row] from the corpus if its prefix pins down the output; True if it did"""
+    resolved = ambiguity_map.resolve(outputs[row])
+    if resolved is None:
+        return False
+    indices[row], outputs[row] = resolved[0], resolved[1][:max_output_words]
+    ambiguity_map.record_stop(step + 1, len(outputs[row]), max_output_words)
+    return True
+
+
+def finish(outputs, indices, ambiguity_map, return_indices):
+    """outputs, or (outputs, ayah indices) with indices filled in for outputs matching one ayah"""
+    if not return_indices:
+        return outputs
+    if ambiguity_map is not None:
+        for row, tokens in enumerate(outputs):
+            if indices[row] is None:
+                candidates = ambiguity_map.candidates(tokens)
+                indices[row] = candidates[0] if len(candidates) == 1 else None
+    return outputs, indices
+
+
+def tokens_to_text(tokens, idx_to_word):
+    """Join generated tokens into text, skipping special tokens"""
+    words = [idx_to_word.get(token, '?') for token in tokens]
+    return ' '.join(word for word in words if word not in SPECIAL_TOKENS)
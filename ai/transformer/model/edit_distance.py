@@ -0,0 +1,185 @@
+"""
+Edit distance and similarity, matching the iOS app
+
+Ports of String.levenshteinDistance / String.similarity /
+String.normalizedArabic (Muhaffez/Extensions/String.swift) and of the
+prefix similarity MuhaffezViewModel uses to score an ayah against the
+recognized text, so Python tooling ranks ayat exactly like the app.
+
+levenshtein_distances / prefix_similarities score one query against many
+texts at once with the Myers/Hyyro bit-parallel algorithm: each DP column
+is two bit vectors (vertical +1 / -1 deltas) over the query, updated with a
+handful of word operations per text character. The vectors of all
+candidates are numpy arrays, so one step advances every candidate; queries
+longer than 64 characters use several 64-bit words with carries between them.
+"""
+import re
+import unicodedata
+import numpy as np
+
+# CharacterSet.arabicDiacritics: harakat U+064B-U+065F and dagger alif U+0670
+ARABIC_DIACRITICS = re.compile('[\u064B-\u065F\u0670]')
+HAMZA_MAP = str.maketrans({'إ': 'ا', 'أ': 'ا', 'آ': 'ا'})
+
+
+def normalized_arabic(text):
+    """String.normalizedArabic: drop tashkeel and format (Cf) characters, map إأآ to ا"""
+    text = ARABIC_DIACRITICS.sub('', text)
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Cf')
+    return text.translate(HAMZA_MAP)
+
+
+def levenshtein_distance(source, target):
+    """Character edit distance (insert / delete / substitute, all cost 1)"""
+    if not source:
+        return len(target)
+    if not target:
+        return len(source)
+    previous = list(range(len(target) + 1))
+    for i, source_char in enumerate(source, 1):
+        current = [i]
+        for j, target_char in enumerate(target, 1):
+            if source_char == target_char:
+                current.append(previous[j - 1])
+            else:
+                current.append(min(previous[j], current[j - 1], previous[j - 1]) + 1)
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    """String.similarity: 1 - distance / longer length (1.0 for two empty strings)"""
+    max_len = max(len(a), len(b))
+    if max_len == 0:
+        return 1.0
+    return 1.0 - levenshtein_distance(a, b) / max_len
+
+
+def prefix_similarity(text, ayah):
+    """Similarity of the recognized text to the ayah's opening of the same length
+
+    Both are normalized; as in MuhaffezViewModel.performSimilarityMatching,
+    the ayah is cut to the text's length and the text to the ayah's.
+    """
+    ayah_prefix = ayah[:len(text)]
+    return similarity(text[:len(ayah_prefix)], ayah_prefix)
+
+
+def encode_texts(texts, max_length=None):
+    """(codes, lengths): code points of each text, right-padded with 0, cut to max_length"""
+    lengths = np.array([len(text) if max_length is None else min(len(text), max_length) for text in texts], dtype=np.int64)
+    codes = np.zeros((len(texts), int(lengths.max()) if len(texts) else 0), dtype=np.int32)
+    for row, (text, length) in enumerate(zip(texts, lengths)):
+        if length:
+            codes[row, :length] = np.frombuffer(text[:length].encode('utf-32-le'), dtype=np.uint32)
+    return codes, lengths
+
+
+def _popcount(words):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).astype(np.int64)
+    return np.unpackbits(words.view(np.uint8).reshape(words.shape + (8,)), axis=-1).sum(axis=-1).astype(np.int64)
+
+
+def _low_bits(count):
+    """uint64 masks with the lowest count bits set (count in 0..64)"""
+    count = np.clip(count, 0, 64).astype(np.uint64)
+    return np.where(count >= 64, np.uint64(0xFFFFFFFFFFFFFFFF),
+                    (np.uint64(1) << np.minimum(count, 63)) - np.uint64(1))
+
+
+def _last_columns(pattern, codes, lengths):
+    """Vertical delta vectors (VP, VN), shape (words, num_texts), of each text's last DP column
+
+    Bit i of VP / VN is set when D[i + 1][n] - D[i][n] is +1 / -1, where
+    D is the edit-distance table of pattern (rows) against the text
+    (columns) and n the text's length.
+    """
+    num_words = (len(pattern) + 63) // 64
+    num_texts = codes.shape[0]
+
+    # Peq: per pattern character, the bit positions where it occurs; row 0 is any other character
+    alphabet = {char: row for row, char in enumerate(sorted(set(pattern)), 1)}
+    peq = np.zeros((len(alphabet) + 1, num_words), dtype=np.uint64)
+    for position, char in enumerate(pattern):
+        peq[alphabet[char], position // 64] |= np.uint64(1) << np.uint64(position % 64)
+    lut = np.zeros(max(int(codes.max(initial=0)), max(map(ord, alphabet), default=0)) + 1, dtype=np.int64)
+    for char, row in alphabet.items():
+        lut[ord(char)] = row
+    rows = lut[codes]
+
+    vp = np.full((num_words, num_texts), 0xFFFFFFFFFFFFFFFF, dtype=np.uint64)
+    vn = np.zeros((num_words, num_texts), dtype=np.uint64)
+    one = np.uint64(1)
+    top = np.uint64(63)
+    for column in range(codes.shape[1]):
+        eq_all = peq[rows[:, column]].T
+        active = column < lengths
+        add_carry = np.zeros(num_texts, dtype=np.uint64)
+        # Top row D[0][j] = j: every column starts one higher than the last
+        ph_carry = np.ones(num_texts, dtype=np.uint64)
+        mh_carry = np.zeros(num_texts, dtype=np.uint64)
+        for word in range(num_words):
+            eq, pv, mv = eq_all[word], vp[word], vn[word]
+            xv = eq | mv
+            # (eq & pv) + pv with the carry of the lower word
+            partial = eq & pv
+            total = partial + pv
+            carry = (total < partial).astype(np.uint64)
+            total_with_carry = total + add_carry
+            add_carry = carry | (total_with_carry < total).astype(np.uint64)
+            xh = ((total_with_carry ^ pv) | eq)
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            ph_shifted = (ph << one) | ph_carry
+            mh_shifted = (mh << one) | mh_carry
+            ph_carry = ph >> top
+            mh_carry = mh >> top
+            vp[word] = np.where(active, mh_shifted | ~(xv | ph_shifted), pv)
+            vn[word] = np.where(active, ph_shifted & xv, mv)
+    return vp, vn
+
+
+def _distances_at_row(vp, vn, rows, lengths):
+    """D[rows][lengths] from the last columns: lengths + (+1 deltas) - (-1 deltas) over the first rows"""
+    distances = lengths.astype(np.int64).copy()
+    for word in range(vp.shape[0]):
+        mask = _low_bits(rows - 64 * word)
+        distances += _popcount(vp[word] & mask) - _popcount(vn[word] & mask)
+    return distances
+
+
+def levenshtein_distances(query, texts):
+    """levenshtein_distance(query, text) for every text, bit-parallel over all texts at once
+
+    texts is a list of strings or the (codes, lengths) of encode_texts().
+    """
+    codes, lengths = encode_texts(texts) if isinstance(texts, list) else texts
+    if not query or len(lengths) == 0:
+        return lengths.astype(np.int64)
+    vp, vn = _last_columns(query, codes, lengths)
+    return _distances_at_row(vp, vn, np.full(len(lengths), len(query)), lengths)
+
+
+def similarities(query, texts):
+    """similarity(query, text) for every text"""
+    codes, lengths = encode_texts(texts) if isinstance(texts, list) else texts
+    max_lengths = np.maximum(lengths, len(query))
+    distances = levenshtein_distances(query, (codes, lengths))
+    return np.where(max_lengths == 0, 1.0, 1.0 - distances / np.maximum(max_lengths, 1))
+
+
+def prefix_similarities(text, ayat):
+    """prefix_similarity(text, ayah) for every (normalized) ayah
+
+    ayat is a list of strings or encode_texts() of them; encoding once with
+    max_length at least the longest expected text saves re-encoding.
+    """
+    codes, lengths = encode_texts(ayat, max_length=len(text)) if isinstance(ayat, list) else ayat
+    # Both prefixes have the ayah's length cut to the text's: D[k][k] of text against the ayah prefix
+    prefix_lengths = np.minimum(lengths, len(text))
+    if not text:
+        return np.ones(len(prefix_lengths))
+    vp, vn = _last_columns(text, codes[:, :len(text)], prefix_lengths)
+    distances = _distances_at_row(vp, vn, prefix_lengths, prefix_lengths)
+    return np.where(prefix_lengths == 0, 1.0, 1.0 - distances / np.maximum(prefix_lengths, 1))
@@ -0,0 +1,89 @@
+"""
+Word-trie matcher tolerating skipped and substituted words
+
+generate_datasets.py trains on two reader errors: a word of the ayah is
+skipped, or a word is replaced by another one. Both are edits of a path in
+a trie of ayah word sequences: a skip consumes a trie word without an
+input word, a substitution consumes one of each. The search walks the trie
+with a budget of max_edits; a branch is dropped as soon as it exceeds the
+budget, and with iterative deepening the first edit count that yields any
+match ends the search, so clean inputs never explore edited branches.
+Every ayah below the node where the input ends is a candidate.
+"""
+
+
+class TrieNode:
+    __slots__ = ('children', 'ayat')
+
+    def __init__(self):
+        self.children = {}
+        self.ayat = []
+
+
+class FuzzyAyahTrie:
+    """Trie of ayah word sequences with bounded skip/substitution search
+
+    ayat:       normalized ayah texts
+    max_depth:  only the first max_depth words of each ayah are indexed
+                (inputs are at most 6 words; skips need a few more)
+    """
+    def __init__(self, ayat, max_depth=12, normalize=None):
+        self.normalize = normalize or (lambda text: text)
+        self.root = TrieNode()
+        self.num_nodes = 1
+        for idx, ayah in enumerate(ayat):
+            node = self.root
+            node.ayat.append(idx)
+            for word in self.normalize(ayah).split()[:max_depth]:
+                child = node.children.get(word)
+                if child is None:
+                    child = node.children[word] = TrieNode()
+                    self.num_nodes += 1
+                node = child
+                node.ayat.append(idx)
+
+    def _walk(self, words, node, position, edits, max_edits, found):
+        """Depth-first search; found maps end node -> fewest edits"""
+        if position == len(words):
+            if edits < found.get(node, (max_edits + 1,))[0]:
+                found[node] = (edits, node)
+            return
+        word = words[position]
+        child = node.children.get(word)
+        if child is not None:
+            self._walk(words, child, position + 1, edits, max_edits, found)
+        if edits == max_edits:
+            return
+        for other, child in node.children.items():
+            # Substitution: the reader said `word` instead of `other`
+            if other != word:
+                self._walk(words, child, position + 1, edits + 1, max_edits, found)
+            # Skip: the reader left out `other`
+            self._walk(words, child, position, edits + 1, max_edits, found)
+
+    def search(self, text, max_edits=1, top_k=None, exhaustive=False):
+        """[(ayah index, edits), ...] ranked by edits, then specificity, then index
+
+        Unless exhaustive, stops at the smallest edit count with a match.
+        Among equal edits, ayat under a narrower end node rank first.
+        """
+        words = self.normalize(text).split()
+        if not words:
+            return []
+        found = {}
+        budgets = [max_edits] if exhaustive else range(max_edits + 1)
+        for budget in budgets:
+            self._walk(words, self.root, 0, 0, budget, found)
+            if found:
+                break
+
+        best = {}
+        for edits, node in found.values():
+            for idx in node.ayat:
+                key = (edits, len(node.ayat), idx)
+                if idx not in best or key < best[idx]:
+                    best[idx] = key
+        ranked = sorted(best.values())
+        if top_k is not None:
+            ranked = ranked[:top_k]
+        return [(idx, edits) for edits, _, idx in ranked]
@@ -0,0 +1,64 @@
+"""
+Reader input variants used by test/test.py
+
+The seq2seq model is evaluated on the first N words of an ayah, the same
+with one word skipped, and the same with one word replaced by a random
+vocabulary word (the error types generate_datasets.py trains on). These
+helpers build those inputs so other evaluations use the exact same suites.
+"""
+import random
+
+# (name, num_input_words, skip_position, replace_position), as run by test.py
+TEST_SUITES = (
+    [(f'{n} words', n, None, None) for n in range(3, 7)] +
+    [(f'{n} words (skip 1st)', n - 1, 0, None) for n in range(4, 7)] +
+    [(f'{n} words (skip 2nd)', n - 1, 1, None) for n in range(4, 7)] +
+    [(f'{n} words (skip 3rd)', n - 1, 2, None) for n in range(4, 7)] +
+    [(f'{n} words (skip 4th)', n - 1, 3, None) for n in range(5, 7)] +
+    [(f'{n} words (skip 5th)', n - 1, 4, None) for n in range(6, 7)] +
+    [(f'{n} words (wrong 1st)', n, None, 0) for n in range(4, 7)] +
+    [(f'{n} words (wrong 2nd)', n, None, 1) for n in range(4, 7)] +
+    [(f'{n} words (wrong 3rd)', n, None, 2) for n in range(4, 7)] +
+    [(f'{n} words (wrong 4th)', n, None, 3) for n in range(5, 7)] +
+    [(f'{n} words (wrong 5th)', n, None, 4) for n in range(6, 7)]
+)
+
+
+def variant_input_words(words, num_input_words, skip_position=None, replace_position=None, vocab_words=None, rng=random):
+    """Reader words for one ayah (list of words) under a test variant"""
+    if skip_position is not None:
+        if len(words) <= 3:
+            return words[:min(len(words), num_input_words)]
+        # Words before the skipped one, then enough after it to reach num_input_words
+        before_skip = words[0:skip_position]
+        remaining = num_input_words - len(before_skip)
+        after_skip = words[skip_position + 1:min(len(words), skip_position + 1 + remaining)]
+        return before_skip + after_skip
+
+    if replace_position is not None and vocab_words:
+        if len(words) <= 3:
+            return words[:min(len(words), num_input_words)]
+        input_words = words[:min(len(words), num_input_words)].copy()
+        if replace_position < len(input_words):
+            original_word = input_words[replace_position]
+            replacement_word = rng.choice(vocab_words)
+            while replacement_word == original_word and len(vocab_words) > 1:
+                replacement_word = rng.choice(vocab_words)
+            input_words[replace_position] = replacement_word
+        return input_words
+
+    return words[:min(num_input_words, len(words))]
+
+
+def sample_suite(ayat, suite, count=100, vocab_words=None, rng=random):
+    """[(ayah index, input words), ...] for one TEST_SUITES entry
+
+    Like test.py, only ayat with at least 6 words are sampled.
+    """
+    _, num_input_words, skip_position, replace_position = suite
+    valid_indices = [i for i, ayah in enumerate(ayat) if len(ayah.split()) >= 6]
+    samples = []
+    for idx in rng.sample(valid_indices, min(count, len(valid_indices))):
+        words = ayat[idx].split()
+        samples.append((idx, variant_input_words(words, num_input_words, skip_position, replace_position, vocab_words, rng)))
+    return samples
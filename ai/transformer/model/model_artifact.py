@@ -0,0 +1,171 @@
+"""
+Inference-only model artifacts with memory-mapped weights
+
+Training checkpoints carry the Adam state next to the weights (about 3x
+the model size) and scripts torch.load all of it to read one entry, then
+rebuild the model from hardcoded hyperparameters. An artifact holds only
+the weights, optionally stored as float16 / bfloat16, and the constructor
+arguments, in the safetensors layout:
+
+    uint64 header length, JSON header, then the tensors back to back
+
+    header: {name: {"dtype": "F32" | "F16" | "BF16", "shape": [...],
+                    "data_offsets": [start, end]},     (relative to the data)
+             "__metadata__": {"format": "pt", "model": class name,
+                              "config": JSON of the constructor arguments,
+                              other keys: JSON values}}
+
+so the safetensors package can read it too. load_model() maps the file
+with np.memmap (copy-on-write) and builds the model on the meta device,
+so nothing is initialized or read ahead: float32 weights are assigned
+straight from the mapping and processes loading the same file share its
+pages. float16 / bfloat16 weights are converted to the compute dtype on
+load, which halves the file but costs one copy.
+"""
+import contextlib
+import json
+import os
+import struct
+import warnings
+import numpy as np
+import torch
+from torch.overrides import TorchFunctionMode
+
+ALIGNMENT = 8
+DTYPES = {
+    'F32': (torch.float32, np.float32),
+    'F16': (torch.float16, np.float16),
+    'BF16': (torch.bfloat16, np.int16),  # numpy has no bfloat16: read the raw bits
+}
+STORAGE_DTYPES = {'float32': 'F32', 'float16': 'F16', 'bfloat16': 'BF16'}
+INIT_FUNCTIONS = ('uniform_', 'normal_', 'trunc_normal_', 'constant_', 'ones_', 'zeros_',
+                  'xavier_uniform_', 'xavier_normal_', 'kaiming_uniform_', 'kaiming_normal_')
+
+
+def save_artifact(path, state_dict, model_name, config, dtype='float32', metadata=None):
+    """Write the floating point tensors of state_dict stored as dtype (float32, float16 or bfloat16)
+
+    model_name and config (the constructor keyword arguments) let load_model
+    rebuild the model; metadata is any extra string-keyed JSON-serializable info.
+    """
+    code = STORAGE_DTYPES[dtype]
+    torch_dtype = DTYPES[code][0]
+    tensors = {}
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu()
+        if tensor.is_floating_point():
+            tensor = tensor.to(torch_dtype)
+        tensors[name] = tensor.contiguous()
+
+    header = {}
+    offset = 0
+    for name, tensor in tensors.items():
+        nbytes = tensor.numel() * tensor.element_size()
+        header[name] = {'dtype': tensor_code(tensor), 'shape': list(tensor.shape), 'data_offsets': [offset, offset + nbytes]}
+        offset += nbytes
+    info = {'format': 'pt', 'model': model_name, 'config': json.dumps(config)}
+    info.update({key: json.dumps(value) for key, value in (metadata or {}).items()})
+    header['__metadata__'] = info
+    header_bytes = json.dumps(header).encode('utf-8')
+    # Pad so the data, and with it every tensor, starts aligned
+    header_bytes += b' ' * (-(8 + len(header_bytes)) % ALIGNMENT)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)) + header_bytes)
+        for tensor in tensors.values():
+            if tensor.dtype == torch.bfloat16:
+                tensor = tensor.view(torch.int16)
+            f.write(tensor.numpy().tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+def tensor_code(tensor):
+    for code, (torch_dtype, _) in DTYPES.items():
+        if tensor.dtype == torch_dtype:
+            return code
+    if tensor.dtype == torch.int64:
+        return 'I64'
+    raise ValueError(f'unsupported tensor dtype {tensor.dtype}')
+
+
+def read_header(path):
+    """(header without __metadata__, metadata with its JSON values decoded, data offset)"""
+    with open(path, 'rb') as f:
+        header_size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_size))
+    metadata = {key: value if key in ('format', 'model') else json.loads(value)
+                for key, value in header.pop('__metadata__', {}).items()}
+    return header, metadata, 8 + header_size
+
+
+def load_artifact(path):
+    """(name -> tensor backed by a copy-on-write mapping of path, metadata)"""
+    header, metadata, data_offset = read_header(path)
+    mapping = np.memmap(path, dtype=np.uint8, mode='c')
+    tensors = {}
+    for name, spec in header.items():
+        start, end = spec['data_offsets']
+        if spec['dtype'] == 'I64':
+            torch_dtype, np_dtype = torch.int64, np.int64
+        else:
+            torch_dtype, np_dtype = DTYPES[spec['dtype']]
+        array = mapping[data_offset + start:data_offset + end].view(np_dtype).reshape(spec['shape'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            tensor = torch.from_numpy(array)
+        tensors[name] = tensor.view(torch_dtype) if torch_dtype == torch.bfloat16 else tensor
+    return tensors, metadata
+
+
+class SkipInitMode(TorchFunctionMode):
+    """Turns torch.nn.init functions and in-place initializers (normal_, uniform_ ...) into no-ops"""
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        if getattr(func, '__name__', None) in INIT_FUNCTIONS:
+            return args[0] if args else kwargs['tensor']
+        return func(*args, **(kwargs or {}))
+
+
+@contextlib.contextmanager
+def skip_init():
+    """Build modules on the meta device without initializing them, for weights assigned next
+
+    Initializing meta tensors is useless, and the first normal_ on one imports
+    torch's decomposition machinery, which takes seconds. Both the device and
+    the init override are torch function modes, which are per thread, so
+    other threads (e.g. ModelRegistry loads or a training loop) are not
+    affected and nothing global is patched.
+    """
+    with torch.device('meta'), SkipInitMode():
+        yield
+
+
+def load_model(path, model_class, device='cpu', dtype=torch.float32):
+    """(model in eval mode, metadata) from an artifact written for model_class
+
+    The model is built on the meta device and takes the mapped tensors as
+    its parameters; tensors stored in another dtype (or for another device)
+    are converted first.
+    """
+    tensors, metadata = load_artifact(path)
+    if metadata.get('model') != model_class.__name__:
+        raise ValueError(f'{path} holds a {metadata.get("model")}, not a {model_class.__name__}')
+    with skip_init():
+        model = model_class(**metadata['config'])
+    device = torch.device(device)
+    state_dict = {name: tensor if not tensor.is_floating_point() else tensor.to(device=device, dtype=dtype)
+                  for name, tensor in tensors.items()}
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    return model, metadata
+
+
+def is_artifact_file(path):
+    """True if path looks like an artifact (a safetensors header) rather than a torch checkpoint"""
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(9)
+    except OSError:
+        return False
+    return len(prefix) == 9 and prefix[8:9] == b'{' and struct.unpack('<Q', prefix[:8])[0] < os.path.getsize(path)
@@ -0,0 +1,160 @@
+"""
+Self-describing checkpoints and one loader for both models
+
+Scripts used to rebuild QuranSeq2SeqModel / QuranMatcherModel from
+hyperparameters hardcoded at every call site, so a checkpoint of another
+shape failed at load_state_dict, or loaded fine against the wrong
+vocabulary. checkpoint_info() returns the entries trainers add to the
+checkpoint dict:
+
+    'model_type':                 class name (QuranSeq2SeqModel, QuranMatcherModel, MultiLengthMatcherModel)
+    'config':                     model.config(), the constructor arguments
+    'vocab_fingerprint':          sha1 of the vocabulary's (token, id) pairs
+    'normalization_fingerprint':  sha1 of the input normalization applied to
+                                  every Arabic code point, None if inputs are not normalized
+
+load_checkpoint() builds and loads either model from a checkpoint alone:
+a self-describing checkpoint, an inference artifact (model_artifact.py,
+which carries the same entries as metadata) or an older checkpoint, whose
+config is recovered from the weight shapes. Given the vocabulary and
+normalization the caller will use, it refuses a checkpoint trained with
+different ones.
+"""
+import hashlib
+import json
+import os
+import sys
+import torch
+
+from model_artifact import is_artifact_file, load_model, read_header
+
+FEED_FORWARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'feed-forward')
+# Every Arabic code point plus the format characters normalizations drop
+NORMALIZATION_PROBE = ''.join(chr(c) for c in range(0x0600, 0x0700)) + '\u200c\u200d\u200f\ufeff abc'
+
+
+def model_class(model_type):
+    """QuranSeq2SeqModel, QuranMatcherModel or MultiLengthMatcherModel by name"""
+    if model_type == 'QuranSeq2SeqModel':
+        from seq2seq_model import QuranSeq2SeqModel
+        return QuranSeq2SeqModel
+    if model_type in ('QuranMatcherModel', 'MultiLengthMatcherModel'):
+        if FEED_FORWARD_DIR not in sys.path:
+            sys.path.insert(0, FEED_FORWARD_DIR)
+        import model
+        return getattr(model, model_type)
+    raise ValueError(f'unknown model type {model_type}')
+
+
+def vocabulary_fingerprint(vocabulary):
+    """sha1 of (token, id) pairs; vocabulary is a vocabulary JSON path, token -> id, id -> token or a token list"""
+    if isinstance(vocabulary, str):
+        with open(vocabulary, 'r', encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        if isinstance(vocabulary, dict) and 'char_to_token' in vocabulary:
+            vocabulary = vocabulary['char_to_token']
+    if isinstance(vocabulary, list):
+        pairs = [(token, idx) for idx, token in enumerate(vocabulary)]
+    elif vocabulary and isinstance(next(iter(vocabulary)), int):
+        pairs = [(token, idx) for idx, token in vocabulary.items()]
+    else:
+        pairs = list(vocabulary.items())
+    return hashlib.sha1(json.dumps(sorted(pairs, key=lambda pair: pair[1]), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def normalization_fingerprint(normalize):
+    """sha1 of normalize over NORMALIZATION_PROBE, None without normalization"""
+    if normalize is None:
+        return None
+    return hashlib.sha1(normalize(NORMALIZATION_PROBE).encode('utf-8')).hexdigest()
+
+
+def checkpoint_info(model, vocabulary, normalize=None):
+    """Entries that make a checkpoint of model self-describing (merge them into the saved dict)"""
+    return {
+        'model_type': type(model).__name__,
+        'config': model.config(),
+        'vocab_fingerprint': vocabulary_fingerprint(vocabulary),
+        'normalization_fingerprint': normalization_fingerprint(normalize),
+    }
+
+
+def infer_config(checkpoint, state_dict):
+    """(model type, config) of a checkpoint saved before checkpoint_info, from its weight shapes
+
+    Seq2seq attention heads cannot be recovered from the weights; every
+    checkpoint of that era used 4.
+    """
+    if 'fc1.weight' in state_dict:
+        rank = state_dict['fc3.0.weight'].shape[0] if 'fc3.0.weight' in state_dict else None
+        output_weight = state_dict['fc3.1.weight' if rank else 'fc3.weight']
+        return 'QuranMatcherModel', {
+            'vocab_size': state_dict['embedding.weight'].shape[0],
+            'input_length': state_dict['fc1.weight'].shape[1] // state_dict['embedding.weight'].shape[1],
+            'hidden_size': state_dict['fc1.weight'].shape[0],
+            'output_size': output_weight.shape[0],
+            'output_rank': checkpoint.get('output_rank', rank),
+        }
+    return 'QuranSeq2SeqModel', {
+        'vocab_size': state_dict['embedding.weight'].shape[0],
+        'max_length': state_dict['pos_encoding.pos_embedding.weight'].shape[0],
+        'd_model': state_dict['embedding.weight'].shape[1],
+        'n_heads': 4,
+        'n_layers': len({key.split('.')[1] for key in state_dict if key.startswith('transformer_blocks.')}),
+        'd_ff': state_dict['transformer_blocks.0.ff.0.weight'].shape[0],
+        'dropout': 0.1,
+    }
+
+
+def check_fingerprints(info, path, vocabulary=None, normalize=None):
+    """Raise ValueError if the checkpoint was trained with another vocabulary or normalization
+
+    Checkpoints without fingerprints are accepted. normalize=False skips
+    the normalization check (None means the inputs are not normalized).
+    """
+    expected = info.get('vocab_fingerprint')
+    if vocabulary is not None and expected and vocabulary_fingerprint(vocabulary) != expected:
+        raise ValueError(f'{path} was trained with a different vocabulary')
+    if normalize is not False and 'normalization_fingerprint' in info and \
+            normalization_fingerprint(normalize) != info['normalization_fingerprint']:
+        raise ValueError(f'{path} was trained with a different input normalization')
+
+
+def load_checkpoint(path, device='cpu', vocabulary=None, normalize=False):
+    """(model in eval mode, info) from a checkpoint or inference artifact of either model
+
+    info holds model_type, config, the fingerprints when recorded, and the
+    checkpoint's epoch / loss / accuracy. vocabulary and normalize are
+    checked against the fingerprints (see check_fingerprints).
+    """
+    if is_artifact_file(path):
+        _, metadata, _ = read_header(path)
+        info = {key: value for key, value in metadata.items() if key != 'format'}
+        info['model_type'] = info.pop('model')
+        check_fingerprints(info, path, vocabulary, normalize)
+        model, _ = load_model(path, model_class(info['model_type']), device=device)
+        return model, info
+
+    checkpoint = torch.load(path, map_location=device)
+    for key in ('model', 'model_state_dict'):
+        if isinstance(checkpoint.get(key), dict):
+            state_dict = checkpoint[key]
+            break
+    else:
+        state_dict, checkpoint = checkpoint, {}
+    if 'config' in checkpoint:
+        model_type, config = checkpoint['model_type'], checkpoint['config']
+    else:
+        model_type, config = infer_config(checkpoint, state_dict)
+
+    info = {'model_type': model_type, 'config': config}
+    for key in ('vocab_fingerprint', 'normalization_fingerprint', 'epoch', 'loss', 'accuracy'):
+        if key in checkpoint:
+            info[key] = checkpoint[key]
+    check_fingerprints(info, path, vocabulary, normalize)
+
+    model = model_class(model_type)(**config)
+    model.load_state_dict(state_dict)
+    model.to(device)
+    model.eval()
+    return model, info
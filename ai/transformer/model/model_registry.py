@@ -0,0 +1,157 @@
+"""
+Named checkpoints loaded on first use under a memory budget
+
+A/B testing the feed-forward variants (first_three_words ... first_ten_words,
+combined, offset, normalized, label smoothing) means serving many
+checkpoints from one process, of which only a few are hot at a time.
+ModelRegistry maps names to checkpoints (or inference artifacts) and loads
+one through model_factory.load_checkpoint the first time it is asked for.
+Names registered with the same file share one loaded model. Once the
+resident weights exceed the memory budget, the least recently used models
+are dropped; the next request for them loads them again.
+
+A caller that still holds an evicted model keeps it alive until it lets go
+of it, so hold the model for the duration of a batch, not longer.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from model_factory import check_fingerprints, load_checkpoint
+
+
+def model_nbytes(model):
+    """Bytes held by the parameters and buffers of model"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class RegisteredModel:
+    """One checkpoint file: the model while resident, and its load history"""
+    def __init__(self, path):
+        self.path = path
+        self.model = None
+        self.info = None
+        self.nbytes = 0
+        self.loads = 0
+        self.load_ms = 0.0
+        self.total_load_ms = 0.0
+        self.uses = 0
+
+
+class ModelRegistry:
+    """Lazily loaded models by name, least recently used evicted past memory_budget_mb
+
+    The most recently used model is never evicted, so a single model larger
+    than the budget still loads (and is reported over budget). get() may be
+    called from several threads; loading happens under the registry lock.
+    """
+    def __init__(self, memory_budget_mb=512, device='cpu'):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.device = device
+        self.names = {}
+        self.checks = {}
+        self.checked = set()
+        self.files = {}
+        self.resident = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def register(self, name, path, vocabulary=None, normalize=False):
+        """Serve path as name; vocabulary / normalize are checked on load (see check_fingerprints)"""
+        key = os.path.realpath(path)
+        self.names[name] = key
+        self.checks[name] = (vocabulary, normalize)
+        self.checked.discard(name)
+        if key not in self.files:
+            self.files[key] = RegisteredModel(path)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def path(self, name):
+        return self.files[self.names[name]].path
+
+    def get(self, name):
+        """The model registered as name, loading it (and evicting others) if needed"""
+        key = self.names[name]
+        with self.lock:
+            entry = self.files[key]
+            if entry.model is None:
+                self.misses += 1
+                self.load(key, entry)
+            else:
+                self.hits += 1
+            if name not in self.checked:
+                vocabulary, normalize = self.checks[name]
+                check_fingerprints(entry.info, entry.path, vocabulary, normalize)
+                self.checked.add(name)
+
+            self.resident.move_to_end(key)
+            entry.uses += 1
+            self.evict()
+            return entry.model
+
+    def info(self, name):
+        """load_checkpoint info of name (model_type, config, fingerprints ...), loading it if needed"""
+        self.get(name)
+        return self.files[self.names[name]].info
+
+    def load(self, key, entry):
+        start = time.perf_counter()
+        entry.model, entry.info = load_checkpoint(entry.path, device=self.device)
+        entry.load_ms = (time.perf_counter() - start) * 1000
+        entry.total_load_ms += entry.load_ms
+        entry.loads += 1
+        entry.nbytes = model_nbytes(entry.model)
+        self.resident[key] = entry
+        self.nbytes += entry.nbytes
+
+    def evict(self):
+        """Drop least recently used models until within budget, keeping the most recent one"""
+        while self.nbytes > self.memory_budget and len(self.resident) > 1:
+            _, entry = self.resident.popitem(last=False)
+            self.release(entry)
+            self.evictions += 1
+
+    def unload(self, name):
+        """Drop name's model now (it loads again on the next get)"""
+        key = self.names[name]
+        with self.lock:
+            entry = self.resident.pop(key, None)
+            if entry is not None:
+                self.release(entry)
+
+    def release(self, entry):
+        self.nbytes -= entry.nbytes
+        entry.model = None
+
+    def stats(self):
+        models = {}
+        for name, key in sorted(self.names.items()):
+            entry = self.files[key]
+            models[name] = {
+                'path': entry.path,
+                'resident': entry.model is not None,
+                'resident_mb': round(entry.nbytes / (1024 * 1024), 3) if entry.model is not None else 0.0,
+                'loads': entry.loads,
+                'load_ms': round(entry.load_ms, 2),
+                'total_load_ms': round(entry.total_load_ms, 2),
+                'uses': entry.uses,
+                'shared_with': sorted(other for other, other_key in self.names.items() if other_key == key and other != name),
+            }
+        lookups = self.hits + self.misses
+        return {
+            'models': models,
+            'resident_models': len(self.resident),
+            'memory_mb': round(self.nbytes / (1024 * 1024), 3),
+            'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 3),
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'loads': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,146 @@
+"""
+Character n-gram inverted index for fuzzy ayah lookup
+
+Scoring a query against all 6203 ayat with edit distance (what the app's
+similarity fallback does) costs O(6203 * n * m) per query. The index maps
+every character trigram of the normalized ayat to the ayat containing it,
+with the position where it first occurs there. A query collects the
+postings of its own trigrams, keeps only occurrences near the start of the
+ayah (recognized text is an ayah opening, give or take a few words), ranks
+ayat by the number of shared trigrams, and computes the exact prefix
+similarity for the top candidates only (bit-parallel, see edit_distance.py).
+
+The index is stored as flat numpy arrays (CSR postings), built once and
+reloaded from an .npz file unless the Quran text changed.
+"""
+import hashlib
+import os
+import numpy as np
+
+from edit_distance import encode_texts, normalized_arabic, prefix_similarities, prefix_similarity
+from seq2seq_model import load_quran_data
+
+NGRAM_INDEX_VERSION = 1
+
+
+def first_ngrams(text, n=3):
+    """{n-gram: position of its first occurrence} for a text"""
+    grams = {}
+    for position in range(len(text) - n + 1):
+        grams.setdefault(text[position:position + n], position)
+    return grams
+
+
+class NgramIndex:
+    """Inverted index: n-gram -> (ayah ids, first positions)
+
+    grams:     (num_grams,) sorted n-grams
+    offsets:   (num_grams + 1,) CSR offsets into ayah_ids / positions
+    ayah_ids:  postings, ayah index of each occurrence
+    positions: character position of the n-gram's first occurrence in that ayah
+    ayat:      normalized ayat, used for reranking
+    """
+    def __init__(self, grams, offsets, ayah_ids, positions, ayat, n=3, fingerprint=None):
+        self.grams = grams
+        self.offsets = offsets
+        self.ayah_ids = ayah_ids
+        self.positions = positions
+        self.ayat = ayat
+        self.n = n
+        self.fingerprint = fingerprint
+        self.slots = {gram: slot for slot, gram in enumerate(grams.tolist())}
+
+    @classmethod
+    def build(cls, ayat, n=3, fingerprint=None):
+        ayat = [' '.join(normalized_arabic(ayah).split()) for ayah in ayat]
+        postings = {}
+        for idx, ayah in enumerate(ayat):
+            for gram, position in first_ngrams(ayah, n).items():
+                postings.setdefault(gram, []).append((idx, position))
+
+        grams = sorted(postings)
+        offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[gram]) for gram in grams])
+        pairs = np.array([pair for gram in grams for pair in postings[gram]], dtype=np.int32)
+        return cls(np.array(grams), offsets, pairs[:, 0].copy(), pairs[:, 1].copy(), ayat, n, fingerprint)
+
+    def candidates(self, query, top_k=50, slack=12):
+        """Up to top_k ayah indices sharing the most n-grams with the query's opening
+
+        An occurrence counts only if it starts within len(query) + slack
+        characters of the ayah start, so skipped words still match but
+        n-grams from deep inside long ayat do not.
+        """
+        query = ' '.join(normalized_arabic(query).split())
+        slots = [self.slots[gram] for gram in first_ngrams(query, self.n) if gram in self.slots]
+        if not slots:
+            return np.array([], dtype=np.int64)
+        ids = np.concatenate([self.ayah_ids[self.offsets[slot]:self.offsets[slot + 1]] for slot in slots])
+        positions = np.concatenate([self.positions[self.offsets[slot]:self.offsets[slot + 1]] for slot in slots])
+        counts = np.bincount(ids[positions < len(query) + slack], minlength=len(self.ayat))
+
+        top_k = min(top_k, int(np.count_nonzero(counts)))
+        if top_k == 0:
+            return np.array([], dtype=np.int64)
+        top = np.argpartition(-counts, top_k - 1)[:top_k]
+        # Most shared n-grams first, lower ayah index on ties
+        return top[np.lexsort((top, -counts[top]))]
+
+    def search(self, query, top_k=5, num_candidates=50):
+        """[(ayah index, prefix similarity), ...] best first, reranked from the candidates
+
+        The candidates are scored together with the bit-parallel kernel.
+        """
+        normalized = ' '.join(normalized_arabic(query).split())
+        candidates = self.candidates(normalized, num_candidates)
+        if len(candidates) == 0:
+            return []
+        encoded = encode_texts([self.ayat[idx] for idx in candidates], max_length=len(normalized))
+        scored = list(zip(prefix_similarities(normalized, encoded).tolist(), candidates.tolist()))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(idx, score) for score, idx in scored[:top_k]]
+
+    def save(self, path):
+        np.savez(path, version=NGRAM_INDEX_VERSION, fingerprint=self.fingerprint or '', n=self.n,
+                 grams=self.grams, offsets=self.offsets, ayah_ids=self.ayah_ids, positions=self.positions,
+                 ayat=np.array('\n'.join(self.ayat)))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        if int(data['version']) != NGRAM_INDEX_VERSION:
+            return None
+        return cls(data['grams'], data['offsets'], data['ayah_ids'], data['positions'], str(data['ayat']).split('\n'),
+                   n=int(data['n']), fingerprint=str(data['fingerprint']))
+
+
+def brute_force_search(query, ayat, top_k=5):
+    """Prefix similarity against every (normalized) ayah, like the app's fallback loop"""
+    normalized = ' '.join(normalized_arabic(query).split())
+    scored = [(prefix_similarity(normalized, ayah), idx) for idx, ayah in enumerate(ayat)]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [(idx, score) for score, idx in scored[:top_k]]
+
+
+def source_fingerprint(quran_path, n=3):
+    """Hash of the Quran text and index settings an index was built from"""
+    digest = hashlib.sha1()
+    with open(quran_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(f'n={n},version={NGRAM_INDEX_VERSION}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_ngram_index(quran_path, cache_path='quran_ngram_index.npz', n=3):
+    """Load the cached index, rebuilding it if the Quran text changed"""
+    fingerprint = source_fingerprint(quran_path, n)
+    if os.path.exists(cache_path):
+        index = NgramIndex.load(cache_path)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+        print(f'N-gram index {cache_path} is stale, rebuilding...')
+
+    index = NgramIndex.build(load_quran_data(quran_path), n=n, fingerprint=fingerprint)
+    index.save(cache_path)
+    print(f'✓ N-gram index cached to {cache_path} ({len(index.grams)} {n}-grams, {len(index.ayah_ids)} postings)')
+    return index
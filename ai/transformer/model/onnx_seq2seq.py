@@ -0,0 +1,162 @@
+"""
+ONNX export and onnxruntime decoding for QuranSeq2SeqModel
+
+Two graphs are exported:
+  - full:  input_ids (batch, seq) -> logits (batch, seq, vocab), the same
+           logits as QuranSeq2SeqModel.forward. It is traced through
+           forward_cached without a cache: the traced nn.MultiheadAttention
+           path bakes the example batch and sequence sizes into its reshapes.
+  - step:  forward_cached with explicit keys/values, for KV-cached decoding
+
+           input_ids         (batch, new_len)      int64
+           positions         (batch, new_len)      int64, absolute positions
+           key_mask          (batch, past_len + new_len) bool, False = padded slot
+           past_key_<i>, past_value_<i>   (batch, n_heads, past_len, head_dim)
+        -> logits            (batch, new_len, vocab)
+           present_key_<i>, present_value_<i>  (batch, n_heads, past_len + new_len, head_dim)
+
+Batch, sequence and cache lengths are dynamic axes. A prompt is prefilled
+through the step graph with empty (past_len = 0) caches.
+
+OnnxSeq2SeqDecoder runs greedy decoding on the step graph with
+onnxruntime and returns the same tokens as decoding.greedy_decode_kv.
+"""
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class Seq2SeqDecodeStep(nn.Module):
+    """forward_cached with the per-layer (keys, values) flattened into positional tensors"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, positions, key_mask, *past):
+        past_key_values = [(past[2 * i], past[2 * i + 1]) for i in range(len(past) // 2)]
+        logits, present = self.model.forward_cached(input_ids, past_key_values, positions=positions, key_mask=key_mask)
+        return (logits,) + tuple(tensor for layer in present for tensor in layer)
+
+
+class Seq2SeqFull(nn.Module):
+    """forward_cached from an empty cache: logits only"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids):
+        return self.model.forward_cached(input_ids)[0]
+
+
+def step_names(n_layers):
+    """(input names, output names) of the step graph"""
+    past = [name for i in range(n_layers) for name in (f'past_key_{i}', f'past_value_{i}')]
+    present = [name for i in range(n_layers) for name in (f'present_key_{i}', f'present_value_{i}')]
+    return ['input_ids', 'positions', 'key_mask'] + past, ['logits'] + present
+
+
+def export_full(model, output_path, opset=17):
+    """Export QuranSeq2SeqModel.forward with dynamic batch and sequence axes"""
+    model.eval()
+    example = torch.randint(0, model.vocab_size, (2, 7), dtype=torch.long)
+    torch.onnx.export(
+        Seq2SeqFull(model).eval(), (example,), output_path,
+        input_names=['input_ids'], output_names=['logits'],
+        dynamic_axes={'input_ids': {0: 'batch', 1: 'seq'}, 'logits': {0: 'batch', 1: 'seq'}},
+        opset_version=opset, dynamo=False,
+    )
+
+
+def export_step(model, output_path, opset=17):
+    """Export the KV-cached decode step with dynamic batch, new and past lengths"""
+    model.eval()
+    n_layers = len(model.transformer_blocks)
+    n_heads = model.transformer_blocks[0].self_attn.num_heads
+    head_dim = model.d_model // n_heads
+    batch, past_len, new_len = 2, 5, 3
+    past = []
+    for _ in range(n_layers):
+        past.append(torch.randn(batch, n_heads, past_len, head_dim))
+        past.append(torch.randn(batch, n_heads, past_len, head_dim))
+    inputs = (torch.randint(0, model.vocab_size, (batch, new_len), dtype=torch.long),
+              torch.arange(past_len, past_len + new_len).repeat(batch, 1),
+              torch.ones(batch, past_len + new_len, dtype=torch.bool)) + tuple(past)
+
+    input_names, output_names = step_names(n_layers)
+    dynamic_axes = {'input_ids': {0: 'batch', 1: 'new_len'}, 'positions': {0: 'batch', 1: 'new_len'},
+                    'key_mask': {0: 'batch', 1: 'total_len'}, 'logits': {0: 'batch', 1: 'new_len'}}
+    for name in input_names[3:]:
+        dynamic_axes[name] = {0: 'batch', 2: 'past_len'}
+    for name in output_names[1:]:
+        dynamic_axes[name] = {0: 'batch', 2: 'total_len'}
+    torch.onnx.export(
+        Seq2SeqDecodeStep(model).eval(), inputs, output_path,
+        input_names=input_names, output_names=output_names, dynamic_axes=dynamic_axes,
+        opset_version=opset, dynamo=False,
+    )
+
+
+def create_session(path, num_threads=None):
+    """onnxruntime CPU session (imported lazily: only the runtime needs it)"""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+class OnnxSeq2SeqDecoder:
+    """Greedy decoding on the exported step graph
+
+    The prompts (without their last token, الاية:) are right-padded and
+    prefilled together in one run; then every output step is one run with a
+    single token per row, like greedy_decode_kv.
+    """
+    def __init__(self, step_path, eos_token, pad_token=0, num_threads=None):
+        self.session = create_session(step_path, num_threads)
+        self.eos_token = eos_token
+        self.pad_token = pad_token
+        past_inputs = [node for node in self.session.get_inputs() if node.name.startswith('past_key_')]
+        self.n_layers = len(past_inputs)
+        self.n_heads, self.head_dim = past_inputs[0].shape[1], past_inputs[0].shape[3]
+        self.input_names, self.output_names = step_names(self.n_layers)
+
+    def run(self, input_ids, positions, key_mask, past):
+        feeds = {'input_ids': input_ids, 'positions': positions, 'key_mask': key_mask}
+        feeds.update(zip(self.input_names[3:], past))
+        outputs = self.session.run(self.output_names, feeds)
+        return outputs[0], outputs[1:]
+
+    def decode(self, prompts, max_output_words=6):
+        """One list of generated token ids per prompt (</s> excluded)"""
+        batch = len(prompts)
+        lengths = np.array([len(prompt) - 1 for prompt in prompts], dtype=np.int64)
+        max_len = int(lengths.max())
+        input_ids = np.full((batch, max_len), self.pad_token, dtype=np.int64)
+        for row, prompt in enumerate(prompts):
+            input_ids[row, :lengths[row]] = prompt[:-1]
+        key_mask = np.arange(max_len)[None, :] < lengths[:, None]
+        empty = np.zeros((batch, self.n_heads, 0, self.head_dim), dtype=np.float32)
+        positions = np.broadcast_to(np.arange(max_len), (batch, max_len)).copy()
+        _, past = self.run(input_ids, positions, key_mask, [empty] * (2 * self.n_layers))
+
+        next_input = np.array([[prompt[-1]] for prompt in prompts], dtype=np.int64)
+        positions = lengths[:, None].copy()
+        outputs = [[] for _ in prompts]
+        finished = [False] * batch
+        for step in range(max_output_words):
+            key_mask = np.concatenate([key_mask, np.ones((batch, 1), dtype=bool)], axis=1)
+            logits, past = self.run(next_input, positions, key_mask, past)
+            next_tokens = logits[:, -1].argmax(axis=-1)
+            for row, token in enumerate(next_tokens.tolist()):
+                if finished[row]:
+                    continue
+                if token == self.eos_token:
+                    finished[row] = True
+                else:
+                    outputs[row].append(token)
+            if all(finished) or step == max_output_words - 1:
+                break
+            next_input = next_tokens[:, None].astype(np.int64)
+            positions = positions + 1
+        return outputs
@@ -0,0 +1,161 @@
+"""
+Nearest-vocabulary correction of out-of-vocabulary input words
+
+The prompt builders drop words missing from vocabulary.json, so a single
+recognition misspelling deletes a word from the query. OOVResolver maps an
+unknown word to the closest vocabulary word within max_distance edits,
+SymSpell style: every vocabulary word is indexed under all the strings
+obtained by deleting up to max_distance of its characters. Two words within
+k edits share a string both reach with at most k deletions, so a lookup
+generates the query's own deletions, collects the vocabulary words indexed
+under them and verifies the exact edit distance of those candidates only.
+The search widens one edit at a time and stops at the first distance with
+a match; most misspellings are one edit away and are verified with a
+single linear comparison per candidate.
+
+Ties are broken by the word's frequency in the Quran when counts are
+given, then by vocabulary order. Results are memoized per word, in a
+bounded LRU map since client words are unbounded. A word longer than every
+vocabulary word by more than max_distance cannot be corrected and is
+rejected before any deletions are generated (they grow with its length
+squared).
+"""
+import time
+from collections import OrderedDict
+
+from edit_distance import levenshtein_distance
+
+
+def deletion_levels(word, max_distance):
+    """[{word}, strings one deletion away, two deletions away, ...] up to max_distance
+
+    Each string appears at its smallest deletion count; at least one character is kept.
+    """
+    levels = [{word}]
+    seen = {word}
+    for _ in range(min(max_distance, len(word) - 1)):
+        level = set()
+        for variant in levels[-1]:
+            for i in range(len(variant)):
+                deleted = variant[:i] + variant[i + 1:]
+                if deleted not in seen:
+                    level.add(deleted)
+        seen.update(level)
+        levels.append(level)
+    return levels
+
+
+def within_one_edit(a, b):
+    """levenshtein_distance(a, b) <= 1, in one pass"""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+class OOVResolver:
+    """Deletion index over vocabulary words
+
+    words:         vocabulary words (special tokens excluded)
+    counts:        word -> frequency, used to break ties; None for vocabulary order
+    max_distance:  largest edit distance corrected
+    min_length:    words shorter than this are never corrected (too ambiguous)
+    memo_size:     most recent lookups kept memoized
+    """
+    def __init__(self, words, counts=None, max_distance=2, min_length=3, memo_size=10000):
+        self.words = list(words)
+        self.vocabulary = set(self.words)
+        self.max_distance = max_distance
+        self.min_length = min_length
+        # Longer words are more than max_distance edits from every vocabulary word
+        self.max_length = max((len(word) for word in self.words), default=0) + max_distance
+        counts = counts or {}
+        # Lower rank wins a tie: frequent words first, then vocabulary order
+        self.rank = {word: (-counts.get(word, 0), i) for i, word in enumerate(self.words)}
+        # deletion -> [(vocabulary word, deletions from the word), ...]
+        self.index = {}
+        for word in self.words:
+            for depth, variants in enumerate(deletion_levels(word, max_distance)):
+                for variant in variants:
+                    self.index.setdefault(variant, []).append((word, depth))
+        self.memo = OrderedDict()
+        self.memo_size = memo_size
+
+        self.lookups = 0
+        self.oov = 0
+        self.corrected = 0
+        self.unresolved = 0
+        self.lookup_time = 0.0
+
+    @classmethod
+    def from_vocabulary(cls, word_to_idx, ayat=None, max_distance=2, special_tokens=('<s>', '</s>', 'القاريء:', 'الاية:', '<pad>')):
+        """Resolver over a seq2seq vocabulary, ranked by frequency in ayat when given"""
+        counts = {}
+        for ayah in ayat or []:
+            for word in ayah.split():
+                counts[word] = counts.get(word, 0) + 1
+        return cls([word for word in word_to_idx if word not in special_tokens], counts, max_distance)
+
+    def nearest(self, word):
+        """(closest vocabulary word, edit distance), or (None, None) beyond max_distance"""
+        if not self.min_length <= len(word) <= self.max_length:
+            return None, None
+        if word in self.memo:
+            self.memo.move_to_end(word)
+            return self.memo[word]
+        best = (None, None)
+        levels = deletion_levels(word, self.max_distance)
+        for distance in range(1, self.max_distance + 1):
+            # Words within distance edits: both sides reach a shared string with <= distance deletions
+            checked = set()
+            matches = []
+            for variants in levels[:distance + 1]:
+                for variant in variants:
+                    for candidate, depth in self.index.get(variant, ()):
+                        if depth > distance or candidate in checked:
+                            continue
+                        checked.add(candidate)
+                        if distance == 1:
+                            if within_one_edit(word, candidate):
+                                matches.append(candidate)
+                        elif abs(len(candidate) - len(word)) <= distance and \
+                                levenshtein_distance(word, candidate) <= distance:
+                            matches.append(candidate)
+            if matches:
+                best = (min(matches, key=self.rank.__getitem__), distance)
+                break
+        self.memo[word] = best
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+        return best
+
+    def resolve(self, word):
+        """word if in the vocabulary, else its nearest vocabulary word, else None"""
+        self.lookups += 1
+        if word in self.vocabulary:
+            return word
+        start = time.perf_counter()
+        self.oov += 1
+        corrected, _ = self.nearest(word)
+        if corrected is None:
+            self.unresolved += 1
+        else:
+            self.corrected += 1
+        self.lookup_time += time.perf_counter() - start
+        return corrected
+
+    def stats(self):
+        return {
+            'lookups': self.lookups,
+            'oov': self.oov,
+            'corrected': self.corrected,
+            'unresolved': self.unresolved,
+            'fire_rate': round(self.corrected / self.lookups, 4) if self.lookups else 0.0,
+            'mean_oov_lookup_ms': round(self.lookup_time / self.oov * 1000, 4) if self.oov else 0.0,
+        }
@@ -0,0 +1,191 @@
+"""
+Cross-request prefix KV cache for QuranSeq2SeqModel
+
+Many prompts share their leading tokens (`<s> القاريء: بسم الله ...`,
+`<s> القاريء: يا ايها الذين امنوا ...`). Keys/values are stored in a radix
+tree keyed by token sequence: each edge holds the per-layer KV of its
+tokens, a lookup reuses the longest cached prefix and only the remainder is
+prefilled. Leaves are evicted least recently used first once the stored KV
+exceeds the memory budget.
+"""
+import torch
+
+
+class RadixNode:
+    """Edge of the radix tree: a token run and its per-layer (keys, values)"""
+    def __init__(self, tokens, kv, parent):
+        self.tokens = tokens
+        self.kv = kv
+        self.parent = parent
+        self.children = {}
+        self.last_access = 0
+        self.nbytes = sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in kv) if kv else 0
+
+
+def slice_kv(kv, start, end=None):
+    """Contiguous copy of positions start:end of every layer's (keys, values)"""
+    return [(k[:, :, start:end].clone(), v[:, :, start:end].clone()) for k, v in kv]
+
+
+class PrefixKVCache:
+    """Radix tree of prompt prefixes with an LRU memory budget
+
+    A lookup counts as a hit when at least hit_min_tokens are reused; the
+    default of 3 skips the `<s> القاريء:` header every prompt shares.
+    """
+    def __init__(self, model, memory_budget_mb=64, hit_min_tokens=3):
+        self.model = model
+        self.hit_min_tokens = hit_min_tokens
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.root = RadixNode((), None, None)
+        self.nodes = set()
+        self.nbytes = 0
+        self.clock = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.matched_tokens = 0
+        self.prefilled_tokens = 0
+        self.saved_flops = 0
+        self.evictions = 0
+
+        n_layers = len(model.transformer_blocks)
+        d_model = model.d_model
+        d_ff = model.transformer_blocks[0].ff[0].out_features
+        # Per-token matmul FLOPs: QKV + output projection + feed-forward, in every layer
+        self.flops_per_token = 2 * n_layers * (4 * d_model * d_model + 2 * d_model * d_ff)
+        # ... plus attention scores and weighted sum over the keys before it
+        self.attention_flops_per_key = 4 * n_layers * d_model
+
+    def token_flops(self, position):
+        return self.flops_per_token + self.attention_flops_per_key * (position + 1)
+
+    def _touch(self, node):
+        self.clock += 1
+        while node is not None and node is not self.root:
+            node.last_access = self.clock
+            node = node.parent
+
+    def match(self, tokens):
+        """Longest cached prefix of tokens: (length, [(node, tokens used from it), ...])"""
+        node = self.root
+        position = 0
+        path = []
+        while position < len(tokens):
+            child = node.children.get(tokens[position])
+            if child is None:
+                break
+            common = 0
+            limit = min(len(child.tokens), len(tokens) - position)
+            while common < limit and child.tokens[common] == tokens[position + common]:
+                common += 1
+            path.append((child, common))
+            position += common
+            if common < len(child.tokens):
+                break
+            node = child
+        return position, path
+
+    def _gather(self, path):
+        """Concatenate the KV along a matched path into one past_key_values"""
+        layers = []
+        for layer in range(len(path[0][0].kv)):
+            keys = torch.cat([node.kv[layer][0][:, :, :used] for node, used in path], dim=2)
+            values = torch.cat([node.kv[layer][1][:, :, :used] for node, used in path], dim=2)
+            layers.append((keys, values))
+        return layers
+
+    def _add(self, node):
+        self.nodes.add(node)
+        self.nbytes += node.nbytes
+
+    def _remove(self, node):
+        self.nodes.discard(node)
+        self.nbytes -= node.nbytes
+
+    def insert(self, tokens, past):
+        """Store the KV of tokens (past covers exactly those positions)"""
+        tokens = tuple(tokens)
+        node = self.root
+        position = 0
+        while position < len(tokens):
+            child = node.children.get(tokens[position])
+            if child is None:
+                leaf = RadixNode(tokens[position:], slice_kv(past, position), node)
+                node.children[tokens[position]] = leaf
+                self._add(leaf)
+                node = leaf
+                break
+
+            common = 0
+            limit = min(len(child.tokens), len(tokens) - position)
+            while common < limit and child.tokens[common] == tokens[position + common]:
+                common += 1
+            if common < len(child.tokens):
+                # Split the edge: node -> middle (shared part) -> child (rest)
+                middle = RadixNode(child.tokens[:common], slice_kv(child.kv, 0, common), node)
+                self._remove(child)
+                child.tokens = child.tokens[common:]
+                child.kv = slice_kv(child.kv, common)
+                child.nbytes = sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in child.kv)
+                child.parent = middle
+                middle.children[child.tokens[0]] = child
+                node.children[middle.tokens[0]] = middle
+                self._add(middle)
+                self._add(child)
+                child = middle
+            position += common
+            node = child
+
+        self._touch(node)
+        self._evict(protect=node)
+
+    def _evict(self, protect=None):
+        """Drop least recently used leaves until the budget is met"""
+        protected = set()
+        while protect is not None:
+            protected.add(protect)
+            protect = protect.parent
+        while self.nbytes > self.memory_budget:
+            leaves = [node for node in self.nodes if not node.children and node not in protected]
+            if not leaves:
+                break
+            leaf = min(leaves, key=lambda node: node.last_access)
+            del leaf.parent.children[leaf.tokens[0]]
+            self._remove(leaf)
+            self.evictions += 1
+
+    def prefill(self, tokens, device='cpu'):
+        """past_key_values for tokens, reusing the longest cached prefix"""
+        tokens = list(tokens)
+        matched, path = self.match(tokens)
+        self.lookups += 1
+        if matched >= self.hit_min_tokens:
+            self.hits += 1
+        if matched:
+            self._touch(path[-1][0])
+        self.matched_tokens += matched
+        self.saved_flops += sum(self.token_flops(position) for position in range(matched))
+
+        past = self._gather(path) if matched else None
+        if matched < len(tokens):
+            x = torch.tensor([tokens[matched:]], dtype=torch.long, device=device)
+            with torch.no_grad():
+                _, past = self.model.forward_cached(x, past)
+            self.prefilled_tokens += len(tokens) - matched
+            self.insert(tokens, past)
+        return past
+
+    def stats(self):
+        total_tokens = self.matched_tokens + self.prefilled_tokens
+        return {
+            'lookups': self.lookups,
+            'hit_rate': round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            'token_hit_rate': round(self.matched_tokens / total_tokens, 4) if total_tokens else 0.0,
+            'matched_tokens': self.matched_tokens,
+            'prefilled_tokens': self.prefilled_tokens,
+            'saved_mflops': round(self.saved_flops / 1e6, 2),
+            'nodes': len(self.nodes),
+            'memory_mb': round(self.nbytes / (1024 * 1024), 3),
+            'evictions': self.evictions,
+        }
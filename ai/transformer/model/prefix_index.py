@@ -0,0 +1,92 @@
+"""
+Exact word-prefix index over the normalized Quran
+
+Clean input is often literally the first words of an ayah. The index keeps
+every ayah as a tuple of words in sorted order, so the ayat starting with a
+given word sequence form one contiguous range found with two binary
+searches. A unique match (or, for predict_ayah, several ayat sharing the
+same opening words) answers the query without running a model.
+
+Only queries of at least MIN_WORDS words are matched. A shorter one that
+opens a single ayah is too often a recitation with a skipped or replaced
+word that happens to open another ayah: on the test.py suites,
+test_prefix_index.py finds 3.5% of unique 3-word matches pointing at the
+wrong ayah, 2.0% at 4 words, 1.0% at 5 and none at 6. Those suites are
+mostly distorted inputs; on clean ones, 5 words still skip the model for
+about 90% of queries.
+"""
+from bisect import bisect_left
+
+# Sorts after every Arabic word, closing the range of tuples starting with a prefix
+_MAX_WORD = '\U0010ffff'
+
+MIN_WORDS = 5
+
+
+class AyahPrefixIndex:
+    """Sorted word tuples of all ayat with prefix-range lookup
+
+    ayat:       ayah texts, index order preserved in the results
+    normalize:  applied to ayat and queries (e.g. normalize_arabic for
+                quran-simple-min.txt); None when both are already normalized
+    min_words:  shorter queries never match (see MIN_WORDS)
+    """
+    def __init__(self, ayat, normalize=None, min_words=MIN_WORDS):
+        self.min_words = min_words
+        self.normalize = normalize or (lambda text: text)
+        self.words = [tuple(self.normalize(ayah).split()) for ayah in ayat]
+        self.order = sorted(range(len(self.words)), key=lambda idx: self.words[idx])
+        self.keys = [self.words[idx] for idx in self.order]
+
+        self.lookups = 0
+        self.unique = 0
+        self.ambiguous = 0
+        self.misses = 0
+        self.too_short = 0
+        # Answers pinned first in a model result, and queries that skipped the model entirely
+        self.pinned = 0
+        self.short_circuits = 0
+
+    def lookup(self, words):
+        """Indices (ascending) of the ayat whose words start with words"""
+        words = tuple(words)
+        if not words:
+            return []
+        start = bisect_left(self.keys, words)
+        end = bisect_left(self.keys, words + (_MAX_WORD,), lo=start)
+        return sorted(self.order[start:end])
+
+    def match(self, text):
+        """lookup() on a query text of at least min_words words (else []), counted in stats()"""
+        words = self.normalize(text).split()
+        self.lookups += 1
+        if len(words) < self.min_words:
+            self.too_short += 1
+            return []
+        candidates = self.lookup(words)
+        if len(candidates) == 1:
+            self.unique += 1
+        elif candidates:
+            self.ambiguous += 1
+        else:
+            self.misses += 1
+        return candidates
+
+    def common_opening(self, candidates, num_words):
+        """First num_words words shared by all candidates, or None if they differ"""
+        opening = self.words[candidates[0]][:num_words]
+        if all(self.words[idx][:num_words] == opening for idx in candidates[1:]):
+            return opening
+        return None
+
+    def stats(self):
+        return {
+            'lookups': self.lookups,
+            'unique': self.unique,
+            'ambiguous': self.ambiguous,
+            'misses': self.misses,
+            'too_short': self.too_short,
+            'pinned': self.pinned,
+            'short_circuits': self.short_circuits,
+            'short_circuit_rate': round(self.short_circuits / self.lookups, 4) if self.lookups else 0.0,
+        }
@@ -0,0 +1,200 @@
+"""
+Compact memory-mapped Quran corpus
+
+Scripts otherwise re-read and re-split quran-simple-min.txt on every run,
+and page / juz / surah / rub3 lookups only exist in the app's QuranModel.
+build_corpus() parses the text once into a single binary file:
+
+    magic 'QCORPUS1', uint64 header length, JSON header, then arrays,
+    each 64-byte aligned (the header gives dtype, shape and offset)
+
+    word_offsets       (num_ayat + 1,) CSR offsets of each ayah's words
+    word_ids           (num_words,) normalized word ids, uint16
+    word_char_offsets  (num_words,) start of each word in chars
+    char_offsets       (num_ayat + 1,) start of each ayah in chars
+    chars              all normalized ayat concatenated, UTF-16 code units
+    surah, page, juz, rub3   (num_ayat,) 1-based section numbers
+    vocab_offsets / vocab_bytes   UTF-8 words, id order
+
+QuranCorpus.open() maps the arrays with np.memmap, so opening takes
+milliseconds and processes reading the same file share its pages.
+
+Sections follow QuranModel's markers (empty line = page end, '*' = rub3
+end, '-' = surah end, each recorded as the index of the section's last
+ayah). An ayah on a marker belongs to the section the marker closes.
+"""
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+from edit_distance import normalized_arabic
+
+CORPUS_MAGIC = b'QCORPUS1'
+CORPUS_VERSION = 1
+ALIGNMENT = 64
+
+
+def parse_quran_text(quran_path):
+    """(ayat, page_ends, rub3_ends, surah_ends), like QuranModel.init"""
+    with open(quran_path, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    ayat, page_ends, rub3_ends, surah_ends = [], [], [], []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            page_ends.append(len(ayat) - 1)
+        elif line == '*':
+            rub3_ends.append(len(ayat) - 1)
+        elif line == '-':
+            surah_ends.append(len(ayat) - 1)
+        else:
+            ayat.append(line)
+    return ayat, page_ends, rub3_ends, surah_ends
+
+
+def section_numbers(num_ayat, section_ends):
+    """1-based section of every ayah, given the index of each section's last ayah"""
+    ends = np.array(sorted(section_ends), dtype=np.int64)
+    return np.searchsorted(ends, np.arange(num_ayat), side='left') + 1
+
+
+def build_corpus(quran_path, output_path):
+    """Parse quran_path (quran-simple-min.txt) into a corpus file"""
+    with open(quran_path, 'rb') as f:
+        fingerprint = hashlib.sha1(f.read()).hexdigest()
+    ayat, page_ends, rub3_ends, surah_ends = parse_quran_text(quran_path)
+    ayat = [' '.join(normalized_arabic(ayah).split()) for ayah in ayat]
+
+    vocab = {}
+    word_offsets = [0]
+    word_ids = []
+    word_char_offsets = []
+    char_offsets = [0]
+    for ayah in ayat:
+        position = char_offsets[-1]
+        for word in ayah.split(' '):
+            word_ids.append(vocab.setdefault(word, len(vocab)))
+            word_char_offsets.append(position)
+            position += len(word) + 1
+        word_offsets.append(len(word_ids))
+        char_offsets.append(char_offsets[-1] + len(ayah))
+
+    rub3 = section_numbers(len(ayat), rub3_ends)
+    vocab_encoded = [word.encode('utf-8') for word in vocab]
+    arrays = {
+        'word_offsets': np.array(word_offsets, dtype=np.int32),
+        'word_ids': np.array(word_ids, dtype=np.uint16),
+        'word_char_offsets': np.array(word_char_offsets, dtype=np.int32),
+        'char_offsets': np.array(char_offsets, dtype=np.int32),
+        'chars': np.frombuffer(''.join(ayat).encode('utf-16-le'), dtype=np.uint16),
+        'surah': section_numbers(len(ayat), surah_ends).astype(np.uint8),
+        'page': section_numbers(len(ayat), page_ends).astype(np.uint16),
+        # QuranModel.juzNumberFor: 8 rub3 per juz
+        'juz': ((rub3 + 7) // 8).astype(np.uint8),
+        'rub3': rub3.astype(np.uint8),
+        'vocab_offsets': np.cumsum([0] + [len(word) for word in vocab_encoded]).astype(np.int32),
+        'vocab_bytes': np.frombuffer(b''.join(vocab_encoded), dtype=np.uint8),
+    }
+    assert len(vocab) < 2 ** 16
+
+    header = {'version': CORPUS_VERSION, 'fingerprint': fingerprint, 'num_ayat': len(ayat),
+              'num_words': len(word_ids), 'vocab_size': len(vocab), 'arrays': {}}
+    # Offsets depend on the header length, which depends on the offsets: size the header generously
+    header_size = ALIGNMENT * 32
+    offset = len(CORPUS_MAGIC) + 8 + header_size
+    for name, array in arrays.items():
+        offset = (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode('utf-8')
+    assert len(header_bytes) <= header_size
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(CORPUS_MAGIC + struct.pack('<Q', header_size) + header_bytes.ljust(header_size, b' '))
+        for name, array in arrays.items():
+            f.write(b'\0' * (header['arrays'][name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, output_path)
+    return header
+
+
+class QuranCorpus:
+    """Read-only view of a corpus file; every array is an np.memmap"""
+    def __init__(self, path, header, arrays):
+        self.path = path
+        self.header = header
+        self.fingerprint = header['fingerprint']
+        self.num_ayat = header['num_ayat']
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self._vocab = None
+        self._word_to_id = None
+        self._text = None
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(CORPUS_MAGIC)) != CORPUS_MAGIC:
+                raise ValueError(f'{path} is not a Quran corpus file')
+            header_size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size))
+        if header['version'] != CORPUS_VERSION:
+            raise ValueError(f'{path} has corpus version {header["version"]}, expected {CORPUS_VERSION}')
+        arrays = {name: np.memmap(path, dtype=np.dtype(spec['dtype']), mode='r', offset=spec['offset'], shape=tuple(spec['shape']))
+                  for name, spec in header['arrays'].items()}
+        return cls(path, header, arrays)
+
+    @property
+    def vocab(self):
+        """Words in id order"""
+        if self._vocab is None:
+            data = self.vocab_bytes.tobytes()
+            offsets = self.vocab_offsets.tolist()
+            self._vocab = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        return self._vocab
+
+    @property
+    def word_to_id(self):
+        if self._word_to_id is None:
+            self._word_to_id = {word: idx for idx, word in enumerate(self.vocab)}
+        return self._word_to_id
+
+    @property
+    def text(self):
+        """All normalized ayat concatenated (char_offsets index into it)"""
+        if self._text is None:
+            self._text = self.chars.tobytes().decode('utf-16-le')
+        return self._text
+
+    def ayah_text(self, idx):
+        return self.text[self.char_offsets[idx]:self.char_offsets[idx + 1]]
+
+    def ayah_word_ids(self, idx):
+        return self.word_ids[self.word_offsets[idx]:self.word_offsets[idx + 1]]
+
+    def ayah_words(self, idx):
+        vocab = self.vocab
+        return [vocab[word_id] for word_id in self.ayah_word_ids(idx).tolist()]
+
+    def ayat(self):
+        """Normalized ayat, the same list load_quran_data gives for quran-simple-norm.txt"""
+        text = self.text
+        offsets = self.char_offsets.tolist()
+        return [text[offsets[i]:offsets[i + 1]] for i in range(self.num_ayat)]
+
+    def location(self, idx):
+        """{'surah', 'page', 'juz', 'rub3'} of an ayah"""
+        return {'surah': int(self.surah[idx]), 'page': int(self.page[idx]),
+                'juz': int(self.juz[idx]), 'rub3': int(self.rub3[idx])}
+
+
+def is_corpus_file(path):
+    """True if path is a corpus file rather than a text file"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(CORPUS_MAGIC)) == CORPUS_MAGIC
+    except OSError:
+        return False
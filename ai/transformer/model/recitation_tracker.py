@@ -0,0 +1,501 @@
+"""
+Recitation tracker: MuhaffezViewModel's ayah search and word matching
+
+Port of the tracking engine in Muhaffez/ViewModels/MuhaffezViewModel.swift
+so it can be replayed and measured off-device:
+  - A'ozo / Basmalah detection and stripping (checkA3ozoBellah,
+    checkBismellah, String.removeA3ozoBellah / removeBasmallah)
+  - foundAyat: two-way prefix search over the normalized ayat, then after
+    the 1 s debounce the model prediction (tryMLModelMatch) and the prefix
+    similarity scan (performSimilarityMatching)
+  - matchedWords: word-by-word alignment with backward / forward seeking
+    (updateMatchedWords) and the 3 s peek helper
+  - page position of the last matched word
+
+Thresholds and quirks are the app's. What differs is the cost per word: the
+app rebuilds quranText from the next 500 ayat when an ayah is found,
+normalizes Quran words on every comparison and re-splits the whole voice
+text on each update. Here the Quran words are loaded and normalized one
+ayah at a time, the ayah after the current one prefetched, voice words are
+appended incrementally and word similarities memoized, so aligning an
+incoming word does a bounded amount of work (at most 28 word comparisons).
+
+Timers are simulated: every call takes the current time, and the debounce
+and peek timers fire when a later call (or advance()) reaches their
+deadline.
+"""
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+
+from edit_distance import encode_texts, normalized_arabic, prefix_similarities, prefix_similarity, similarity
+from quran_corpus import parse_quran_text, section_numbers
+
+MATCH_THRESHOLD = 0.7
+SIMI_MATCH_THRESHOLD = 0.6
+SEEK_MATCH_THRESHOLD = 0.95
+BACKWARD_STEPS = 10
+FORWARD_STEPS = 17
+DEBOUNCE_SECONDS = 1.0
+PEEK_SECONDS = 3.0
+# updateQuranText: the found ayah and the ayat after it, up to 500 lines
+WINDOW_AYAT = 500
+
+BISMILLAH_WORDS = ['بسم', 'الله', 'الرحمن', 'الرحيم']
+
+# Sorts after every Arabic string, closing the range of lines starting with a prefix
+_MAX_CHAR = '\U0010ffff'
+
+
+@lru_cache(maxsize=1 << 16)
+def word_similarity(a, b):
+    """similarity() of two words, memoized (recitations repeat a small vocabulary)"""
+    return similarity(a, b)
+
+
+def basmalah_length(words):
+    """Words String.removeBasmallah drops from the start of words (0, 3 or 4)"""
+    if len(words) < 3:
+        return 0
+    if word_similarity(words[0], BISMILLAH_WORDS[0]) < 0.8 or word_similarity(words[1], BISMILLAH_WORDS[1]) < 0.8:
+        return 0
+    if len(words) >= 4 and word_similarity(words[2], BISMILLAH_WORDS[2]) >= 0.8 \
+            and word_similarity(words[3], BISMILLAH_WORDS[3]) >= 0.8:
+        return 4
+    if word_similarity(words[2], BISMILLAH_WORDS[2]) >= 0.8 or word_similarity(words[2], BISMILLAH_WORDS[3]) >= 0.8:
+        return 3
+    return 0
+
+
+class RecitationTracker:
+    """Tracks one recitation from a stream of recognized words
+
+    quran_lines:  ayah lines of quran-simple-min.txt (QuranModel.quranLines)
+    pages:        1-based page number of every ayah, or None
+    predict:      text -> predicted ayah text or None (AyaFinderMLModel.predict,
+                  e.g. the seq2seq model); None skips straight to the similarity scan
+    ngram_index:  NgramIndex over the same ayat; when given, the similarity
+                  scan ranks its candidates instead of all ayat
+    """
+    def __init__(self, quran_lines, pages=None, predict=None, ngram_index=None):
+        self.quran_lines = quran_lines
+        self.normalized_lines = [normalized_arabic(line) for line in quran_lines]
+        self.pages = pages
+        self.predict = predict
+        self.ngram_index = ngram_index
+        self.a3ozo = self.normalized_lines[0]
+        self.bismellah = self.normalized_lines[1]
+
+        # findMatchingAyat: lines starting with the text form one range of the sorted lines,
+        # lines the text starts with are looked up by length
+        self._sorted_order = sorted(range(len(quran_lines)), key=lambda idx: self.normalized_lines[idx])
+        self._sorted_lines = [self.normalized_lines[idx] for idx in self._sorted_order]
+        self._line_indices = {}
+        for idx, line in enumerate(self.normalized_lines):
+            self._line_indices.setdefault(line, []).append(idx)
+        self._line_lengths = sorted({len(line) for line in self.normalized_lines})
+        self._encoded_lines = None
+
+        self.stats = {'words': 0, 'updates': 0, 'searches': 0, 'fallbacks': 0, 'predictions': 0,
+                      'similarity_scans': 0, 'matched': 0, 'simi_matched': 0, 'backward_matches': 0,
+                      'forward_matches': 0, 'unmatched': 0, 'peeks': 0, 'prefetched_ayat': 0, 'page_turns': 0}
+        self.is_recording = False
+        self.reset()
+
+    @classmethod
+    def from_quran_file(cls, quran_path, predict=None, ngram_index=None):
+        """Tracker over quran-simple-min.txt, with page numbers from its markers"""
+        lines, page_ends, _, _ = parse_quran_text(quran_path)
+        return cls(lines, section_numbers(len(lines), page_ends).tolist(), predict, ngram_index)
+
+    # MARK: - State
+
+    def reset(self):
+        """resetData: forget the recitation"""
+        self.words = []             # normalized recognized words
+        self.word_ends = [0]        # cumulative characters of words, one space each
+        self.has_a3ozo = False
+        self.has_basmalah = False
+        self.found_ayat = []
+        self.debounce_deadline = None
+        self.reset_pages()
+
+    def reset_pages(self):
+        """resetPages: forget the alignment"""
+        self.debounce_deadline = None
+        self.peek_deadline = None
+        self.matched_words = []     # (Quran word, matched)
+        self.previous_voice_words_count = 0
+        self.updating_found_ayat = False
+        self.quran_words = []       # window of Quran words from the found ayah on
+        self.quran_norm = []
+        self.word_ayah = []
+        self.ayah_starts = {}       # ayah index -> its first word in the window
+        self.next_ayah = None       # next ayah to load into the window
+        self.window_end = None
+        self.page = None
+
+    def _skip(self):
+        """Recognized words stripped as A'ozo / Basmalah before matching"""
+        skip = 5 if self.has_a3ozo and len(self.words) >= 5 else 0
+        if self.has_basmalah:
+            skip += basmalah_length(self.words[skip:skip + 4] if len(self.words) - skip >= 4 else self.words[skip:])
+        return skip
+
+    def _text_length(self, skip):
+        """Length of textToPredict without building it"""
+        if skip >= len(self.words):
+            return 0
+        return self.word_ends[-1] - self.word_ends[skip] - 1
+
+    def text_to_predict(self, max_chars=None):
+        """Normalized recognized text with A'ozo / Basmalah stripped (at most max_chars)"""
+        skip = self._skip()
+        if max_chars is None:
+            return ' '.join(self.words[skip:])
+        end = skip
+        while end < len(self.words) and self.word_ends[end] - self.word_ends[skip] < max_chars:
+            end += 1
+        return ' '.join(self.words[skip:end])[:max_chars]
+
+    # MARK: - Input
+
+    def push(self, words, now=None):
+        """Append newly recognized words (voiceText grew by these words)"""
+        now = time.monotonic() if now is None else now
+        self.advance(now)
+        for word in words:
+            for part in normalized_arabic(word).split():
+                self.words.append(part)
+                self.word_ends.append(self.word_ends[-1] + len(part) + 1)
+                self.stats['words'] += 1
+        self._voice_text_changed(now)
+
+    def update(self, voice_text, now=None):
+        """Set the whole recognized text (voiceText), e.g. a recognizer partial result
+
+        Words shared with the previous text are kept; revised ones are replaced.
+        """
+        now = time.monotonic() if now is None else now
+        self.advance(now)
+        words = normalized_arabic(voice_text).split()
+        common = 0
+        while common < min(len(words), len(self.words)) and words[common] == self.words[common]:
+            common += 1
+        del self.words[common:]
+        del self.word_ends[common + 1:]
+        for word in words[common:]:
+            self.words.append(word)
+            self.word_ends.append(self.word_ends[-1] + len(word) + 1)
+            self.stats['words'] += 1
+        self._voice_text_changed(now)
+
+    def advance(self, now):
+        """Fire the debounce / peek timers due by now, earliest first"""
+        while True:
+            due = [deadline for deadline in (self.debounce_deadline, self.peek_deadline)
+                   if deadline is not None and deadline <= now]
+            if not due:
+                return
+            if self.debounce_deadline is not None and self.debounce_deadline == min(due):
+                self.debounce_deadline = None
+                self.perform_fallback_match(now)
+            else:
+                self.peek_deadline = None
+                self.peek_helper()
+
+    def _voice_text_changed(self, now):
+        """voiceText didSet"""
+        self.stats['updates'] += 1
+        self.check_a3ozo()
+        if self.words:
+            if len(self.found_ayat) == 1:
+                if not self.updating_found_ayat:
+                    self.update_matched_words(now)
+            else:
+                self.update_found_ayat(now)
+
+    # MARK: - Aya Matching
+
+    def check_a3ozo(self, text=None):
+        """checkA3ozoBellah on textToPredict (or text); True if it set has_a3ozo"""
+        if self.has_a3ozo:
+            return False
+        if text is None:
+            length = self._text_length(self._skip())
+            # similarity >= 0.7 is impossible once the text is longer than len(a3ozo) / 0.7,
+            # and a3ozo.startswith(text) once it is longer than a3ozo: only the opening matters then
+            bound = int(len(self.a3ozo) / 0.7) + 1
+            text = self.text_to_predict(None if length <= bound else len(self.a3ozo))
+        if not text:
+            return False
+        if self.a3ozo.startswith(text) or text.startswith(self.a3ozo) or similarity(text, self.a3ozo) >= 0.7:
+            self.has_a3ozo = True
+            return True
+        return False
+
+    def check_basmalah(self, text=None):
+        """checkBismellah on textToPredict (or text); True if it set has_basmalah"""
+        text = self.text_to_predict() if text is None else text
+        if not text or self.has_basmalah:
+            return False
+        self.found_ayat = []
+        if self.bismellah.startswith(text) or text.startswith(self.bismellah):
+            self.has_basmalah = True
+            return True
+        return False
+
+    def find_matching_ayat(self, text):
+        """findMatchingAyat: ayat whose normalized line starts with text or that text starts with"""
+        self.stats['searches'] += 1
+        if not text:
+            return []
+        start = bisect_left(self._sorted_lines, text)
+        end = bisect_left(self._sorted_lines, text + _MAX_CHAR, lo=start)
+        found = set(self._sorted_order[start:end])
+        for length in self._line_lengths:
+            if length > len(text):
+                break
+            found.update(self._line_indices.get(text[:length], ()))
+        return sorted(found)
+
+    def update_found_ayat(self, now):
+        self.updating_found_ayat = True
+        self.debounce_deadline = None
+        if len(self.found_ayat) == 1:
+            return
+        self.check_a3ozo()
+        self.check_basmalah()
+        text = self.text_to_predict()
+        if len(text) <= 10:
+            self.found_ayat = []
+            return
+
+        self.found_ayat = self.find_matching_ayat(text)
+        # Fallback with debounce if no matches
+        if not self.found_ayat or len(text) < 17:
+            self.debounce_deadline = now + DEBOUNCE_SECONDS
+            return
+        self.update_quran_text()
+        self.update_matched_words(now)
+        self.updating_found_ayat = False
+
+    def check_model_results(self):
+        """checkCoreMLResults: keep the found ayah closest to the recognized text"""
+        if not self.found_ayat:
+            return
+        text = self.text_to_predict()
+        best_index, best_similarity = self.found_ayat[0], 0.0
+        for idx in self.found_ayat:
+            score = prefix_similarity(text, self.normalized_lines[idx])
+            if score > best_similarity:
+                best_index, best_similarity = idx, score
+        self.found_ayat = [best_index] if best_similarity >= 0.6 else []
+
+    def try_model_match(self):
+        """tryMLModelMatch: prefix-match the model's prediction, trimming words down to 3"""
+        predicted = self.predict(self.text_to_predict()) if self.predict is not None else None
+        if predicted is None:
+            self.found_ayat = []
+            return
+        self.stats['predictions'] += 1
+        text = predicted
+        # Both checks run on the prediction; one that fires resets textToPredict to the voice text
+        if self.check_a3ozo(text):
+            text = self.text_to_predict()
+        if self.check_basmalah(text):
+            text = self.text_to_predict()
+        if not text:
+            return
+
+        predicted_words = text.split()
+        for word_count in range(len(predicted_words), 2, -1):
+            self.found_ayat = self.find_matching_ayat(' '.join(predicted_words[:word_count]))
+            if self.found_ayat:
+                self.check_model_results()
+                return
+
+    def perform_fallback_match(self, now):
+        """performFallbackMatch, after the debounce"""
+        self.stats['fallbacks'] += 1
+        self.try_model_match()
+        if len(self.found_ayat) == 1:
+            if self.found_ayat[0] == 0:
+                self.has_a3ozo = True
+                self.found_ayat = []
+                self.updating_found_ayat = False
+                return
+            if self.found_ayat[0] == 1:
+                self.has_basmalah = True
+                self.found_ayat = []
+                self.updating_found_ayat = False
+                return
+            self.update_quran_text()
+            self.update_matched_words(now)
+            self.updating_found_ayat = False
+            return
+        self.perform_similarity_matching(now)
+
+    def best_similarity_match(self, text):
+        """performSimilarityMatching's scan: (ayah index, score), or (None, 0.0)
+
+        The app keeps the first best prefix similarity, stopping at the first
+        ayah above 0.9. All ayat are scored at once (bit-parallel), then the
+        stop is applied to the scores; with an n-gram index only its top
+        candidates are scored.
+        """
+        self.stats['similarity_scans'] += 1
+        if self.ngram_index is not None:
+            results = self.ngram_index.search(text, top_k=1)
+            return results[0] if results else (None, 0.0)
+        if self._encoded_lines is None:
+            self._encoded_lines = encode_texts(self.normalized_lines)
+        scores = prefix_similarities(text, self._encoded_lines)
+        above = np.flatnonzero(scores > 0.9)
+        scanned = scores[:above[0] + 1] if len(above) else scores
+        best = int(np.argmax(scanned))
+        return (best, float(scanned[best])) if scanned[best] > 0.0 else (None, 0.0)
+
+    def perform_similarity_matching(self, now):
+        current = self.found_ayat[0] if self.found_ayat else None
+        best_index, _ = self.best_similarity_match(self.text_to_predict())
+        if best_index is not None and best_index > 0:
+            if best_index == current:
+                return
+            self.reset_pages()
+            self.found_ayat = [best_index]
+            self.update_quran_text()
+            self.update_matched_words(now)
+            self.updating_found_ayat = False
+
+    # MARK: - Word Matching
+
+    def update_quran_text(self):
+        """updateQuranText: the window of Quran words to align against, loaded lazily"""
+        if not self.found_ayat:
+            return
+        first = self.found_ayat[0]
+        self.quran_words, self.quran_norm, self.word_ayah, self.ayah_starts = [], [], [], {}
+        self.next_ayah = first
+        self.window_end = min(first + WINDOW_AYAT, len(self.quran_lines)) if len(self.found_ayat) == 1 else first + 1
+        self._load_next_ayah()
+
+    def _load_next_ayah(self):
+        if self.next_ayah is None or self.next_ayah >= self.window_end:
+            return False
+        self.ayah_starts[self.next_ayah] = len(self.quran_words)
+        for word in self.quran_lines[self.next_ayah].split():
+            self.quran_words.append(word)
+            self.quran_norm.append(normalized_arabic(word))
+            self.word_ayah.append(self.next_ayah)
+        self.next_ayah += 1
+        self.stats['prefetched_ayat'] += 1
+        return True
+
+    def _has_quran_word(self, index):
+        """True if the window has a word at index, loading ayat up to it"""
+        while index >= len(self.quran_words):
+            if not self._load_next_ayah():
+                return False
+        return True
+
+    def _prefetch(self, index):
+        """Keep the ayah after the one holding index loaded"""
+        if index < len(self.word_ayah) and self.next_ayah is not None and self.next_ayah <= self.word_ayah[index] + 1:
+            self._load_next_ayah()
+
+    def update_matched_words(self, now):
+        """updateMatchedWords: align the voice words not aligned yet"""
+        if len(self.found_ayat) != 1:
+            return
+        skip = self._skip()
+        voice_count = len(self.words) - skip
+        results = self.matched_words
+        quran_index = len(results) - 1
+        previous = self.previous_voice_words_count
+        voice_index = previous - 2 if previous > 1 else previous
+
+        can_advance = True
+        while voice_index < voice_count:
+            voice_word = self.words[skip + voice_index]
+            if can_advance:
+                quran_index += 1
+                self.peek_deadline = now + PEEK_SECONDS
+            can_advance = True
+            if not self._has_quran_word(quran_index):
+                break
+            score = word_similarity(voice_word, self.quran_norm[quran_index])
+            if score >= MATCH_THRESHOLD:
+                results.append((self.quran_words[quran_index], True))
+                self.stats['matched'] += 1
+            elif self._try_backward_match(quran_index, voice_word):
+                can_advance = False
+                self.stats['backward_matches'] += 1
+            elif len(voice_word) > 3 and (step := self._try_forward_match(quran_index, voice_word)):
+                results.extend((word, True) for word in self.quran_words[quran_index:quran_index + step + 1])
+                quran_index += step
+                self.stats['forward_matches'] += 1
+            elif score >= SIMI_MATCH_THRESHOLD:
+                results.append((self.quran_words[quran_index], True))
+                self.stats['simi_matched'] += 1
+            else:
+                can_advance = False
+                self.stats['unmatched'] += 1
+            voice_index += 1
+        self.previous_voice_words_count = voice_count
+        self._matched_words_changed()
+
+    def _try_backward_match(self, index, voice_word):
+        for step in range(1, BACKWARD_STEPS + 1):
+            if index - step < 0:
+                break
+            if word_similarity(voice_word, self.quran_norm[index - step]) >= SEEK_MATCH_THRESHOLD:
+                return True
+        return False
+
+    def _try_forward_match(self, index, voice_word):
+        """Steps ahead of index to a word matching voice_word, or 0"""
+        for step in range(1, FORWARD_STEPS + 1):
+            if not self._has_quran_word(index + step):
+                break
+            if word_similarity(voice_word, self.quran_norm[index + step]) >= SEEK_MATCH_THRESHOLD:
+                return step
+        return 0
+
+    def peek_helper(self):
+        """peekHelper: show the next two words (unmatched) after 3 s without progress"""
+        if not self.is_recording:
+            return
+        index = len(self.matched_words)
+        if self._has_quran_word(index + 2):
+            self.matched_words.extend([(self.quran_words[index], False), (self.quran_words[index + 1], False)])
+            self.stats['peeks'] += 1
+            self._matched_words_changed()
+
+    def _matched_words_changed(self):
+        """matchedWords didSet: follow the page of the last shown word, prefetch the next ayah"""
+        index = len(self.matched_words) - 1
+        if index < 0:
+            return
+        self._prefetch(index)
+        if self.pages is not None:
+            page = self.pages[self.word_ayah[index]]
+            if self.page is not None and page != self.page:
+                self.stats['page_turns'] += 1
+            self.page = page
+
+    # MARK: - Position
+
+    def position(self):
+        """(ayah index, word offset in it) of the last shown word, or None"""
+        index = len(self.matched_words) - 1
+        if index < 0 or not self.found_ayat:
+            return None
+        ayah = self.word_ayah[index]
+        return ayah, index - self.ayah_starts[ayah]
+
+    def is_right_page(self):
+        """QuranModel.isRightPage for the current page (odd pages are on the right)"""
+        return self.page is not None and self.page % 2 == 1
@@ -0,0 +1,108 @@
+"""
+Bounded LRU cache for model results
+
+Recitation inputs repeat a lot (Al-Fatiha, common openings, Juz Amma), so
+predictions are cached keyed on the token sequence the model actually sees:
+two inputs that tokenize the same always share an entry. Every cache
+carries the fingerprint of the checkpoint and vocabulary it was filled
+from; a persisted cache whose fingerprint no longer matches is discarded.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+CACHE_VERSION = 2
+
+
+def file_fingerprint(*paths):
+    """sha1 over the contents of the given files (checkpoint, vocabulary, ...)"""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU map from a tuple key to a JSON-serializable result
+
+    capacity:    maximum number of entries, least recently used evicted first
+    path:        optional JSON file the cache is loaded from and saved to
+    fingerprint: identifies the checkpoint the results came from
+    """
+    def __init__(self, capacity=10000, path=None, fingerprint=None):
+        self.capacity = capacity
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Cached result for key, or None"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, fingerprint=None):
+        """Drop every entry, e.g. after the checkpoint was retrained"""
+        self.entries.clear()
+        if fingerprint is not None:
+            self.fingerprint = fingerprint
+
+    def save(self, path=None):
+        """Write the entries (oldest first, so LRU order survives) as JSON"""
+        path = path or self.path
+        if not path:
+            return
+        data = {
+            'version': CACHE_VERSION,
+            'fingerprint': self.fingerprint,
+            'entries': [[list(key), value] for key, value in self.entries.items()],
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """Load persisted entries; returns False if the file is stale"""
+        path = path or self.path
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CACHE_VERSION or data.get('fingerprint') != self.fingerprint:
+            print(f'Result cache {path} was built from a different checkpoint, ignoring it')
+            return False
+        for key, value in data['entries']:
+            self.put(tuple(key), value)
+        return True
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
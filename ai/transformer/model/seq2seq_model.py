@@ -5,6 +5,8 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.data import Dataset
 
+from quran_corpus import QuranCorpus, is_corpus_file
+
 class PositionalEncoding(nn.Module):
     """Learned positional encoding for transformer (like GPT/ChatGPT)"""
     def __init__(self, d_model, max_len=200):
@@ -12,13 +14,13 @@ class PositionalEncoding(nn.Module):
         # Learned positional embeddings
         self.pos_embedding = nn.Embedding(max_len, d_model)
 
-    def forward(self, x):
+    def forward(self, x, offset=0):
         """Add positional encoding to input embeddings"""
         # x shape: (batch_size, seq_len, d_model)
         batch_size, seq_len, d_model = x.shape
 
-        # Create position indices [0, 1, 2, ..., seq_len-1]
-        positions = torch.arange(0, seq_len, device=x.device).unsqueeze(0)  # (1, seq_len)
+        # Create position indices [offset, ..., offset+seq_len-1]
+        positions = torch.arange(offset, offset + seq_len, device=x.device).unsqueeze(0)  # (1, seq_len)
 
         # Look up positional embeddings
         pos_encodings = self.pos_embedding(positions)  # (1, seq_len, d_model)
@@ -65,6 +67,38 @@ class TransformerBlock(nn.Module):
 
         return x
 
+    def forward_cached(self, x, past=None, key_mask=None):
+        """
+        Inference-only forward for new positions, reusing keys/values of earlier ones
+        x shape: (batch_size, new_len, d_model)
+        past: (keys, values) of earlier positions, each (batch_size, n_heads, past_len, head_dim)
+        key_mask: optional (batch_size, past_len + new_len) - False for padded cache slots
+        Returns: output (batch_size, new_len, d_model), (keys, values) including the new positions
+        """
+        batch_size, new_len, d_model = x.shape
+        n_heads = self.self_attn.num_heads
+        head_dim = d_model // n_heads
+
+        q, k, v = F.linear(x, self.self_attn.in_proj_weight, self.self_attn.in_proj_bias).chunk(3, dim=-1)
+        q, k, v = [t.view(batch_size, new_len, n_heads, head_dim).transpose(1, 2) for t in (q, k, v)]
+        if past is not None:
+            k = torch.cat([past[0], k], dim=2)
+            v = torch.cat([past[1], v], dim=2)
+
+        # New position i (absolute past_len + i) may attend to keys 0..past_len + i
+        past_len = k.shape[2] - new_len
+        allowed = torch.ones(new_len, k.shape[2], dtype=torch.bool, device=x.device).tril(diagonal=past_len)
+        if key_mask is not None:
+            allowed = allowed.unsqueeze(0) & key_mask[:, None, :]
+            allowed = allowed.unsqueeze(1)  # broadcast over heads
+        attn = F.scaled_dot_product_attention(q, k, v, attn_mask=allowed)
+        attn = attn.transpose(1, 2).reshape(batch_size, new_len, d_model)
+        attn_output = self.self_attn.out_proj(attn)
+
+        x = self.norm1(x + attn_output)
+        x = self.norm2(x + self.ff(x))
+        return x, (k, v)
+
 
 class QuranSeq2SeqModel(nn.Module):
     """Decoder-only transformer for sequence-to-sequence generation"""
@@ -102,6 +136,19 @@ class QuranSeq2SeqModel(nn.Module):
             if p.dim() > 1:
                 nn.init.xavier_uniform_(p)
 
+    def config(self):
+        """Constructor arguments that rebuild this architecture"""
+        block = self.transformer_blocks[0]
+        return {
+            'vocab_size': self.vocab_size,
+            'max_length': self.max_length,
+            'd_model': self.d_model,
+            'n_heads': block.self_attn.num_heads,
+            'n_layers': len(self.transformer_blocks),
+            'd_ff': block.ff[0].out_features,
+            'dropout': self.dropout.p,
+        }
+
     def generate_causal_mask(self, seq_len):
         """Generate causal mask to prevent attending to future tokens"""
         mask = torch.triu(torch.ones(seq_len, seq_len), diagonal=1)
@@ -137,6 +184,30 @@ class QuranSeq2SeqModel(nn.Module):
 
         return logits
 
+    def forward_cached(self, x, past_key_values=None, positions=None, key_mask=None):
+        """
+        Incremental forward pass for inference (call under torch.no_grad() in eval mode)
+        x shape: (batch_size, new_len) - tokens that follow the cached positions
+        past_key_values: per-layer (keys, values) from a previous call, or None
+        positions: optional (batch_size, new_len) absolute positions, for rows whose
+                   caches are right-padded to a common length (see key_mask)
+        key_mask: optional (batch_size, past_len + new_len) - False for padded cache slots
+        Returns: logits (batch_size, new_len, vocab_size), updated past_key_values
+        """
+        x = self.embedding(x) * math.sqrt(self.d_model)
+        if positions is not None:
+            x = x + self.pos_encoding.pos_embedding(positions)
+        else:
+            offset = past_key_values[0][0].shape[2] if past_key_values else 0
+            x = self.pos_encoding(x, offset=offset)
+
+        present = []
+        for i, transformer_block in enumerate(self.transformer_blocks):
+            x, layer_past = transformer_block.forward_cached(x, past_key_values[i] if past_key_values else None, key_mask)
+            present.append(layer_past)
+
+        return self.output_head(x), present
+
 
 def load_vocabulary(vocab_path):
     """Load vocabulary from JSON array file"""
@@ -151,7 +222,14 @@ def load_vocabulary(vocab_path):
 
 
 def load_quran_data(quran_path):
-    """Load Quran text and filter out empty lines and markers"""
+    """Load Quran text and filter out empty lines and markers
+
+    quran_path can also be a corpus file from tools/build_corpus.py, which
+    holds the normalized ayat.
+    """
+    if is_corpus_file(quran_path):
+        return QuranCorpus.open(quran_path).ayat()
+
     with open(quran_path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
 
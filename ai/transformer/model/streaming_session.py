@@ -0,0 +1,117 @@
+"""
+Streaming recognition session over QuranSeq2SeqModel
+
+Speech recognition delivers words one at a time and often revises the last
+word or two. The session keeps the per-layer keys/values of the reader
+prefix `<s> القاريء: w1 ... wn`, so a new word only prefills its own
+token, a revision only slices the cache back to the revised word, and each
+update re-decodes just the `الاية: ...` output section.
+"""
+import torch
+
+from decoding import SPECIAL_TOKENS
+
+
+class StreamingSession:
+    """Incremental greedy decoding for one utterance"""
+    def __init__(self, model, word_to_idx, idx_to_word, device='cpu', max_input_words=6, max_output_words=6):
+        self.model = model
+        self.word_to_idx = word_to_idx
+        self.idx_to_word = idx_to_word
+        self.device = device
+        self.max_input_words = max_input_words
+        self.max_output_words = max_output_words
+
+        self.bos_token = word_to_idx['<s>']
+        self.eos_token = word_to_idx['</s>']
+        self.reader_token = word_to_idx['القاريء:']
+        self.ayah_token = word_to_idx['الاية:']
+
+        self.stats = {'updates': 0, 'prefilled_tokens': 0, 'reused_tokens': 0, 'decode_steps': 0}
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance"""
+        self.words = []
+        self.word_ends = []      # prefix length in tokens after each word
+        self.tokens = []
+        self.past = None
+        self.output_tokens = []
+        self.output_text = None
+        self.decoded_prefix = None
+        self._prefill([self.bos_token, self.reader_token])
+
+    def _forward(self, tokens, past):
+        x = torch.tensor([tokens], dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            return self.model.forward_cached(x, past)
+
+    def _prefill(self, tokens):
+        if tokens:
+            _, self.past = self._forward(tokens, self.past)
+            self.tokens.extend(tokens)
+            self.stats['prefilled_tokens'] += len(tokens)
+
+    def append(self, words):
+        """Add newly recognized words to the reader prefix"""
+        new_tokens = []
+        for word in words:
+            self.words.append(word)
+            # Like build_prompt: only the first max_input_words count, OOV words are dropped
+            if len(self.words) <= self.max_input_words and word in self.word_to_idx:
+                new_tokens.append(self.word_to_idx[word])
+            self.word_ends.append(len(self.tokens) + len(new_tokens))
+        self._prefill(new_tokens)
+
+    def rollback(self, num_words):
+        """Forget every word after the first num_words"""
+        if num_words >= len(self.words):
+            return
+        length = self.word_ends[num_words - 1] if num_words > 0 else 2
+        self.words = self.words[:num_words]
+        self.word_ends = self.word_ends[:num_words]
+        self.tokens = self.tokens[:length]
+        self.past = [(k[:, :, :length], v[:, :, :length]) for k, v in self.past]
+
+    def update(self, words):
+        """Sync the prefix to the recognizer's current word list and decode
+
+        Words shared with the previous update keep their cached state; the
+        rest are rolled back and prefilled again.
+        """
+        common = 0
+        while common < min(len(words), len(self.words)) and words[common] == self.words[common]:
+            common += 1
+        self.rollback(common)
+        self.stats['reused_tokens'] += len(self.tokens)
+        self.append(words[common:])
+        self.stats['updates'] += 1
+        return self.decode()
+
+    def decode(self):
+        """Greedy-decode the output section from the cached prefix
+
+        Returns the predicted ayah text, or None if no words were recognized.
+        """
+        if not self.words:
+            self.output_tokens = []
+            return None
+        # Words past max_input_words or out of vocabulary leave the prompt unchanged
+        if self.decoded_prefix == self.tokens:
+            return self.output_text
+
+        logits, past = self._forward([self.ayah_token], self.past)
+        self.output_tokens = []
+        for _ in range(self.max_output_words):
+            self.stats['decode_steps'] += 1
+            next_token = logits[0, -1].argmax().item()
+            if next_token == self.eos_token:
+                break
+            self.output_tokens.append(next_token)
+            if len(self.output_tokens) < self.max_output_words:
+                logits, past = self._forward([next_token], past)
+
+        words = [self.idx_to_word.get(token, '?') for token in self.output_tokens]
+        self.output_text = ' '.join(word for word in words if word not in SPECIAL_TOKENS)
+        self.decoded_prefix = list(self.tokens)
+        return self.output_text
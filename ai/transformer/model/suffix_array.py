@@ -0,0 +1,175 @@
+"""
+Word-level suffix array over the whole Quran
+
+Both models assume recitation starts at the beginning of an ayah. To
+resume from anywhere, the normalized ayat are concatenated into one stream
+of word ids and every suffix of it is sorted. The occurrences of any word
+sequence are then one contiguous range of the suffix array, found with a
+binary search per query word (O(m log n)); each occurrence maps back to
+(ayah index, word offset) through the ayah word offsets. Matches may run
+across ayah boundaries, as recitation does.
+
+The LCP array (longest common prefix of neighbouring suffixes) gives, for
+every position, how many words are needed before a continuation from there
+is unique in the whole Quran.
+"""
+import numpy as np
+
+
+def build_suffix_array(ids):
+    """Suffix array of an integer sequence by prefix doubling (numpy, O(n log^2 n))"""
+    n = len(ids)
+    rank = np.unique(ids, return_inverse=True)[1].astype(np.int64)
+    k = 1
+    while True:
+        shifted = np.full(n, -1, dtype=np.int64)
+        if k < n:
+            shifted[:n - k] = rank[k:]
+        order = np.lexsort((shifted, rank))
+        keys = np.stack([rank[order], shifted[order]])
+        new_rank = np.empty(n, dtype=np.int64)
+        new_rank[order] = np.concatenate([[0], np.cumsum(np.any(keys[:, 1:] != keys[:, :-1], axis=0))])
+        rank = new_rank
+        if rank.max() == n - 1 or k >= n:
+            return order.astype(np.int32)
+        k *= 2
+
+
+def build_lcp(ids, suffix_array):
+    """lcp[r] = common prefix length of the suffixes at ranks r - 1 and r (Kasai); lcp[0] = 0"""
+    n = len(ids)
+    ids = ids.tolist()
+    rank = np.empty(n, dtype=np.int64)
+    rank[suffix_array] = np.arange(n)
+    rank = rank.tolist()
+    sa = suffix_array.tolist()
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r > 0:
+            j = sa[r - 1]
+            while i + h < n and j + h < n and ids[i + h] == ids[j + h]:
+                h += 1
+            lcp[r] = h
+            if h:
+                h -= 1
+        else:
+            h = 0
+    return np.array(lcp, dtype=np.int32)
+
+
+class WordSuffixArray:
+    """Suffix array + LCP over the word ids of all ayat
+
+    word_ids:      (num_words,) word id stream of all ayat in order
+    word_offsets:  (num_ayat + 1,) start of each ayah in the stream
+    word_to_id:    word -> id
+    """
+    def __init__(self, word_ids, word_offsets, word_to_id):
+        self.word_ids = np.asarray(word_ids, dtype=np.int32)
+        self.word_offsets = np.asarray(word_offsets, dtype=np.int64)
+        self.word_to_id = word_to_id
+        self.suffix_array = build_suffix_array(self.word_ids)
+        self.lcp = build_lcp(self.word_ids, self.suffix_array)
+        self.rank = np.empty(len(self.word_ids), dtype=np.int64)
+        self.rank[self.suffix_array] = np.arange(len(self.word_ids))
+        self._ids = self.word_ids.tolist()
+        self._sa = self.suffix_array.tolist()
+
+    @classmethod
+    def from_ayat(cls, ayat):
+        """Build from normalized ayah texts"""
+        word_to_id = {}
+        word_ids = []
+        word_offsets = [0]
+        for ayah in ayat:
+            word_ids.extend(word_to_id.setdefault(word, len(word_to_id)) for word in ayah.split())
+            word_offsets.append(len(word_ids))
+        return cls(word_ids, word_offsets, word_to_id)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """Build from a QuranCorpus (quran_corpus.py)"""
+        return cls(corpus.word_ids, corpus.word_offsets, corpus.word_to_id)
+
+    def _narrow(self, lo, hi, depth, word_id):
+        """Sub-range of ranks [lo, hi) whose suffix has word_id at depth"""
+        ids, sa, n = self._ids, self._sa, len(self._ids)
+
+        def word_at(rank):
+            position = sa[rank] + depth
+            return ids[position] if position < n else -1
+
+        start, end = lo, hi
+        while start < end:
+            mid = (start + end) // 2
+            if word_at(mid) < word_id:
+                start = mid + 1
+            else:
+                end = mid
+        stop, end = start, hi
+        while stop < end:
+            mid = (stop + end) // 2
+            if word_at(mid) <= word_id:
+                stop = mid + 1
+            else:
+                end = mid
+        return start, stop
+
+    def rank_range(self, words):
+        """(matched words, lo, hi): ranks [lo, hi) share the longest matchable prefix of words"""
+        lo, hi = 0, len(self._sa)
+        for depth, word in enumerate(words):
+            word_id = self.word_to_id.get(word)
+            if word_id is None:
+                return depth, lo, hi
+            new_lo, new_hi = self._narrow(lo, hi, depth, word_id)
+            if new_lo == new_hi:
+                return depth, lo, hi
+            lo, hi = new_lo, new_hi
+        return len(words), lo, hi
+
+    def find(self, text):
+        """Stream positions of every occurrence of the words of text (sorted)"""
+        words = text.split()
+        matched, lo, hi = self.rank_range(words)
+        if not words or matched < len(words):
+            return []
+        return sorted(self._sa[lo:hi])
+
+    def to_ayah(self, position):
+        """(ayah index, word offset in that ayah) of a stream position"""
+        ayah = int(np.searchsorted(self.word_offsets, position, side='right')) - 1
+        return ayah, int(position - self.word_offsets[ayah])
+
+    def to_ayat(self, positions):
+        """to_ayah() of many stream positions at once"""
+        positions = np.asarray(positions, dtype=np.int64)
+        ayat = np.searchsorted(self.word_offsets, positions, side='right') - 1
+        return list(zip(ayat.tolist(), (positions - self.word_offsets[ayat]).tolist()))
+
+    def locate(self, text):
+        """[(ayah index, word offset), ...] of every occurrence of text"""
+        return self.to_ayat(self.find(text))
+
+    def longest_match(self, text):
+        """(matched words, [(ayah index, word offset), ...]) for the longest prefix of text that occurs
+
+        For noisy input: the occurrences of its longest exactly recited opening.
+        """
+        matched, lo, hi = self.rank_range(text.split())
+        if matched == 0:
+            return 0, []
+        return matched, self.to_ayat(sorted(self._sa[lo:hi]))
+
+    def unique_length(self, ayah, offset=0):
+        """Words needed from (ayah, offset) before the continuation is unique in the Quran
+
+        One more than the longest prefix shared with a neighbouring suffix; may
+        exceed the words left in the stream for text that repeats up to the end.
+        """
+        rank = int(self.rank[int(self.word_offsets[ayah]) + offset])
+        following = int(self.lcp[rank + 1]) if rank + 1 < len(self.lcp) else 0
+        return max(int(self.lcp[rank]), following) + 1
+
@@ -11,7 +11,9 @@ import shutil
 # Add parent directories to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 
-from seq2seq_model import QuranSeq2SeqModel, load_vocabulary, load_quran_data
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from input_variants import variant_input_words
 
 
 def log_print(message, log_file=None, log_only=False):
@@ -29,13 +31,15 @@ def log_print(message, log_file=None, log_only=False):
             f.write(message + '\n')
 
 
-def test_model_with_inputs(model, word_to_idx, idx_to_word, ayat, device, num_input_words, test_count=100, log_file=None, skip_position=None, replace_position=None, vocab_words=None):
+def test_model_with_inputs(model, word_to_idx, idx_to_word, ayat, device, num_input_words, test_count=100, log_file=None, skip_position=None, replace_position=None, vocab_words=None, oov_resolver=None):
     """Test model with specific number of input words
 
     Args:
         skip_position: If set, skip this word position (0-indexed)
         replace_position: If set, replace this word position with random wrong word (0-indexed)
         vocab_words: List of vocabulary words for replacement
+        oov_resolver: If set, an OOVResolver mapping out-of-vocabulary input words
+            to their nearest vocabulary word instead of dropping them
     """
 
     bos_token = word_to_idx['<s>']
@@ -57,41 +61,16 @@ def test_model_with_inputs(model, word_to_idx, idx_to_word, ayat, device, num_in
         ayah = ayat[idx]
         words = ayah.split()
 
-        # Get input words based on variant type
-        if skip_position is not None:
-            # Skip variant (similar to dataset generation)
-            if len(words) <= 3:
-                input_words = words[:min(len(words), num_input_words)]
-            else:
-                # Take words before skip position
-                before_skip = words[0:skip_position]
-                # Calculate how many more words we need
-                remaining = num_input_words - len(before_skip)
-                # Take words after skip position
-                after_skip = words[skip_position+1:min(len(words), skip_position+1+remaining)]
-                input_words = before_skip + after_skip
-        elif replace_position is not None and vocab_words:
-            # Replace word at position variant
-            if len(words) <= 3:
-                input_words = words[:min(len(words), num_input_words)]
-            else:
-                input_words = words[:min(len(words), num_input_words)].copy()
-                # Replace word at position with random wrong word
-                if replace_position < len(input_words):
-                    original_word = input_words[replace_position]
-                    replacement_word = random.choice(vocab_words)
-                    while replacement_word == original_word and len(vocab_words) > 1:
-                        replacement_word = random.choice(vocab_words)
-                    input_words[replace_position] = replacement_word
-        else:
-            # Regular variant
-            input_words = words[:min(num_input_words, len(words))]
+        # Get input words based on variant type (skip / replace / regular)
+        input_words = variant_input_words(words, num_input_words, skip_position, replace_position, vocab_words)
 
         expected_output_words = words[:min(6, len(words))]
 
         # Build initial sequence: <s> القاريء: [input_words] الاية:
         sequence_tokens = [bos_token, reader_token]
         for word in input_words:
+            if oov_resolver is not None:
+                word = oov_resolver.resolve(word)
             if word in word_to_idx:
                 token = word_to_idx[word]
                 sequence_tokens.append(token)
@@ -223,30 +202,8 @@ def test_model(model_path, vocab_path, quran_path, log_file=None):
     log_print(f'Device: {device}', log_file)
     log_print('', log_file)
 
-    # Create model (same architecture as training)
-    model = QuranSeq2SeqModel(
-        vocab_size=vocab_size,
-        max_length=50,
-        d_model=128,
-        n_heads=4,
-        n_layers=4,
-        d_ff=512,
-        dropout=0.1
-    )
-
-    # Load checkpoint
-    checkpoint = torch.load(model_path, map_location=device)
-
-    # Handle both old and new checkpoint formats
-    if 'model' in checkpoint:
-        model.load_state_dict(checkpoint['model'])
-    elif 'model_state_dict' in checkpoint:
-        model.load_state_dict(checkpoint['model_state_dict'])
-    else:
-        model.load_state_dict(checkpoint)
-
-    model = model.to(device)
-    model.eval()
+    # Checkpoint or inference artifact; the architecture comes from it
+    model, checkpoint = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
 
     epoch_num = checkpoint.get('epoch', -1) + 1 if 'epoch' in checkpoint else 'N/A'
     accuracy_val = f"{checkpoint.get('accuracy', 0):.1f}%" if 'accuracy' in checkpoint else 'N/A'
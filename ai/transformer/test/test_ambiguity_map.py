@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Ayah ambiguity map test
+
+Reports how many opening words pin down each ayah, then decodes queries
+from the test.py suites one at a time with greedy_decode_kv, with and
+without the AyahAmbiguityMap, counting forward passes (forward_cached
+calls, the prompt prefill excluded). Reports per suite the average passes
+saved per query, accuracy of both (same first 6 words as the expected
+ayah), how many outputs changed, and latency.
+"""
+import random
+import sys
+import os
+import time
+import numpy as np
+import torch
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from ambiguity_map import AyahAmbiguityMap
+from decoding import build_prompt, greedy_decode_kv
+from input_variants import TEST_SUITES, sample_suite
+
+
+class PassCounter:
+    """Counts one-token decode steps run through model.forward_cached"""
+    def __init__(self, model):
+        self.count = 0
+        self.forward_cached = model.forward_cached
+        model.forward_cached = self
+
+    def __call__(self, x, *args, **kwargs):
+        # Prefill runs the whole prompt minus its last token; decode steps run one token
+        if x.shape[1] == 1:
+            self.count += 1
+        return self.forward_cached(x, *args, **kwargs)
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+    queries_per_suite = 20
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    vocab_words = [word for word in word_to_idx.keys() if word not in ['<s>', '</s>', 'القاريء:', 'الاية:']]
+    ayat = load_quran_data(quran_path)
+
+    start = time.perf_counter()
+    ambiguity_map = AyahAmbiguityMap(ayat, word_to_idx)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    unique_length = ambiguity_map.unique_length
+    print("\n" + "="*88)
+    print(f"AYAH AMBIGUITY MAP ({len(ambiguity_map.table)} openings, built in {build_ms:.0f} ms)")
+    print("="*88)
+    for length in range(1, ambiguity_map.max_words + 1):
+        count = int(np.sum(unique_length == length))
+        print(f'  unique after {length} word(s): {count:>5} ayat ({count / len(ayat):.1%})')
+    print(f'  not unique within {ambiguity_map.max_words} words: {int(np.sum(unique_length == 0)):>5} ayat')
+
+    if not os.path.exists(model_path):
+        print(f'\nModel file not found at {model_path}: skipping the decoding comparison')
+        return 0
+
+    device = torch.device('cpu')
+    model, _ = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
+    counter = PassCounter(model)
+    eos_token = word_to_idx['</s>']
+
+    rng = random.Random(42)
+    totals = {'queries': 0, 'full_passes': 0, 'early_passes': 0, 'full_ok': 0, 'early_ok': 0,
+              'changed': 0, 'indexed': 0, 'full_time': 0.0, 'early_time': 0.0}
+    print(f'\n{"Suite":<24} {"Passes":>7} {"Early":>7} {"Saved/q":>8} {"Full acc":>9} {"Early acc":>10} {"Changed":>8}')
+
+    for suite in TEST_SUITES:
+        samples = sample_suite(ayat, suite, queries_per_suite, vocab_words, rng)
+        row = dict.fromkeys(totals, 0)
+        for idx, input_words in samples:
+            prompt = build_prompt(word_to_idx, ' '.join(input_words))
+            expected = ayat[idx].split()[:6]
+
+            counter.count = 0
+            t0 = time.perf_counter()
+            full = greedy_decode_kv(model, [prompt], eos_token, device=device)[0]
+            row['full_time'] += time.perf_counter() - t0
+            row['full_passes'] += counter.count
+
+            counter.count = 0
+            t0 = time.perf_counter()
+            outputs, indices = greedy_decode_kv(model, [prompt], eos_token, device=device,
+                                                ambiguity_map=ambiguity_map, return_indices=True)
+            row['early_time'] += time.perf_counter() - t0
+            row['early_passes'] += counter.count
+
+            early = outputs[0]
+            row['full_ok'] += [idx_to_word[token] for token in full] == expected
+            row['early_ok'] += [idx_to_word[token] for token in early] == expected
+            row['changed'] += early != full
+            row['indexed'] += indices[0] is not None
+            row['queries'] += 1
+
+        n = row['queries']
+        print(f'{suite[0]:<24} {row["full_passes"] / n:>7.2f} {row["early_passes"] / n:>7.2f}'
+              f' {(row["full_passes"] - row["early_passes"]) / n:>8.2f} {row["full_ok"] / n:>9.1%}'
+              f' {row["early_ok"] / n:>10.1%} {row["changed"]:>8}')
+        for key in totals:
+            totals[key] += row[key]
+
+    n = totals['queries']
+    stats = ambiguity_map.stats()
+    print("-"*88)
+    print(f'Forward passes per query: {totals["full_passes"] / n:.2f} -> {totals["early_passes"] / n:.2f}'
+          f' (saved {(totals["full_passes"] - totals["early_passes"]) / n:.2f} per query, {n} queries)')
+    print(f'Latency: {totals["full_time"] / n * 1000:.2f} -> {totals["early_time"] / n * 1000:.2f} ms/query')
+    print(f'Accuracy: {totals["full_ok"] / n:.1%} -> {totals["early_ok"] / n:.1%},'
+          f' {totals["changed"]} outputs changed, {totals["indexed"] / n:.1%} returned an ayah index')
+    print(f'Map: {stats["early_stops"]} early stops, {stats["lookups"]} lookups')
+    print("="*88)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -11,7 +11,8 @@ import os
 # Add parent directories to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 
-from seq2seq_model import QuranSeq2SeqModel, load_vocabulary
+from seq2seq_model import load_vocabulary
+from model_factory import load_checkpoint
 
 
 def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output_words=6):
@@ -244,28 +245,8 @@ def main():
 
     # Load model
     print(f'\nLoading model from {model_path}...')
-    model = QuranSeq2SeqModel(
-        vocab_size=vocab_size,
-        max_length=50,
-        d_model=128,
-        n_heads=4,
-        n_layers=4,
-        d_ff=512,
-        dropout=0.1
-    )
-
-    checkpoint = torch.load(model_path, map_location=device)
-
-    # Handle both old and new checkpoint formats
-    if 'model' in checkpoint:
-        model.load_state_dict(checkpoint['model'])
-    elif 'model_state_dict' in checkpoint:
-        model.load_state_dict(checkpoint['model_state_dict'])
-    else:
-        model.load_state_dict(checkpoint)
-
-    model.to(device)
-    model.eval()
+    # Checkpoint or inference artifact; the architecture comes from it
+    model, checkpoint = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
 
     print(f'Model loaded successfully!')
     if 'epoch' in checkpoint:
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Bit-parallel edit distance test
+
+Scores recognized-text queries against the prefixes of all ayat (the
+app's similarity fallback) with:
+  - prefix_similarity:    the app's DP table, one ayah at a time
+  - prefix_similarities:  Myers/Hyyro bit vectors over all ayat at once,
+                          with the ayat encoded per query or once up front
+Scores must be identical; reports ms/query for each.
+"""
+import random
+import sys
+import os
+import time
+import numpy as np
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_quran_data
+from edit_distance import encode_texts, normalized_arabic, prefix_similarities, prefix_similarity
+
+
+def main():
+    quran_path = '../datasets/quran-simple-norm.txt'
+    num_queries = 20
+
+    ayat = [' '.join(normalized_arabic(ayah).split()) for ayah in load_quran_data(quran_path)]
+    rng = random.Random(42)
+    queries = []
+    for _ in range(num_queries):
+        words = ayat[rng.randrange(len(ayat))].split()
+        words = words[:rng.randint(3, 12)]
+        # A recognition error: one character replaced
+        text = ' '.join(words)
+        position = rng.randrange(len(text))
+        queries.append(text[:position] + rng.choice('ابتهمنل') + text[position + 1:])
+
+    max_length = max(len(query) for query in queries)
+    start = time.perf_counter()
+    encoded = encode_texts(ayat, max_length=max_length)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    scalar_time = batch_time = encoded_time = 0.0
+    mismatches = 0
+    for query in queries:
+        t0 = time.perf_counter()
+        expected = np.array([prefix_similarity(query, ayah) for ayah in ayat])
+        t1 = time.perf_counter()
+        batch = prefix_similarities(query, ayat)
+        t2 = time.perf_counter()
+        pre_encoded = prefix_similarities(query, encoded)
+        t3 = time.perf_counter()
+        scalar_time += t1 - t0
+        batch_time += t2 - t1
+        encoded_time += t3 - t2
+        mismatches += int(np.sum(np.abs(batch - expected) > 1e-12) + np.sum(np.abs(pre_encoded - expected) > 1e-12))
+
+    print("\n" + "="*72)
+    print(f"PREFIX SIMILARITY vs ALL {len(ayat)} AYAT ({num_queries} queries, {min(map(len, queries))}-{max_length} chars)")
+    print("="*72)
+    print(f'{"Scorer":<40} {"ms/query":>10} {"Speedup":>9}')
+    scalar_ms = scalar_time / num_queries * 1000
+    for name, elapsed in (('DP table, one ayah at a time', scalar_time),
+                          ('bit-parallel, encoding per query', batch_time),
+                          ('bit-parallel, pre-encoded ayat', encoded_time)):
+        ms = elapsed / num_queries * 1000
+        print(f'{name:<40} {ms:>10.2f} {scalar_ms / ms:>8.1f}x')
+    print(f'\nEncoding all ayat once: {encode_ms:.1f} ms')
+    print(f'Parity: {"all scores identical" if mismatches == 0 else f"{mismatches} mismatches"}')
+    print("="*72)
+
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
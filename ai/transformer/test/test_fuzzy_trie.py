@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Fuzzy word-trie matcher vs seq2seq greedy decoding
+
+Runs the test.py suites (first N words, one word skipped, one word
+replaced) through FuzzyAyahTrie (up to 1 skip/substitution) and through the
+seq2seq model. Accuracy uses test.py's criterion: the predicted first 6
+words equal the ayah's first 6 words (for the trie, those of its top-ranked
+candidate). Also reports whether the right ayah is among the trie's
+candidates at all, the candidate count, and per-query latency.
+Without a trained model only the trie is evaluated.
+"""
+import random
+import sys
+import os
+import time
+import torch
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from decoding import build_prompt, greedy_decode_kv, tokens_to_text
+from input_variants import TEST_SUITES, sample_suite
+from fuzzy_trie import FuzzyAyahTrie
+
+
+def load_model(model_path, vocab_size, device):
+    model, _ = load_checkpoint(model_path, device=device)
+    return model
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+    max_edits = 1
+    samples_per_suite = 100
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    vocab_words = [word for word in word_to_idx.keys() if word not in ['<s>', '</s>', 'القاريء:', 'الاية:']]
+    ayat = load_quran_data(quran_path)
+    device = torch.device('cpu')
+
+    model = None
+    if os.path.exists(model_path):
+        model = load_model(model_path, vocab_size, device)
+    else:
+        print(f'Model not found at {model_path}: evaluating the trie only')
+
+    start = time.perf_counter()
+    trie = FuzzyAyahTrie(ayat)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(42)
+    print("\n" + "="*104)
+    print(f"FUZZY TRIE (max {max_edits} edit, {trie.num_nodes} nodes, built in {build_ms:.0f} ms) vs SEQ2SEQ GREEDY")
+    print("="*104)
+    print(f'{"Suite":<24} {"Trie acc":>9} {"Recall":>8} {"Cands":>7} {"Trie ms":>8}   {"Seq2seq acc":>11} {"Seq2seq ms":>11}')
+
+    totals = {'n': 0, 'trie_ok': 0, 'recall': 0, 'trie_time': 0.0, 's2s_ok': 0, 's2s_time': 0.0}
+    for suite in TEST_SUITES:
+        samples = sample_suite(ayat, suite, samples_per_suite, vocab_words, rng)
+        trie_ok = recall = candidates_total = s2s_ok = 0
+        trie_time = s2s_time = 0.0
+        for idx, input_words in samples:
+            text = ' '.join(input_words)
+            expected = ayat[idx].split()[:6]
+
+            t0 = time.perf_counter()
+            candidates = trie.search(text, max_edits=max_edits)
+            trie_time += time.perf_counter() - t0
+            candidates_total += len(candidates)
+            if candidates:
+                trie_ok += ayat[candidates[0][0]].split()[:6] == expected
+                recall += any(candidate == idx for candidate, _ in candidates)
+
+            if model is not None:
+                t0 = time.perf_counter()
+                tokens = greedy_decode_kv(model, [build_prompt(word_to_idx, text)], word_to_idx['</s>'], device=device)[0]
+                s2s_time += time.perf_counter() - t0
+                s2s_ok += tokens_to_text(tokens, idx_to_word).split() == expected
+
+        n = len(samples)
+        line = (f'{suite[0]:<24} {trie_ok / n:>9.1%} {recall / n:>8.1%} {candidates_total / n:>7.1f}'
+                f' {trie_time / n * 1000:>8.3f}')
+        if model is not None:
+            line += f'   {s2s_ok / n:>11.1%} {s2s_time / n * 1000:>11.3f}'
+        print(line)
+        totals['n'] += n
+        totals['trie_ok'] += trie_ok
+        totals['recall'] += recall
+        totals['trie_time'] += trie_time
+        totals['s2s_ok'] += s2s_ok
+        totals['s2s_time'] += s2s_time
+
+    n = totals['n']
+    print("-"*104)
+    line = (f'{"Overall":<24} {totals["trie_ok"] / n:>9.1%} {totals["recall"] / n:>8.1%} {"":>7}'
+            f' {totals["trie_time"] / n * 1000:>8.3f}')
+    if model is not None:
+        line += f'   {totals["s2s_ok"] / n:>11.1%} {totals["s2s_time"] / n * 1000:>11.3f}'
+    print(line)
+    print("="*104)
+
+
+if __name__ == '__main__':
+    main()
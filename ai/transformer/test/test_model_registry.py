@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Model registry test
+
+Registers copies of the checkpoint as several A/B variants (plus one alias
+of the same file) and replays a skewed stream of requests over them, like
+live traffic where two variants take most of it, at memory budgets that
+hold every variant, two of them and one. Reports loads, evictions, hit
+rate, time spent loading and resident memory, and checks that every
+variant decodes exactly like the directly loaded model.
+"""
+import random
+import shutil
+import sys
+import os
+import tempfile
+import time
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from model_registry import ModelRegistry, model_nbytes
+from decoding import build_prompt, greedy_decode_kv
+
+VARIANTS = 4
+# Share of the traffic per variant: two hot ones, two cold ones
+WEIGHTS = [0.45, 0.35, 0.12, 0.08]
+
+
+def replay(registry, names, prompts, eos_token, expected):
+    mismatches = 0
+    start = time.perf_counter()
+    for name, prompt, tokens in zip(names, prompts, expected):
+        mismatches += greedy_decode_kv(registry.get(name), [prompt], eos_token)[0] != tokens
+    return time.perf_counter() - start, mismatches
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+
+    if not os.path.exists(model_path):
+        print(f'Error: Model file not found at {model_path}')
+        print('Please train the model first using train.sh')
+        return 1
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    eos_token = word_to_idx['</s>']
+    model, _ = load_checkpoint(model_path, vocabulary=word_to_idx)
+    model_mb = model_nbytes(model) / 1024 / 1024
+
+    rng = random.Random(42)
+    ayat = load_quran_data(quran_path)
+    requests = [' '.join(ayat[rng.randrange(len(ayat))].split()[:rng.randint(1, 6)]) for _ in range(200)]
+    prompts = [build_prompt(word_to_idx, text) for text in requests]
+    names = rng.choices([f'variant{i}' for i in range(VARIANTS)], weights=WEIGHTS, k=len(prompts))
+    # variant0 is also served under another name: same file, one loaded model
+    names = [name if rng.random() < 0.5 or name != 'variant0' else 'alias0' for name in names]
+    expected = greedy_decode_kv(model, prompts, eos_token)
+
+    rows = []
+    total_mismatches = 0
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(VARIANTS):
+            paths.append(os.path.join(directory, f'variant{i}.pt'))
+            shutil.copyfile(model_path, paths[-1])
+
+        for budget_models in (VARIANTS, 2, 1):
+            registry = ModelRegistry(memory_budget_mb=budget_models * model_mb * 1.01)
+            for i, path in enumerate(paths):
+                registry.register(f'variant{i}', path, vocabulary=word_to_idx)
+            registry.register('alias0', paths[0], vocabulary=word_to_idx)
+
+            elapsed, mismatches = replay(registry, names, prompts, eos_token, expected)
+            total_mismatches += mismatches
+            stats = registry.stats()
+            load_ms = sum(stats['models'][f'variant{i}']['total_load_ms'] for i in range(VARIANTS))
+            rows.append((budget_models, stats, load_ms, elapsed))
+
+    print("\n" + "="*78)
+    print(f"MODEL REGISTRY ({VARIANTS} variants + 1 alias, {len(prompts)} requests, {model_mb:.1f} MB per model)")
+    print("="*78)
+    print(f'{"Budget (models)":>15} {"Loads":>6} {"Evictions":>10} {"Hit rate":>9} {"Load ms":>9} {"Resident MB":>12} {"ms/req":>8}')
+    for budget_models, stats, load_ms, elapsed in rows:
+        print(f'{budget_models:>15} {stats["loads"]:>6} {stats["evictions"]:>10} {stats["hit_rate"]:>9.2%}'
+              f' {load_ms:>9.1f} {stats["memory_mb"]:>12.1f} {elapsed / len(prompts) * 1000:>8.2f}')
+    print(f'\nPer model at the {rows[1][0]}-model budget:')
+    for name, model_stats in rows[1][1]['models'].items():
+        print(f'  {name:<9} loads {model_stats["loads"]:>3}, last load {model_stats["load_ms"]:>7.1f} ms,'
+              f' {model_stats["uses"]:>4} uses, resident {model_stats["resident_mb"]:.1f} MB')
+    print(f'\nDecoding parity: {"all outputs identical" if total_mismatches == 0 else f"{total_mismatches} mismatches"}')
+    print("="*78)
+    return 0 if total_mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+N-gram index test
+
+Builds the trigram index (and times reloading it from disk), then runs
+queries from the test.py suites (first N words, one word skipped, one word
+replaced) through:
+  - brute force: prefix similarity against all ayat, like the app's fallback
+  - NgramIndex.search: top-50 by shared trigrams, reranked by the same similarity
+Reports latency, how often the index finds the brute-force best similarity,
+and top-1 accuracy (same first 6 words as the expected ayah). Brute force is
+slow in pure Python, so it runs on a subset of queries.
+"""
+import random
+import sys
+import os
+import tempfile
+import time
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from input_variants import TEST_SUITES, sample_suite
+from ngram_index import brute_force_search, load_ngram_index
+
+
+def main():
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+    queries_per_suite = 50
+    brute_force_per_suite = 2
+
+    word_to_idx, _, _ = load_vocabulary(vocab_path)
+    vocab_words = [word for word in word_to_idx.keys() if word not in ['<s>', '</s>', 'القاريء:', 'الاية:']]
+    ayat = load_quran_data(quran_path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'quran_ngram_index.npz')
+        start = time.perf_counter()
+        load_ngram_index(quran_path, cache_path)
+        build_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        index = load_ngram_index(quran_path, cache_path)
+        load_ms = (time.perf_counter() - start) * 1000
+        size_mb = os.path.getsize(cache_path) / (1024 * 1024)
+
+    rng = random.Random(42)
+    index_time = brute_time = 0.0
+    index_ok = brute_ok = same_best = queries = brute_queries = 0
+    print("\n" + "="*80)
+    print(f"N-GRAM INDEX ({len(index.grams)} trigrams, {len(index.ayah_ids)} postings, {size_mb:.1f} MB)")
+    print(f"  build + save {build_ms:.0f} ms, load {load_ms:.0f} ms")
+    print("="*80)
+    print(f'{"Suite":<24} {"Index acc":>10} {"Index ms":>9}')
+
+    for suite in TEST_SUITES:
+        samples = sample_suite(ayat, suite, queries_per_suite, vocab_words, rng)
+        suite_ok = 0
+        suite_time = 0.0
+        for i, (idx, input_words) in enumerate(samples):
+            text = ' '.join(input_words)
+            expected = ayat[idx].split()[:6]
+
+            t0 = time.perf_counter()
+            results = index.search(text, top_k=1)
+            suite_time += time.perf_counter() - t0
+            suite_ok += bool(results) and ayat[results[0][0]].split()[:6] == expected
+
+            if i < brute_force_per_suite:
+                t0 = time.perf_counter()
+                brute = brute_force_search(text, index.ayat, top_k=1)
+                brute_time += time.perf_counter() - t0
+                brute_ok += ayat[brute[0][0]].split()[:6] == expected
+                same_best += bool(results) and abs(results[0][1] - brute[0][1]) < 1e-9
+                brute_queries += 1
+
+        print(f'{suite[0]:<24} {suite_ok / len(samples):>10.1%} {suite_time / len(samples) * 1000:>9.3f}')
+        index_ok += suite_ok
+        index_time += suite_time
+        queries += len(samples)
+
+    print("-"*80)
+    print(f'Index:       {index_ok / queries:.1%} accuracy, {index_time / queries * 1000:.3f} ms/query ({queries} queries)')
+    print(f'Brute force: {brute_ok / brute_queries:.1%} accuracy, {brute_time / brute_queries * 1000:.1f} ms/query ({brute_queries} queries)')
+    print(f'Index found the brute-force best similarity for {same_best / brute_queries:.1%} of those queries')
+    print(f'Speedup: {brute_time / brute_queries / (index_time / queries):.0f}x')
+    print("="*80)
+
+
+if __name__ == '__main__':
+    main()
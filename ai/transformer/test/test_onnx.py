@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+ONNX export test
+
+Exports the model (see model/onnx_seq2seq.py) to a temporary directory and
+checks the graphs against PyTorch with onnxruntime:
+  - full graph:  max |logits difference| at batch/sequence sizes other
+                 than the ones it was traced with
+  - step graph:  max |logits difference| and |keys/values difference| for
+                 prefills and single-token steps on top of padded caches
+  - decoding:    OnnxSeq2SeqDecoder tokens vs greedy_decode_kv, and latency
+                 of both at batch 1 and batch 32
+Needs onnx and onnxruntime.
+"""
+import random
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from decoding import build_prompt, greedy_decode_kv
+from onnx_seq2seq import export_full, export_step, create_session, step_names, OnnxSeq2SeqDecoder
+
+TOLERANCE = 1e-4
+
+
+def run(decode, prompts, batch_size):
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        outputs.extend(decode(prompts[i:i + batch_size]))
+    return outputs, time.perf_counter() - start
+
+
+def check_full(model, session):
+    worst = 0.0
+    for batch, seq in ((1, 1), (3, 11), (8, 30)):
+        x = torch.randint(0, model.vocab_size, (batch, seq))
+        with torch.no_grad():
+            expected = model(x).numpy()
+        worst = max(worst, float(np.abs(session.run(None, {'input_ids': x.numpy()})[0] - expected).max()))
+    return worst
+
+
+def check_step(model, session, n_layers):
+    """Worst (logits, keys/values) difference over prefills and padded single-token steps"""
+    input_names, _ = step_names(n_layers)
+    worst_logits = worst_cache = 0.0
+    for batch, past_len, new_len in ((1, 0, 9), (4, 7, 1), (16, 12, 1), (2, 3, 4)):
+        x = torch.randint(0, model.vocab_size, (batch, new_len))
+        lengths = torch.randint(1, past_len + 1, (batch,)) if past_len else torch.zeros(batch, dtype=torch.long)
+        positions = lengths.unsqueeze(1) + torch.arange(new_len)
+        key_mask = torch.cat([torch.arange(past_len).unsqueeze(0) < lengths.unsqueeze(1),
+                              torch.ones(batch, new_len, dtype=torch.bool)], dim=1)
+        with torch.no_grad():
+            _, past = model.forward_cached(torch.randint(0, model.vocab_size, (batch, past_len))) if past_len else (None, None)
+            logits, present = model.forward_cached(x, past, positions=positions, key_mask=key_mask)
+        if past is None:
+            heads = model.transformer_blocks[0].self_attn.num_heads
+            past = [(torch.zeros(batch, heads, 0, model.d_model // heads),) * 2] * n_layers
+        feeds = {'input_ids': x.numpy(), 'positions': positions.numpy(), 'key_mask': key_mask.numpy()}
+        feeds.update(zip(input_names[3:], [tensor.numpy() for layer in past for tensor in layer]))
+        outputs = session.run(None, feeds)
+        worst_logits = max(worst_logits, float(np.abs(outputs[0] - logits.numpy()).max()))
+        for got, expected in zip(outputs[1:], [tensor for layer in present for tensor in layer]):
+            worst_cache = max(worst_cache, float(np.abs(got - expected.numpy()).max()))
+    return worst_logits, worst_cache
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+
+    if not os.path.exists(model_path):
+        print(f'Error: Model file not found at {model_path}')
+        print('Please train the model first using train.sh')
+        return 1
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    device = torch.device('cpu')
+    torch.manual_seed(0)
+
+    model, _ = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
+    n_layers = len(model.transformer_blocks)
+
+    with tempfile.TemporaryDirectory() as directory:
+        full_path = os.path.join(directory, 'quran_seq2seq.onnx')
+        step_path = os.path.join(directory, 'quran_seq2seq_step.onnx')
+        export_full(model, full_path)
+        export_step(model, step_path)
+
+        full_diff = check_full(model, create_session(full_path))
+        step_logits_diff, step_cache_diff = check_step(model, create_session(step_path), n_layers)
+
+        ayat = load_quran_data(quran_path)
+        rng = random.Random(42)
+        requests = [' '.join(ayat[idx].split()[:rng.randint(1, 6)]) for idx in
+                    (rng.randrange(len(ayat)) for _ in range(512))]
+        prompts = [build_prompt(word_to_idx, text) for text in requests]
+        eos_token = word_to_idx['</s>']
+        decoder = OnnxSeq2SeqDecoder(step_path, eos_token)
+
+        rows = []
+        mismatches = 0
+        for batch_size in (1, 32):
+            count = 128 if batch_size == 1 else len(prompts)
+            expected, torch_time = run(lambda batch: greedy_decode_kv(model, batch, eos_token, device=device),
+                                       prompts[:count], batch_size)
+            outputs, onnx_time = run(decoder.decode, prompts[:count], batch_size)
+            mismatches += sum(a != b for a, b in zip(outputs, expected))
+            rows.append((batch_size, count, torch_time, onnx_time))
+
+    print("\n" + "="*72)
+    print(f"ONNX EXPORT ({n_layers} layers, vocab {vocab_size})")
+    print("="*72)
+    print(f'Full graph logits max |diff|:   {full_diff:.2e}')
+    print(f'Step graph logits max |diff|:   {step_logits_diff:.2e}, keys/values {step_cache_diff:.2e}')
+    print(f'Greedy decoding parity:         {"all outputs identical" if mismatches == 0 else f"{mismatches} mismatches"}')
+    print(f'\n{"Batch":>6} {"Requests":>9} {"torch kv ms/req":>16} {"onnxruntime ms/req":>19} {"Speedup":>8}')
+    for batch_size, count, torch_time, onnx_time in rows:
+        print(f'{batch_size:>6} {count:>9} {torch_time / count * 1000:>16.2f} {onnx_time / count * 1000:>19.2f}'
+              f' {torch_time / onnx_time:>7.2f}x')
+    print("="*72)
+
+    ok = mismatches == 0 and max(full_diff, step_logits_diff, step_cache_diff) < TOLERANCE
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+OOV resolver test
+
+Builds queries from the first 3-6 words of random ayat with one or two
+words misspelled the way speech recognition does (a character replaced,
+dropped or doubled), and checks:
+  - OOVResolver: how often a misspelled word is mapped back to the recited
+    word, nearest distance against brute force over the whole vocabulary,
+    fire rate and per-query latency
+  - seq2seq (if the model exists): accuracy with misspelled words dropped
+    (build_prompt) vs resolved (build_prompt with the resolver)
+"""
+import random
+import sys
+import os
+import time
+import torch
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from decoding import build_prompt, greedy_decode_kv
+from edit_distance import levenshtein_distance
+from oov_resolver import OOVResolver
+
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def misspell(word, rng):
+    """One character replaced, dropped or doubled"""
+    position = rng.randrange(len(word))
+    edit = rng.random()
+    if edit < 0.5:
+        return word[:position] + rng.choice(LETTERS) + word[position + 1:]
+    if edit < 0.75 and len(word) > 2:
+        return word[:position] + word[position + 1:]
+    return word[:position + 1] + word[position:]
+
+
+def make_queries(ayat, word_to_idx, count, rng):
+    """[(ayah index, query words, {position: recited word}), ...] with 1-2 OOV misspellings"""
+    valid = [i for i, ayah in enumerate(ayat) if len(ayah.split()) >= 6]
+    queries = []
+    while len(queries) < count:
+        idx = rng.choice(valid)
+        words = ayat[idx].split()[:rng.randint(3, 6)]
+        recited = {}
+        for position in rng.sample(range(len(words)), rng.randint(1, 2)):
+            # Twice misspelled one time in four: two edits away
+            wrong = misspell(words[position], rng)
+            if rng.random() < 0.25 and len(wrong) > 3:
+                wrong = misspell(wrong, rng)
+            if wrong not in word_to_idx:
+                recited[position] = words[position]
+                words[position] = wrong
+        if recited:
+            queries.append((idx, words, recited))
+    return queries
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+    num_queries = 1000
+    brute_force_words = 200
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    ayat = load_quran_data(quran_path)
+
+    start = time.perf_counter()
+    resolver = OOVResolver.from_vocabulary(word_to_idx, ayat)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(42)
+    queries = make_queries(ayat, word_to_idx, num_queries, rng)
+
+    restored = misspelled = 0
+    query_time = 0.0
+    for _, words, recited in queries:
+        t0 = time.perf_counter()
+        resolved = [resolver.resolve(word) for word in words]
+        query_time += time.perf_counter() - t0
+        for position, word in recited.items():
+            misspelled += 1
+            restored += resolved[position] == word
+
+    # Nearest distance must match brute force over the whole vocabulary
+    mismatches = 0
+    checked = [word for _, words, recited in queries for position, word in enumerate(words) if position in recited]
+    for word in checked[:brute_force_words]:
+        best = min(levenshtein_distance(word, candidate) for candidate in resolver.words)
+        _, distance = resolver.nearest(word)
+        expected = best if best <= resolver.max_distance and len(word) >= resolver.min_length else None
+        mismatches += distance != expected
+
+    stats = resolver.stats()
+    print("\n" + "="*72)
+    print(f"OOV RESOLVER ({len(resolver.words)} words, {len(resolver.index)} deletions, built in {build_ms:.0f} ms)")
+    print("="*72)
+    print(f'Misspelled words restored to the recited word: {restored / misspelled:.1%} ({misspelled} words)')
+    print(f'Fire rate: {stats["fire_rate"]:.1%} of {stats["lookups"]} input words corrected, {stats["unresolved"]} unresolved')
+    print(f'Latency: {query_time / len(queries) * 1000:.3f} ms/query, {stats["mean_oov_lookup_ms"]:.3f} ms per OOV word')
+    print(f'Nearest distance vs brute force: {"identical" if mismatches == 0 else f"{mismatches} mismatches"} ({min(len(checked), brute_force_words)} words)')
+
+    if not os.path.exists(model_path):
+        print(f'\nModel file not found at {model_path}: skipping the seq2seq comparison')
+        print("="*72)
+        return 0 if mismatches == 0 else 1
+
+    device = torch.device('cpu')
+    model, _ = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
+    eos_token = word_to_idx['</s>']
+
+    correct = {'dropped': 0, 'resolved': 0}
+    batch_size = 32
+    for name, oov_resolver in (('dropped', None), ('resolved', resolver)):
+        for i in range(0, len(queries), batch_size):
+            batch = queries[i:i + batch_size]
+            prompts = [build_prompt(word_to_idx, ' '.join(words), oov_resolver=oov_resolver) for _, words, _ in batch]
+            outputs = greedy_decode_kv(model, prompts, eos_token, device=device)
+            for (idx, _, _), tokens in zip(batch, outputs):
+                correct[name] += [idx_to_word[token] for token in tokens] == ayat[idx].split()[:6]
+    print(f'\nSeq2seq accuracy: {correct["dropped"] / len(queries):.1%} with OOV words dropped,'
+          f' {correct["resolved"] / len(queries):.1%} with OOV words resolved')
+    print("="*72)
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Prefix KV cache test
+
+Decodes a skewed stream of requests (Al-Fatiha and Juz Amma openings are
+much more frequent than the rest, like real recitation traffic) with:
+  - greedy_decode_batch: full forward for every output step
+  - greedy_decode_kv:    per-layer KV, every prompt prefilled from scratch
+  - greedy_decode_kv + PrefixKVCache at several memory budgets
+Outputs must be identical; reports throughput, hit rate and saved FLOPs.
+"""
+import random
+import sys
+import os
+import time
+import torch
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from decoding import build_prompt, greedy_decode_batch, greedy_decode_kv
+from prefix_cache import PrefixKVCache
+
+JUZ_AMMA_START = 5642   # An-Naba 78:1; index 0 is A'ozo, Al-Fatiha is 1-7
+
+
+def make_requests(ayat, count, popular_fraction=0.5, rng=random):
+    """First 1-6 words of ayat, half of them from Al-Fatiha / Juz Amma"""
+    popular = list(range(1, 8)) + list(range(JUZ_AMMA_START, len(ayat)))
+    requests = []
+    for _ in range(count):
+        if rng.random() < popular_fraction:
+            idx = rng.choice(popular)
+        else:
+            idx = rng.randrange(len(ayat))
+        words = ayat[idx].split()
+        requests.append(' '.join(words[:rng.randint(1, 6)]))
+    return requests
+
+
+def run(decode, prompts, batch_size):
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(prompts), batch_size):
+        outputs.extend(decode(prompts[i:i + batch_size]))
+    return outputs, time.perf_counter() - start
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+
+    if not os.path.exists(model_path):
+        print(f'Error: Model file not found at {model_path}')
+        print('Please train the model first using train.sh')
+        return 1
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    device = torch.device('cpu')
+
+    model, _ = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
+
+    ayat = load_quran_data(quran_path)
+    requests = make_requests(ayat, 2000, rng=random.Random(42))
+    prompts = [build_prompt(word_to_idx, text) for text in requests]
+    eos_token = word_to_idx['</s>']
+    batch_size = 32
+
+    expected, full_time = run(lambda batch: greedy_decode_batch(model, batch, eos_token, device=device), prompts, batch_size)
+    rows = [('full recompute', full_time, None)]
+    mismatches = 0
+
+    outputs, kv_time = run(lambda batch: greedy_decode_kv(model, batch, eos_token, device=device), prompts, batch_size)
+    mismatches += sum(a != b for a, b in zip(outputs, expected))
+    rows.append(('kv, no prefix cache', kv_time, None))
+
+    for budget_mb in (0.25, 1, 8):
+        cache = PrefixKVCache(model, memory_budget_mb=budget_mb)
+        outputs, cached_time = run(lambda batch: greedy_decode_kv(model, batch, eos_token, device=device, prefix_cache=cache),
+                                   prompts, batch_size)
+        mismatches += sum(a != b for a, b in zip(outputs, expected))
+        rows.append((f'kv + prefix {budget_mb}MB', cached_time, cache.stats()))
+
+    print("\n" + "="*100)
+    print(f"PREFIX KV CACHE ({len(prompts)} requests, batch {batch_size})")
+    print("="*100)
+    print(f'{"Decoder":<22} {"req/s":>8} {"Hit rate":>9} {"Token hits":>11} {"Saved MFLOPs":>13} {"Nodes":>6} {"MB":>7} {"Evicted":>8}')
+    for name, elapsed, stats in rows:
+        line = f'{name:<22} {len(prompts) / elapsed:>8.1f}'
+        if stats:
+            line += (f' {stats["hit_rate"]:>9.2%} {stats["token_hit_rate"]:>11.2%} {stats["saved_mflops"]:>13.1f}'
+                     f' {stats["nodes"]:>6} {stats["memory_mb"]:>7.2f} {stats["evictions"]:>8}')
+        print(line)
+    print(f'\nParity: {"all outputs identical" if mismatches == 0 else f"{mismatches} mismatches"}')
+    print("="*100)
+
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
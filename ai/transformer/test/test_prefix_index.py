@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Exact-prefix index test
+
+Runs the test.py suites (first N words, one word skipped, one word
+replaced) through AyahPrefixIndex and reports, per suite, how often it
+short-circuits each model path and whether those answers are correct:
+  - matcher:  the input opens exactly one ayah (its index must match)
+  - seq2seq:  all ayat the input opens share their first 6 words (they must
+              be the expected output of predict_ayah)
+Then, with no minimum input length, how often a unique match is the
+wrong ayah for each input length in words: the basis for MIN_WORDS.
+No model is needed; lookup latency is reported in microseconds.
+"""
+import random
+import sys
+import os
+import time
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from input_variants import TEST_SUITES, sample_suite
+from collections import Counter
+from prefix_index import AyahPrefixIndex
+
+
+def main():
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+
+    word_to_idx, _, _ = load_vocabulary(vocab_path)
+    vocab_words = [word for word in word_to_idx.keys() if word not in ['<s>', '</s>', 'القاريء:', 'الاية:']]
+    ayat = load_quran_data(quran_path)
+
+    start = time.perf_counter()
+    index = AyahPrefixIndex(ayat)
+    build_ms = (time.perf_counter() - start) * 1000
+    unrestricted = AyahPrefixIndex(ayat, min_words=1)
+    length_unique = Counter()
+    length_wrong = Counter()
+
+    rng = random.Random(42)
+    print("\n" + "="*92)
+    print(f"EXACT PREFIX INDEX ({len(ayat)} ayat, built in {build_ms:.1f} ms)")
+    print("="*92)
+    print(f'{"Suite":<24} {"Matcher fired":>14} {"correct":>8} {"Seq2seq fired":>14} {"correct":>8} {"Ambiguous":>10}')
+
+    totals = {'queries': 0, 'unique': 0, 'unique_ok': 0, 'opening': 0, 'opening_ok': 0}
+    lookup_time = 0.0
+    for suite in TEST_SUITES:
+        samples = sample_suite(ayat, suite, 2000, vocab_words, rng)
+        unique = unique_ok = opening_count = opening_ok = ambiguous = 0
+        for idx, input_words in samples:
+            text = ' '.join(input_words)
+            t0 = time.perf_counter()
+            candidates = index.match(text)
+            opening = index.common_opening(candidates, 6) if candidates else None
+            lookup_time += time.perf_counter() - t0
+
+            all_candidates = unrestricted.lookup(input_words)
+            if len(all_candidates) == 1:
+                length_unique[len(input_words)] += 1
+                length_wrong[len(input_words)] += all_candidates[0] != idx
+
+            if len(candidates) == 1:
+                unique += 1
+                unique_ok += candidates[0] == idx
+            elif candidates:
+                ambiguous += 1
+            if opening is not None:
+                opening_count += 1
+                opening_ok += list(opening) == ayat[idx].split()[:6]
+
+        n = len(samples)
+        print(f'{suite[0]:<24} {unique / n:>14.1%} {unique_ok / max(unique, 1):>8.1%}'
+              f' {opening_count / n:>14.1%} {opening_ok / max(opening_count, 1):>8.1%} {ambiguous / n:>10.1%}')
+        totals['queries'] += n
+        totals['unique'] += unique
+        totals['unique_ok'] += unique_ok
+        totals['opening'] += opening_count
+        totals['opening_ok'] += opening_ok
+
+    n = totals['queries']
+    print("-"*92)
+    print(f'{"Overall":<24} {totals["unique"] / n:>14.1%} {totals["unique_ok"] / max(totals["unique"], 1):>8.1%}'
+          f' {totals["opening"] / n:>14.1%} {totals["opening_ok"] / max(totals["opening"], 1):>8.1%}')
+
+    print(f'\nUnique matches by input length without a minimum (index.min_words = {index.min_words}):')
+    print(f'{"Words":>6} {"Unique":>8} {"Wrong ayah":>11}')
+    for length in sorted(length_unique):
+        print(f'{length:>6} {length_unique[length]:>8} {length_wrong[length] / length_unique[length]:>11.2%}')
+    print(f'\nLookup latency: {lookup_time / n * 1e6:.1f} µs/query')
+    print(f'Counters: {index.stats()}')
+    print("="*92)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,12 @@ import os
 # Add parent directories to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 
-from seq2seq_model import QuranSeq2SeqModel, load_vocabulary
+from seq2seq_model import load_vocabulary
+from model_factory import load_checkpoint
 
 
-def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output_words=6):
+def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output_words=6, cache=None, prefix_index=None,
+                 ambiguity_map=None, return_index=False, oov_resolver=None):
     """
     Predict ayah completion from input text using autoregressive generation
     TRUE INFERENCE - predicts one token at a time without padding
@@ -26,9 +28,18 @@ def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output
         input_text: Input Arabic text
         device: torch device
         max_output_words: Maximum number of output words to generate
+        cache: Optional ResultCache keyed on the prompt tokens
+        prefix_index: Optional AyahPrefixIndex; when the input is the exact opening
+            of ayat that all start with the same words, those are returned directly
+        ambiguity_map: Optional AyahAmbiguityMap; generation stops as soon as the
+            predicted words pin down the ayah and the rest comes from the corpus
+        return_index: Also return the predicted ayah index (None unless the
+            output matches a single ayah of ambiguity_map / prefix_index)
+        oov_resolver: Optional OOVResolver; input words missing from the vocabulary
+            are replaced by their nearest vocabulary word instead of being dropped
 
     Returns:
-        Predicted ayah text or None
+        Predicted ayah text or None, or (text, ayah index) with return_index
     """
     # Get special tokens
     bos_token = word_to_idx['<s>']
@@ -36,12 +47,27 @@ def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output
     reader_token = word_to_idx['القاريء:']
     ayah_token = word_to_idx['الاية:']
 
+    def result(text, index=None):
+        if index is None and ambiguity_map is not None and text:
+            candidates = ambiguity_map.candidates([word_to_idx.get(word, -1) for word in text.split()])
+            index = candidates[0] if len(candidates) == 1 else None
+        return (text, index) if return_index else text
+
     # Split input into words
     input_words = input_text.split()
 
     if not input_words:
         print("No input words")
-        return None
+        return result(None)
+
+    if prefix_index is not None:
+        candidates = prefix_index.match(input_text)
+        opening = prefix_index.common_opening(candidates, max_output_words) if candidates else None
+        if opening is not None:
+            prefix_index.short_circuits += 1
+            predicted_text = ' '.join(opening)
+            print(f"Predicted ayah text (exact prefix of {len(candidates)} ayat): {predicted_text}")
+            return result(predicted_text, candidates[0] if len(candidates) == 1 else None)
 
     # Limit to first 6 words
     input_words = input_words[:6]
@@ -50,16 +76,28 @@ def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output
     sequence_tokens = [bos_token, reader_token]
 
     for word in input_words:
+        if oov_resolver is not None:
+            word = oov_resolver.resolve(word)
         if word in word_to_idx:
             token = word_to_idx[word]
             sequence_tokens.append(token)
 
     sequence_tokens.append(ayah_token)
 
-    print(f"Initial sequence length: {len(sequence_tokens)} (before generation)")
+    initial_length = len(sequence_tokens)
+    print(f"Initial sequence length: {initial_length} (before generation)")
+
+    # Early stopping shortens the output, so it is part of the key
+    cache_key = (max_output_words, ambiguity_map is not None) + tuple(sequence_tokens)
+    if cache is not None:
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            print(f"Predicted ayah text (cached): {cached_text}")
+            return result(cached_text)
 
     # Autoregressive generation: predict one token at a time
     predicted_words = []
+    predicted_index = None
 
     for i in range(max_output_words):
         # Convert current sequence to tensor (NO PADDING)
@@ -88,10 +126,23 @@ def predict_ayah(model, word_to_idx, idx_to_word, input_text, device, max_output
         if word not in ['<s>', '</s>', 'القاريء:', 'الاية:', '<pad>']:
             predicted_words.append(word)
 
+        # Stop once the predicted words pin down the ayah: copy the rest from the corpus
+        if ambiguity_map is not None:
+            resolved = ambiguity_map.resolve(sequence_tokens[initial_length:])
+            if resolved is not None:
+                predicted_index, tokens = resolved
+                predicted_words = [idx_to_word[token] for token in tokens[:max_output_words]]
+                ambiguity_map.record_stop(i + 1, len(predicted_words), max_output_words)
+                print(f"Stopped after {i + 1} forward passes: output pinned down by the ambiguity map")
+                break
+
     predicted_text = ' '.join(predicted_words)
     print(f"Predicted ayah text: {predicted_text}")
 
-    return predicted_text
+    if cache is not None:
+        cache.put(cache_key, predicted_text)
+
+    return result(predicted_text, predicted_index)
 
 
 def test_distorted_input(model, word_to_idx, idx_to_word, device):
@@ -272,28 +323,8 @@ def main():
 
     # Load model
     print(f'\nLoading model from {model_path}...')
-    model = QuranSeq2SeqModel(
-        vocab_size=vocab_size,
-        max_length=50,
-        d_model=128,
-        n_heads=4,
-        n_layers=4,
-        d_ff=512,
-        dropout=0.1
-    )
-
-    checkpoint = torch.load(model_path, map_location=device)
-
-    # Handle both old and new checkpoint formats
-    if 'model' in checkpoint:
-        model.load_state_dict(checkpoint['model'])
-    elif 'model_state_dict' in checkpoint:
-        model.load_state_dict(checkpoint['model_state_dict'])
-    else:
-        model.load_state_dict(checkpoint)
-
-    model.to(device)
-    model.eval()
+    # Checkpoint or inference artifact; the architecture comes from it
+    model, checkpoint = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
 
     print(f'Model loaded successfully!')
     if 'epoch' in checkpoint:
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Streaming session parity and latency test
+
+Replays ayat word by word the way speech recognition delivers them, with
+the last word sometimes first misrecognized and then revised. Every update
+is decoded twice - by StreamingSession (cached prefix) and by a full
+re-decode of the prompt - and the outputs must match. Reports per-update
+latency of both by number of recognized words.
+"""
+import random
+import sys
+import os
+import time
+import torch
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_vocabulary, load_quran_data
+from model_factory import load_checkpoint
+from decoding import build_prompt, greedy_decode_batch, tokens_to_text
+from streaming_session import StreamingSession
+
+
+def utterance_updates(words, vocab_words, revise_prob=0.3, rng=random):
+    """Word lists the recognizer reports while reading `words`"""
+    updates = []
+    for i in range(len(words)):
+        if rng.random() < revise_prob:
+            updates.append(words[:i] + [rng.choice(vocab_words)])
+        updates.append(words[:i + 1])
+    return updates
+
+
+def main():
+    model_path = '../model/quran_seq2seq_model.pt'
+    vocab_path = '../model/vocabulary.json'
+    quran_path = '../datasets/quran-simple-norm.txt'
+
+    if not os.path.exists(model_path):
+        print(f'Error: Model file not found at {model_path}')
+        print('Please train the model first using train.sh')
+        return 1
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    device = torch.device('cpu')
+
+    model, _ = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
+
+    ayat = load_quran_data(quran_path)
+    vocab_words = [word for word in word_to_idx if word not in ('<pad>', '<s>', '</s>', 'القاريء:', 'الاية:')]
+    rng = random.Random(42)
+    test_ayat = rng.sample(ayat, 100)
+
+    session = StreamingSession(model, word_to_idx, idx_to_word, device=device)
+    eos_token = word_to_idx['</s>']
+    session_times = {}
+    full_times = {}
+    mismatches = 0
+    total = 0
+
+    for ayah in test_ayat:
+        session.reset()
+        for words in utterance_updates(ayah.split()[:8], vocab_words, rng=rng):
+            start = time.perf_counter()
+            streamed = session.update(words)
+            session_times.setdefault(len(words), []).append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            outputs = greedy_decode_batch(model, [build_prompt(word_to_idx, ' '.join(words))], eos_token, device=device)
+            expected = tokens_to_text(outputs[0], idx_to_word)
+            full_times.setdefault(len(words), []).append(time.perf_counter() - start)
+
+            total += 1
+            if streamed != expected:
+                mismatches += 1
+                print(f'✗ Mismatch for "{" ".join(words)}": session="{streamed}", full="{expected}"')
+
+    print("\n" + "="*60)
+    print("STREAMING SESSION vs FULL RE-DECODE")
+    print("="*60)
+    print(f'{"Words":>6} {"Updates":>8} {"Session ms":>11} {"Full ms":>9}')
+    for num_words in sorted(session_times):
+        session_ms = 1000 * sum(session_times[num_words]) / len(session_times[num_words])
+        full_ms = 1000 * sum(full_times[num_words]) / len(full_times[num_words])
+        print(f'{num_words:>6} {len(session_times[num_words]):>8} {session_ms:>11.2f} {full_ms:>9.2f}')
+    print(f'\nSession stats: {session.stats}')
+    print(f'Parity: {total - mismatches}/{total} updates identical')
+    print("="*60)
+
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
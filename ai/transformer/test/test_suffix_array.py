@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Suffix array test: resuming recitation mid-ayah
+
+Samples random positions inside ayat (not only ayah starts) and looks up
+the next 1-6 words with WordSuffixArray.locate. Checks the occurrences
+against a linear scan of the word stream, and reports per query length
+how often the continuation is unique, whether the true position is found,
+and lookup latency. Also summarizes, over every word position of the
+Quran, how many words are needed before the continuation is unique.
+"""
+import random
+import sys
+import os
+import time
+import numpy as np
+
+# Add parent directories to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
+
+from seq2seq_model import load_quran_data
+from suffix_array import WordSuffixArray
+
+
+def main():
+    quran_path = '../datasets/quran-simple-norm.txt'
+    queries_per_length = 500
+    scan_checks = 50
+
+    ayat = load_quran_data(quran_path)
+    start = time.perf_counter()
+    index = WordSuffixArray.from_ayat(ayat)
+    build_ms = (time.perf_counter() - start) * 1000
+    stream = ' '.join(ayat).split()
+
+    rng = random.Random(42)
+    mismatches = 0
+    print("\n" + "="*72)
+    print(f"WORD SUFFIX ARRAY ({len(stream)} words, built in {build_ms:.0f} ms, max LCP {index.lcp.max()})")
+    print("="*72)
+    print(f'{"Words":>6} {"Unique":>8} {"Found":>8} {"Mean hits":>10} {"µs/query":>10}')
+    for length in range(1, 7):
+        unique = found = hits = 0
+        elapsed = 0.0
+        for i in range(queries_per_length):
+            ayah = rng.randrange(len(ayat))
+            words = ayat[ayah].split()
+            offset = rng.randrange(len(words))
+            position = len(' '.join(ayat[:ayah]).split()) if i < scan_checks else None
+            query = ' '.join((words[offset:] + ayat[ayah + 1].split() if ayah + 1 < len(ayat) else words[offset:])[:length])
+
+            t0 = time.perf_counter()
+            occurrences = index.locate(query)
+            elapsed += time.perf_counter() - t0
+
+            unique += len(occurrences) == 1
+            found += (ayah, offset) in occurrences
+            hits += len(occurrences)
+            if position is not None:
+                # Linear scan of the word stream
+                target = query.split()
+                expected = [index.to_ayah(p) for p in range(len(stream) - len(target) + 1) if stream[p:p + len(target)] == target]
+                mismatches += expected != occurrences
+        print(f'{length:>6} {unique / queries_per_length:>8.1%} {found / queries_per_length:>8.1%}'
+              f' {hits / queries_per_length:>10.1f} {elapsed / queries_per_length * 1e6:>10.1f}')
+
+    lengths = np.array([index.unique_length(ayah, offset)
+                        for ayah in range(len(ayat)) for offset in range(len(ayat[ayah].split()))])
+    print("-"*72)
+    print(f'Words needed to be unique from any position: median {int(np.median(lengths))}, '
+          + ', '.join(f'<={k}: {np.mean(lengths <= k):.1%}' for k in (2, 3, 4, 6)))
+    print(f'Parity with linear scan: {"identical" if mismatches == 0 else f"{mismatches} mismatches"}')
+    print("="*72)
+
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Build the memory-mapped Quran corpus (see model/quran_corpus.py)
+
+Usage:
+    python build_corpus.py [--quran ../../../Muhaffez/Models/quran-simple-min.txt] [--output ../datasets/quran_corpus.bin]
+
+load_quran_data() in ai/transformer and ai/feed-forward accepts the
+output path in place of a text file.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+
+from quran_corpus import QuranCorpus, build_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the memory-mapped Quran corpus')
+    parser.add_argument('--quran', default='../../../Muhaffez/Models/quran-simple-min.txt')
+    parser.add_argument('--output', default='../datasets/quran_corpus.bin')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    header = build_corpus(args.quran, args.output)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    corpus = QuranCorpus.open(args.output)
+    ayat = corpus.ayat()
+    open_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Built {args.output} in {build_ms:.0f} ms ({os.path.getsize(args.output) / 1024:.0f} KB)")
+    print(f"  {header['num_ayat']} ayat, {header['num_words']} words, {header['vocab_size']} distinct words")
+    print(f"  {corpus.page.max()} pages, {corpus.juz.max()} juz, {corpus.rub3.max()} rub3, {corpus.surah.max()} surahs")
+    print(f"  open + all {len(ayat)} ayat texts: {open_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
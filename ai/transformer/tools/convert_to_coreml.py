@@ -10,7 +10,8 @@ import os
 # Add parent directories to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 
-from seq2seq_model import QuranSeq2SeqModel, load_vocabulary
+from seq2seq_model import load_vocabulary
+from model_factory import load_checkpoint
 
 
 class QuranSeq2SeqWrapper(torch.nn.Module):
@@ -40,29 +41,8 @@ def convert_model_to_coreml(pytorch_model_path, vocab_path, output_path):
 
     print(f"\nLoading PyTorch model from {pytorch_model_path}...")
 
-    # Create model with same architecture as training
-    model = QuranSeq2SeqModel(
-        vocab_size=vocab_size,
-        max_length=50,
-        d_model=128,
-        n_heads=4,
-        n_layers=4,
-        d_ff=512,
-        dropout=0.1
-    )
-
-    # Load checkpoint
-    checkpoint = torch.load(pytorch_model_path, map_location='cpu')
-
-    # Handle both old and new checkpoint formats
-    if 'model' in checkpoint:
-        model.load_state_dict(checkpoint['model'])
-    elif 'model_state_dict' in checkpoint:
-        model.load_state_dict(checkpoint['model_state_dict'])
-    else:
-        model.load_state_dict(checkpoint)
-
-    model.eval()
+    # Checkpoint or inference artifact; the architecture comes from it
+    model, checkpoint = load_checkpoint(pytorch_model_path, device='cpu', vocabulary=word_to_idx)
 
     print(f"Model loaded successfully!")
     print(f"  Epoch: {checkpoint.get('epoch', 'N/A')}")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Export a training checkpoint to an inference-only artifact (see model/model_artifact.py)
+
+Works for QuranSeq2SeqModel checkpoints (train/train.py, 'model' key) and
+QuranMatcherModel checkpoints (ai/feed-forward, 'model_state_dict' key).
+The optimizer state is dropped; the config, vocabulary / normalization
+fingerprints (model_factory.py), epoch, loss and accuracy are kept as
+metadata. Compares file size, load time and outputs with the checkpoint.
+
+Usage:
+    python export_artifact.py ../model/quran_seq2seq_model.pt [--output ../model/quran_seq2seq.safetensors] [--dtype float16]
+    python export_artifact.py ../../feed-forward/quran_matcher_model.pth --dtype bfloat16
+"""
+import argparse
+import os
+import sys
+import time
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+
+from model_artifact import save_artifact, load_model, STORAGE_DTYPES
+from model_factory import load_checkpoint, model_class
+
+
+def example_input(model):
+    if hasattr(model, 'input_length'):
+        return torch.randint(0, model.vocab_size, (64, model.input_length))
+    return torch.randint(0, model.vocab_size, (8, 12))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a checkpoint to an inference-only artifact')
+    parser.add_argument('checkpoint')
+    parser.add_argument('--output', help='Artifact path (default: the checkpoint path with .safetensors)')
+    parser.add_argument('--dtype', default='float32', choices=list(STORAGE_DTYPES), help='Storage dtype of the weights')
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.checkpoint)[0] + '.safetensors'
+
+    start = time.perf_counter()
+    model, info = load_checkpoint(args.checkpoint)
+    checkpoint_ms = (time.perf_counter() - start) * 1000
+
+    # Fingerprints and training results travel with the weights
+    metadata = {key: value for key, value in info.items() if key not in ('model_type', 'config')}
+    save_artifact(output, model.state_dict(), info['model_type'], info['config'], dtype=args.dtype, metadata=metadata)
+
+    start = time.perf_counter()
+    loaded, _ = load_model(output, model_class(info['model_type']))
+    artifact_ms = (time.perf_counter() - start) * 1000
+
+    x = example_input(model)
+    with torch.no_grad():
+        difference = (model(x) - loaded(x)).abs().max().item()
+
+    checkpoint_mb = os.path.getsize(args.checkpoint) / 1024 / 1024
+    artifact_mb = os.path.getsize(output) / 1024 / 1024
+    print(f"Exported {type(model).__name__} to {output} ({args.dtype})")
+    print(f"  config: {info['config']}")
+    print(f"  size: {checkpoint_mb:.1f} MB checkpoint -> {artifact_mb:.1f} MB artifact")
+    print(f"  load: {checkpoint_ms:.1f} ms (torch.load + build) -> {artifact_ms:.1f} ms (mapped)")
+    print(f"  max |output difference|: {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
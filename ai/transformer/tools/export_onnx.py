@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Export the Quran Seq2Seq transformer model to ONNX (see model/onnx_seq2seq.py)
+
+Writes two graphs: <output>.onnx (full forward) and <output>_step.onnx
+(KV-cached decode step). Needs the onnx package; test/test_onnx.py checks
+them against PyTorch with onnxruntime.
+
+Usage:
+    python export_onnx.py [--model ../model/quran_seq2seq_model.pt] [--output ../model/quran_seq2seq]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+
+from seq2seq_model import load_vocabulary
+from model_factory import load_checkpoint
+from onnx_seq2seq import export_full, export_step
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the Quran Seq2Seq model to ONNX')
+    parser.add_argument('--model', default='../model/quran_seq2seq_model.pt')
+    parser.add_argument('--vocab', default='../model/vocabulary.json')
+    parser.add_argument('--output', default='../model/quran_seq2seq', help='Output path without the .onnx extension')
+    parser.add_argument('--opset', type=int, default=17)
+    args = parser.parse_args()
+
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(args.vocab)
+    model, _ = load_checkpoint(args.model, device='cpu', vocabulary=word_to_idx)
+
+    for path, export in ((f'{args.output}.onnx', export_full), (f'{args.output}_step.onnx', export_step)):
+        start = time.perf_counter()
+        export(model, path, opset=args.opset)
+        print(f"Exported {path} in {time.perf_counter() - start:.1f} s ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Replay recorded recitations through the recitation tracker (see model/recitation_tracker.py)
+
+A recording is one JSON line:
+
+    {"ayah": 2, "words": ["الحمد", "لله", ...], "times": [0.4, 0.8, ...],
+     "positions": [0, 1, ...]}
+
+words are the recognized words in order and times their arrival in seconds.
+ayah is the ayah the reader started from, and positions gives, for each word,
+the Quran word being recited, counted from the first word of that ayah
+(null for A'ozo, Basmalah and noise). positions is optional; without it
+only latency and search counts are reported.
+
+--generate writes synthetic recordings (random start ayah, optional A'ozo /
+Basmalah, ASR-like misspelled, dropped and repeated words, pauses between
+ayat) to --output first, then replays them.
+
+Reports per-word latency, how often the tracker searched for the ayah again,
+ayah lock accuracy and word tracking accuracy (the last shown word is the one
+being recited).
+
+Usage:
+    python replay_recitation.py recordings.jsonl [...] [--seq2seq ../model/quran_seq2seq_model.pt] [--ngram]
+    python replay_recitation.py --generate 200 --output /tmp/recordings.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+
+from seq2seq_model import load_vocabulary
+from model_factory import load_checkpoint
+from decoding import build_prompt, greedy_decode_kv, tokens_to_text
+from ngram_index import NgramIndex
+from recitation_tracker import RecitationTracker
+
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def misspell(word, rng):
+    """One character replaced, dropped or doubled, like a recognition error"""
+    position = rng.randrange(len(word))
+    edit = rng.random()
+    if edit < 0.5:
+        return word[:position] + rng.choice(LETTERS) + word[position + 1:]
+    if edit < 0.75 and len(word) > 2:
+        return word[:position] + word[position + 1:]
+    return word[:position + 1] + word[position:]
+
+
+def generate_recording(tracker, rng, substitute=0.08, drop=0.03, repeat=0.03):
+    """A synthetic recording: 8-60 words from a random ayah on"""
+    lines = tracker.normalized_lines
+    start = rng.randrange(2, len(lines) - 1)
+    words, times, positions = [], [], []
+    now = 0.0
+
+    def say(word, position, pause=0.0):
+        nonlocal now
+        now += rng.uniform(0.3, 0.6) + pause
+        words.append(word)
+        times.append(round(now, 3))
+        positions.append(position)
+
+    if rng.random() < 0.3:
+        for word in lines[0].split():
+            say(word, None)
+        now += rng.uniform(0.5, 1.5)
+    if rng.random() < 0.2:
+        for word in lines[1].split():
+            say(word, None)
+        now += rng.uniform(0.5, 1.5)
+
+    position = 0
+    total = rng.randint(8, 60)
+    for idx in range(start, len(lines)):
+        ayah_words = lines[idx].split()
+        for i, word in enumerate(ayah_words):
+            if position >= total:
+                break
+            if rng.random() < drop:
+                position += 1
+                continue
+            say(misspell(word, rng) if rng.random() < substitute else word, position)
+            if position > 0 and rng.random() < repeat:
+                say(word, position)
+            position += 1
+        else:
+            # Pause between ayat
+            now += rng.uniform(0.5, 2.0)
+            continue
+        break
+    return {'ayah': start, 'words': words, 'times': times, 'positions': positions}
+
+
+def load_recordings(paths):
+    recordings = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            recordings.extend(json.loads(line) for line in f if line.strip())
+    return recordings
+
+
+def load_predictor(model_path, vocab_path, device):
+    """text -> seq2seq predicted ayah text, like AyaFinderMLModel.predict"""
+    word_to_idx, idx_to_word, vocab_size = load_vocabulary(vocab_path)
+    model, _ = load_checkpoint(model_path, device=device, vocabulary=word_to_idx)
+    eos_token = word_to_idx['</s>']
+
+    def predict(text):
+        tokens = greedy_decode_kv(model, [build_prompt(word_to_idx, text)], eos_token, device=device)[0]
+        return tokens_to_text(tokens, idx_to_word) or None
+    return predict
+
+
+def replay(tracker, recording):
+    """Feed one recording word by word; per-word latencies and tracking results"""
+    tracker.reset()
+    tracker.is_recording = True
+    start_line = tracker.normalized_lines[recording['ayah']]
+    positions = recording.get('positions')
+    latencies = []
+    locked_at = None
+    tracked = scored = 0
+
+    for i, (word, now) in enumerate(zip(recording['words'], recording['times'])):
+        t0 = time.perf_counter()
+        tracker.push([word], now)
+        latencies.append(time.perf_counter() - t0)
+
+        if locked_at is None and len(tracker.found_ayat) == 1 and tracker.matched_words:
+            locked_at = i
+        if positions is None or positions[i] is None or locked_at is None:
+            continue
+        # Ayat with the same text are indistinguishable: compare positions from the found ayah
+        scored += 1
+        found = tracker.found_ayat[0]
+        if tracker.normalized_lines[found] == start_line:
+            tracked += len(tracker.matched_words) - 1 == positions[i]
+
+    found = tracker.found_ayat[0] if len(tracker.found_ayat) == 1 and tracker.matched_words else None
+    locked = found is not None and tracker.normalized_lines[found] == start_line
+    return latencies, locked, locked_at, tracked, scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded recitations through the recitation tracker')
+    parser.add_argument('recordings', nargs='*', help='JSONL recording files')
+    parser.add_argument('--quran', default='../../../Muhaffez/Models/quran-simple-min.txt')
+    parser.add_argument('--generate', type=int, default=0, help='Write this many synthetic recordings to --output first')
+    parser.add_argument('--output', default='recordings.jsonl')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--seq2seq', help='QuranSeq2SeqModel checkpoint for the model fallback (skipped if not given)')
+    parser.add_argument('--vocab', default='../model/vocabulary.json')
+    parser.add_argument('--ngram', action='store_true', help='Rank n-gram index candidates in the similarity fallback')
+    args = parser.parse_args()
+
+    predict = load_predictor(args.seq2seq, args.vocab, torch.device('cpu')) if args.seq2seq else None
+    tracker = RecitationTracker.from_quran_file(args.quran, predict=predict)
+    if args.ngram:
+        tracker.ngram_index = NgramIndex.build(tracker.quran_lines)
+
+    paths = list(args.recordings)
+    if args.generate:
+        rng = random.Random(args.seed)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for _ in range(args.generate):
+                f.write(json.dumps(generate_recording(tracker, rng), ensure_ascii=False) + '\n')
+        print(f'Wrote {args.generate} synthetic recordings to {args.output}')
+        paths.append(args.output)
+    if not paths:
+        parser.error('pass recording files and/or --generate')
+
+    recordings = load_recordings(paths)
+    latencies = []
+    locked = tracked = scored = 0
+    lock_words = []
+    for recording in recordings:
+        word_latencies, ok, locked_at, recording_tracked, recording_scored = replay(tracker, recording)
+        latencies.extend(word_latencies)
+        locked += ok
+        if locked_at is not None:
+            lock_words.append(locked_at + 1)
+        tracked += recording_tracked
+        scored += recording_scored
+
+    stats = tracker.stats
+    ms = np.array(latencies) * 1000
+    print("\n" + "="*72)
+    print(f"RECITATION REPLAY ({len(recordings)} recordings, {stats['words']} words)")
+    print(f"  model fallback: {'seq2seq' if predict else 'off'}, similarity fallback: {'n-gram index' if args.ngram else 'all ayat'}")
+    print("="*72)
+    print(f'Per-word latency:   p50 {np.percentile(ms, 50):.3f} ms, p90 {np.percentile(ms, 90):.3f} ms,'
+          f' p99 {np.percentile(ms, 99):.3f} ms, max {ms.max():.1f} ms')
+    print(f'Re-search:          {stats["searches"]} prefix searches ({stats["searches"] / stats["words"]:.2f} per word),'
+          f' {stats["fallbacks"]} fallbacks ({stats["fallbacks"] / len(recordings):.2f} per recording)')
+    print(f'                    {stats["predictions"]} model predictions, {stats["similarity_scans"]} similarity scans')
+    print(f'Ayah lock:          {locked / len(recordings):.1%} of recordings'
+          + (f', after {np.mean(lock_words):.1f} words on average' if lock_words else ''))
+    if scored:
+        print(f'Tracking accuracy:  {tracked / scored:.1%} of {scored} words after lock point at the recited word')
+    print(f'Alignment:          {stats["matched"]} matched, {stats["simi_matched"]} near-matched,'
+          f' {stats["forward_matches"]} forward seeks, {stats["backward_matches"]} backward seeks,'
+          f' {stats["unmatched"]} unmatched, {stats["peeks"]} peeks')
+    print(f'Window:             {stats["prefetched_ayat"]} ayat loaded, {stats["page_turns"]} page turns')
+    print("="*72)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ import os
 import random
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 from seq2seq_model import QuranSeq2SeqModel, load_vocabulary, load_quran_data
+from model_factory import checkpoint_info
 import time
 
 
@@ -397,6 +398,7 @@ def train_model(model, train_loader, combined_dataset, criterion, optimizer, sch
                 'vocab_size': model.vocab_size,
                 'loss': avg_loss,
                 'accuracy': fast_accuracy,  # Save fast accuracy instead of 0
+                **checkpoint_info(model, idx_to_word),
             }, checkpoint_path)
 
         # Early stopping based on fast accuracy or LR minimum (removed autoregressive check)
@@ -434,6 +436,7 @@ def train_model(model, train_loader, combined_dataset, criterion, optimizer, sch
             'vocab_size': model.vocab_size,
             'loss': best_loss,
             'accuracy': final_accuracy,  # Replace fast accuracy with autoregressive
+            **checkpoint_info(model, idx_to_word),
         }, checkpoint_path)
         log_print(f'✓ Checkpoint updated with final autoregressive accuracy', log_file)
 
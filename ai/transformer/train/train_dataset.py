@@ -17,6 +17,7 @@ import torch.optim as optim
 from torch.utils.data import DataLoader, Dataset
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 from seq2seq_model import QuranSeq2SeqModel, load_vocabulary
+from model_factory import checkpoint_info
 import time
 
 
@@ -338,6 +339,7 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, id
                 'vocab_size': vocab_size,
                 'loss': avg_loss,
                 'accuracy': fast_accuracy,  # Save fast accuracy instead of 0
+                **checkpoint_info(model, idx_to_word),
             }, checkpoint_path)
 
         # Early stopping based on LR minimum (no autoregressive check during training)
@@ -365,6 +367,7 @@ def train_model(model, train_loader, criterion, optimizer, scheduler, device, id
             'vocab_size': vocab_size,
             'loss': best_loss,
             'accuracy': final_accuracy,  # Replace fast accuracy with autoregressive
+            **checkpoint_info(model, idx_to_word),
         }, checkpoint_path)
         print(f'✓ Checkpoint updated with final autoregressive accuracy', flush=True)
 
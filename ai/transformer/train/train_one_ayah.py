@@ -9,6 +9,7 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'model'))
 from seq2seq_model import QuranSeq2SeqModel, load_vocabulary, load_quran_data
+from model_factory import checkpoint_info
 
 def main():
     device = torch.device('mps' if torch.backends.mps.is_available() else 'cpu')
@@ -194,6 +195,7 @@ def main():
             'vocab_size': vocab_size,
             'loss': loss_value,
             'accuracy': acc,
+            **checkpoint_info(model, idx_to_word),
         }, checkpoint_path)
         print('✓ Checkpoint saved!')
     print()